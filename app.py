@@ -386,10 +386,14 @@ def novo_orcamento():
     # Tipo de tampa e material
     col1, col2 = st.columns(2)
     with col1:
-        modelo = st.selectbox(
-            "Tipo de Tampa *",
-            ["Tampa Solta", "Tampa Livro", "Tampa Luva", "Tampa Imã", "Tampa Redonda"]
-        )
+        modelos_disponiveis = ["Tampa Solta", "Tampa Livro", "Tampa Luva", "Tampa Imã", "Tampa Redonda"]
+        # Modelos paramétricos cadastrados na tabela modelos_caixa
+        try:
+            from box_templates import modelos_parametricos
+            modelos_disponiveis += sorted(nome for nome in modelos_parametricos() if nome not in modelos_disponiveis)
+        except Exception as e:
+            st.warning(f"⚠️ Modelos paramétricos indisponíveis: {str(e)}")
+        modelo = st.selectbox("Tipo de Tampa *", modelos_disponiveis)
     with col2:
         material = st.selectbox(
             "Material *",
@@ -447,6 +451,110 @@ def novo_orcamento():
     markup = st.number_input("Markup (%)", min_value=0.0, value=0.0, step=0.1, help="Percentual de lucro sobre o custo")
     markup_decimal = markup / 100
     
+    # Especificação para o CPQ (dimensões convertidas de cm para mm)
+    from cpq_calculator import BoxSpec
+    
+    especificacao = BoxSpec(
+        largura_mm=largura_cm * 10,
+        altura_mm=altura_cm * 10,
+        profundidade_mm=profundidade_cm * 10,
+        modelo=modelo,
+        material=material,
+        quantidade=quantidade,
+        berco=berco,
+        nicho=nicho,
+        serigrafia=serigrafia,
+        num_cores_serigrafia=num_cores_serigrafia,
+        num_impressoes_serigrafia=num_impressoes_serigrafia,
+        usar_impressao_digital=usar_impressao_digital,
+        tipo_impressao=tipo_impressao,
+        tipo_revestimento=tipo_revestimento,
+        usar_cola_quente=usar_cola_quente,
+        usar_cola_isopor=usar_cola_isopor,
+        metros_fita=metros_fita,
+        num_rebites=num_rebites,
+        markup=markup_decimal
+    )
+    # Mesma especificação sem a quantidade (prévia, preço alvo e curva de preços)
+    especificacao_cpq = especificacao._asdict()
+    del especificacao_cpq["quantidade"]
+    
+    # Tamanho padrão: preços do catálogo pré-calculado (consulta no índice, sem rodar o CPQ)
+    from price_catalog import catalogo_precos
+    
+    catalogo = catalogo_precos()
+    faixas_catalogo = catalogo.buscar(especificacao) if catalogo else None
+    if faixas_catalogo:
+        st.subheader("📗 Preço de catálogo")
+        tabela_catalogo = pd.DataFrame(faixas_catalogo)[['quantidade', 'preco_unitario_centavos', 'preco_total_centavos']]
+        tabela_catalogo['preco_unitario_centavos'] = (tabela_catalogo['preco_unitario_centavos'] / 100).apply(lambda x: f"R$ {x:.2f}")
+        tabela_catalogo['preco_total_centavos'] = (tabela_catalogo['preco_total_centavos'] / 100).apply(lambda x: f"R$ {x:.2f}")
+        tabela_catalogo.columns = ['Quantidade', 'Preço Unitário', 'Preço Total']
+        st.dataframe(tabela_catalogo, use_container_width=True, hide_index=True)
+    
+    # Prévia do preço (atualizada a cada alteração; o orçamento final usa o cálculo exato)
+    from cpq_calculator import calcular_previa_preco
+    
+    previa = calcular_previa_preco(quantidade=quantidade, **especificacao_cpq)
+    if previa:
+        st.info(
+            f"💡 Prévia: R$ {previa['preco_unitario']:.2f} por caixa (± R$ {previa['erro_maximo']:.2f}), "
+            f"total R$ {previa['preco_total']:.2f}. Clique em Calcular Orçamento para o valor exato."
+        )
+    
+    # Preço alvo: maior caixa possível para um valor por unidade
+    with st.expander("🎯 Tamanho máximo para um preço alvo"):
+        col1, col2 = st.columns(2)
+        with col1:
+            preco_alvo = st.number_input("Preço alvo por caixa (R$)", min_value=0.0, value=0.0, step=0.5)
+        with col2:
+            ajuste_alvo = st.selectbox(
+                "Dimensão ajustada",
+                ["Todas (mantendo a proporção)", "Largura", "Altura", "Profundidade"]
+            )
+        
+        if preco_alvo > 0:
+            from cpq_calculator import resolver_dimensao_maxima
+            
+            eixos_alvo = {
+                "Todas (mantendo a proporção)": None,
+                "Largura": "largura_mm",
+                "Altura": "altura_mm",
+                "Profundidade": "profundidade_mm"
+            }
+            solucao = resolver_dimensao_maxima(especificacao_cpq, preco_alvo, eixo=eixos_alvo[ajuste_alvo])
+            if solucao:
+                st.success(
+                    f"✅ Maior caixa: {solucao['largura_mm'] / 10:.1f} x {solucao['altura_mm'] / 10:.1f} x "
+                    f"{solucao['profundidade_mm'] / 10:.1f} cm (R$ {solucao['preco_unitario']:.2f} por caixa)"
+                )
+            else:
+                st.warning("⚠️ Nenhuma dimensão atinge o preço alvo com as opções selecionadas")
+
+    # Explorador: todas as combinações de modelo, material, revestimento e impressão para estas dimensões
+    with st.expander("🔎 Comparar configurações para estas dimensões"):
+        if st.button("🔎 Comparar configurações"):
+            from cpq_calculator import explorar_configuracoes, CAMPOS_EXPLORADOS
+
+            # Berço, nicho, serigrafia, colas extras, fita, rebites e markup seguem o formulário
+            opcoes_fixas = {nome: valor for nome, valor in especificacao_cpq.items() if nome not in CAMPOS_EXPLORADOS}
+            ranking = explorar_configuracoes(
+                especificacao.largura_mm, especificacao.altura_mm, especificacao.profundidade_mm,
+                quantidade=quantidade, **opcoes_fixas
+            )
+            if ranking is not None and not ranking.empty:
+                tabela_ranking = ranking[['posicao', 'modelo', 'material', 'tipo_revestimento']].copy()
+                tabela_ranking['impressao'] = [
+                    f"Digital {tipo}" if digital else "Sem impressão"
+                    for digital, tipo in zip(ranking['usar_impressao_digital'], ranking['tipo_impressao'])
+                ]
+                tabela_ranking['preco_unitario'] = (ranking['preco_unitario_centavos'] / 100).apply(lambda x: f"R$ {x:.2f}")
+                tabela_ranking['preco_total'] = (ranking['preco_total_centavos'] / 100).apply(lambda x: f"R$ {x:.2f}")
+                tabela_ranking.columns = ['#', 'Modelo', 'Material', 'Revestimento', 'Impressão', 'Preço Unitário', 'Preço Total']
+                st.dataframe(tabela_ranking, use_container_width=True, hide_index=True)
+            else:
+                st.warning("⚠️ Nenhuma configuração válida para estas dimensões")
+
     # Botão de cálculo
     if st.button("🧮 Calcular Orçamento"):
         st.write("🔍 Botão clicado! Iniciando cálculo...")
@@ -458,62 +566,17 @@ def novo_orcamento():
             return
         
         try:
-            st.write("🔍 Preparando dados para cálculo CPQ...")
-            # Preparar dados para o CPQ
-            dados_calculo = {
-                "largura_cm": largura_cm,
-                "altura_cm": altura_cm,
-                "profundidade_cm": profundidade_cm,
-                "modelo": modelo,
-                "material": material,
-                "quantidade": quantidade,
-                "berco": berco,
-                "nicho": nicho,
-                "serigrafia": serigrafia,
-                "num_cores_serigrafia": num_cores_serigrafia,
-                "num_impressoes_serigrafia": num_impressoes_serigrafia,
-                "usar_impressao_digital": usar_impressao_digital,
-                "tipo_impressao": tipo_impressao,
-                "tipo_revestimento": tipo_revestimento,
-                "usar_cola_quente": usar_cola_quente,
-                "usar_cola_isopor": usar_cola_isopor,
-                "metros_fita": metros_fita,
-                "num_rebites": num_rebites,
-                "markup": markup_decimal
-            }
-            
             # Calcular usando o CPQ
             st.write("🔍 Importando módulo CPQ...")
             with st.spinner("Calculando custos com CPQ..."):
-                from cpq_calculator import calcular_custo_caixa_completo
-                
-                # Converter cm para mm para o CPQ
-                largura_mm = largura_cm * 10
-                altura_mm = altura_cm * 10
-                profundidade_mm = profundidade_cm * 10
+                from cpq_calculator import calcular_orcamento, calcular_curva_precos, selecionar_chapa, selecionar_embalagem, QUANTIDADES_PADRAO
                 
                 st.write("🔍 Chamando função CPQ...")
-                resultado = calcular_custo_caixa_completo(
-                    largura_mm=largura_mm,
-                    altura_mm=altura_mm,
-                    profundidade_mm=profundidade_mm,
-                    modelo=modelo,
-                    material=material,
-                    quantidade=quantidade,
-                    berco=berco,
-                    nicho=nicho,
-                    serigrafia=serigrafia,
-                    num_cores_serigrafia=num_cores_serigrafia,
-                    num_impressoes_serigrafia=num_impressoes_serigrafia,
-                    usar_impressao_digital=usar_impressao_digital,
-                    tipo_impressao=tipo_impressao,
-                    tipo_revestimento=tipo_revestimento,
-                    usar_cola_quente=usar_cola_quente,
-                    usar_cola_isopor=usar_cola_isopor,
-                    metros_fita=metros_fita,
-                    num_rebites=num_rebites,
-                    markup=markup_decimal
-                )
+                resultado = calcular_orcamento(especificacao, centavos=True)
+                
+                # Tabela de preços por faixa de quantidade (inclui a quantidade pedida)
+                quantidades_curva = sorted(set(QUANTIDADES_PADRAO) | {int(quantidade)})
+                curva_precos = calcular_curva_precos(especificacao_cpq, quantidades_curva)
             
             st.write(f"🔍 Resultado recebido: {resultado}")
             if resultado:
@@ -524,42 +587,75 @@ def novo_orcamento():
                 
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.metric("Preço Unitário", f"R$ {resultado.get('preco_unitario', 0):.2f}")
-                    st.metric("Preço Total", f"R$ {resultado.get('preco_total', 0):.2f}")
-                    st.metric("Custo Fixo Unitário", f"R$ {resultado.get('custo_fixo_unitario', 0):.2f}")
+                    # Valores em centavos: os mesmos do PDF e do orçamento salvo
+                    st.metric("Preço Unitário", f"R$ {resultado.preco_unitario_centavos / 100:.2f}")
+                    st.metric("Preço Total", f"R$ {resultado.preco_total_centavos / 100:.2f}")
+                    st.metric("Custo Fixo Unitário", f"R$ {resultado.custo_fixo_unitario:.2f}")
                 
                 with col2:
-                    st.metric("Custo Papelão", f"R$ {resultado.get('custo_papelao', 0):.2f}")
-                    st.metric("Custo Revestimento", f"R$ {resultado.get('custo_revestimento', 0):.2f}")
-                    st.metric("Custo Cola PVA", f"R$ {resultado.get('custo_cola_pva', 0):.2f}")
+                    st.metric("Custo Papelão", f"R$ {resultado.custo_papelao:.2f}")
+                    st.metric("Custo Revestimento", f"R$ {resultado.custo_revestimento:.2f}")
+                    st.metric("Custo Cola PVA", f"R$ {resultado.custo_cola_pva:.2f}")
                 
                 # Detalhes técnicos
                 st.subheader("📊 Detalhes Técnicos")
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.write(f"**Área Papelão:** {resultado.get('area_papelao_m2', 0):.4f} m²")
-                    st.write(f"**Área Revestimento:** {resultado.get('area_revestimento_m2', 0):.4f} m²")
-                    st.write(f"**Cola PVA:** {resultado.get('ml_cola_pva', 0):.2f} ml")
-                    st.write(f"**Cola Adesiva:** {resultado.get('ml_cola_pva', 0):.2f} ml")
+                    st.write(f"**Área Papelão:** {resultado.area_papelao_m2:.4f} m²")
+                    st.write(f"**Área Revestimento:** {resultado.area_revestimento_m2:.4f} m²")
+                    st.write(f"**Cola PVA:** {resultado.ml_cola_pva:.2f} ml")
+                    st.write(f"**Cola Adesiva:** {resultado.ml_cola_adesiva:.2f} ml")
                 
                 with col2:
-                    st.write(f"**Caixas por Mês:** {resultado.get('caixas_por_mes', 0)}")
-                    st.write(f"**Custo Serigrafia:** R$ {resultado.get('custo_serigrafia', 0):.2f}")
-                    st.write(f"**Custo Impressão:** R$ {resultado.get('custo_impressao', 0):.2f}")
-                    st.write(f"**Custo Fita:** R$ {resultado.get('custo_fita', 0):.2f}")
+                    st.write(f"**Caixas por Mês:** {resultado.caixas_por_mes}")
+                    st.write(f"**Custo Serigrafia:** R$ {resultado.custo_serigrafia:.2f}")
+                    st.write(f"**Custo Impressão:** R$ {resultado.custo_impressao:.2f}")
+                    st.write(f"**Custo Fita:** R$ {resultado.custo_fita:.2f}")
+                
+                # Formato de chapa mais barato para o pedido (catálogo formatos_chapa)
+                chapa = selecionar_chapa(especificacao)
+                if chapa:
+                    st.subheader("🪵 Chapa Recomendada")
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("Formato", f"{chapa['nome']} ({chapa['largura_mm']:g}x{chapa['altura_mm']:g} mm)")
+                    with col2:
+                        st.metric("Chapas", f"{chapa['chapas']} ({chapa['caixas_por_chapa']} caixas por chapa)")
+                    with col3:
+                        st.metric("Custo das Chapas", f"R$ {chapa['custo_total']:.2f}")
+                    st.write(
+                        f"**Aproveitamento:** {chapa['aproveitamento']:.1%} "
+                        f"(sobra de {chapa['desperdicio_m2']:.2f} m²)"
+                    )
+                
+                # Caixas de despache mais baratas para o pedido (catálogo caixas_despache)
+                embalagem = selecionar_embalagem(especificacao)
+                if embalagem:
+                    st.subheader("📦 Embalagem de Despache")
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric("Caixas de Despache", embalagem['total_embalagens'])
+                    with col2:
+                        st.metric("Custo da Embalagem", f"R$ {embalagem['custo_total']:.2f}")
+                    with col3:
+                        st.metric("Custo por Caixa", f"R$ {embalagem['custo_por_caixa']:.2f}")
+                    for item in embalagem['embalagens']:
+                        st.write(f"**{item['nome']}:** {item['quantidade']} x R$ {item['custo_unitario']:.2f} ({item['capacidade']} caixas cada)")
+                
+                # Preços por faixa de quantidade
+                if curva_precos is not None:
+                    st.subheader("📈 Preços por Quantidade")
+                    tabela_curva = curva_precos.copy()
+                    tabela_curva['preco_unitario'] = tabela_curva['preco_unitario'].apply(lambda x: f"R$ {x:.2f}")
+                    tabela_curva['preco_total'] = tabela_curva['preco_total'].apply(lambda x: f"R$ {x:.2f}")
+                    tabela_curva.columns = ['Quantidade', 'Preço Unitário', 'Preço Total', 'Chapas Necessárias']
+                    st.dataframe(tabela_curva, use_container_width=True, hide_index=True)
                 
                 # Botão para salvar orçamento
                 if st.button("💾 Salvar Orçamento no Sistema"):
                     try:
-                        # Criar item para o sistema de orçamentos
-                        item_orcamento = {
-                            'descricao': f"Caixa {modelo} - {material} ({largura_cm}x{altura_cm}x{profundidade_cm}cm)",
-                            'quantidade': quantidade,
-                            'preco_unitario': resultado.get('preco_unitario', 0)
-                        }
-                        
                         orcamento_id, numero_orcamento = db.inserir_orcamento(
-                            cliente_id, data_validade, observacoes, [item_orcamento]
+                            cliente_id, data_validade, observacoes, [(especificacao, resultado)]
                         )
                         
                         st.success(f"✅ Orçamento salvo com sucesso! Número: {numero_orcamento}")
@@ -574,13 +670,9 @@ def novo_orcamento():
                         
                         # Gerar PDF
                         pdf_bytes = gerar_pdf_calculo(
-                            dados_calculo=dados_calculo,
-                            resultado=resultado,
-                            cliente_info={
-                                'nome': cliente_selecionado,
-                                'data_validade': data_validade,
-                                'observacoes': observacoes
-                            }
+                            {'cliente': cliente_selecionado, 'observacoes': observacoes},
+                            resultado,
+                            especificacao
                         )
                         
                         # Download do PDF
@@ -601,6 +693,64 @@ def novo_orcamento():
             st.error(f"❌ Erro ao calcular orçamento: {str(e)}")
             st.write(f"🔍 Detalhes do erro: {type(e).__name__}")
 
+    # Kit: várias caixas precificadas como um produto (custos fixos uma vez por kit, papelão com a economia do encaixe conjunto)
+    st.subheader("🎁 Kit de Caixas")
+    if 'kit_caixas' not in st.session_state:
+        st.session_state.kit_caixas = []
+
+    col1, col2 = st.columns(2)
+    with col1:
+        unidades_por_kit = st.number_input("Unidades desta caixa por kit", min_value=1, value=1, step=1)
+        if st.button("➕ Adicionar caixa ao kit"):
+            st.session_state.kit_caixas.append(especificacao._replace(quantidade=unidades_por_kit))
+    with col2:
+        quantidade_kits = st.number_input("Quantidade de kits", min_value=1, value=1, step=1)
+        if st.button("🗑️ Limpar kit"):
+            st.session_state.kit_caixas = []
+
+    if st.session_state.kit_caixas:
+        from cpq_calculator import calcular_kit
+
+        kit = calcular_kit(st.session_state.kit_caixas, quantidade_kits)
+        if kit:
+            tabela_kit = pd.DataFrame([
+                {
+                    'Caixa': especificacao_kit.descricao(),
+                    'Por Kit': caixa.quantidade,
+                    'Quantidade': especificacao_kit.quantidade,
+                    'Preço Unitário': f"R$ {resultado_kit.preco_unitario_centavos / 100:.2f}",
+                    'Preço Total': f"R$ {resultado_kit.preco_total_centavos / 100:.2f}"
+                }
+                for caixa, especificacao_kit, resultado_kit in zip(
+                    st.session_state.kit_caixas, kit.especificacoes, kit.resultados
+                )
+            ])
+            st.dataframe(tabela_kit, use_container_width=True, hide_index=True)
+
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                # Comparação com as mesmas caixas orçadas avulsas (orçamento unitário de cada uma)
+                diferenca_avulso = kit.preco_kit_centavos - kit.preco_avulso_kit_centavos
+                st.metric("Preço por Kit", f"R$ {kit.preco_kit:.2f}",
+                          delta=f"R$ {diferenca_avulso / 100:.2f} vs. avulsas" if diferenca_avulso else None,
+                          delta_color="inverse")
+            with col2:
+                st.metric("Preço Total", f"R$ {kit.preco_total:.2f}")
+            with col3:
+                if kit.chapas_necessarias is not None:
+                    economia = (kit.chapas_separadas or kit.chapas_necessarias) - kit.chapas_necessarias
+                    st.metric("Chapas Necessárias", kit.chapas_necessarias,
+                              delta=f"-{economia} encaixando junto" if economia else None, delta_color="inverse")
+
+            if st.button("💾 Salvar Kit no Sistema"):
+                orcamento_id, numero_orcamento = db.inserir_orcamento(
+                    cliente_id, data_validade, observacoes, kit.itens()
+                )
+                if numero_orcamento:
+                    st.success(f"✅ Kit salvo com sucesso! Número: {numero_orcamento}")
+        else:
+            st.error("❌ Erro no cálculo do kit")
+
 
 # Função para visualizar orçamentos
 def orcamentos():
@@ -689,6 +839,41 @@ def orcamentos():
                     st.info("Nenhum item encontrado para este projeto.")
             else:
                 st.error("Orçamento não encontrado!")
+        
+        # Reprecificação: itens pendentes afetados por mudanças nas constantes do Supabase
+        if st.session_state.get('user_role') == 'admin':
+            st.subheader("🔄 Reprecificação")
+            if st.button("Verificar orçamentos pendentes afetados por mudanças nas constantes"):
+                import constants
+                from repricing import chaves_alteradas, reprecificar_orcamentos
+                
+                # Recarrega as constantes do Supabase e compara com as que cada item leu ao ser gravado
+                constants.clear_cache()
+                contexto_novo = constants.get_pricing_context()
+                itens = db.buscar_itens_para_reprecificacao()
+                alteradas = set()
+                for _, _, instantaneo in itens.values():
+                    if instantaneo is not None:
+                        alteradas |= chaves_alteradas(instantaneo, contexto_novo)
+                sem_instantaneo = sum(instantaneo is None for _, _, instantaneo in itens.values())
+                
+                if not alteradas and not sem_instantaneo:
+                    st.info(f"Nenhuma constante mudou desde a gravação dos {len(itens)} itens pendentes.")
+                else:
+                    if alteradas:
+                        st.write(f"**Chaves alteradas:** {', '.join(sorted(alteradas))}")
+                    if sem_instantaneo:
+                        st.write(f"**Itens gravados sem as constantes (todos os campos comparados):** {sem_instantaneo}")
+                    deltas = reprecificar_orcamentos(itens, contexto=contexto_novo)
+                    
+                    if deltas is None:
+                        st.error("❌ Erro na reprecificação")
+                    elif deltas.empty:
+                        st.success(f"✅ Nenhum dos {len(itens)} itens pendentes foi afetado")
+                    else:
+                        st.warning(f"⚠️ {deltas['orcamento'].nunique()} de {len(itens)} itens pendentes mudaram de valor")
+                        deltas.columns = ['Item', 'Campo', 'Valor Anterior', 'Valor Novo', 'Diferença']
+                        st.dataframe(deltas, use_container_width=True, hide_index=True)
     else:
         st.info("Nenhum orçamento encontrado.")
 
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks do motor de cálculo do CPQ (calculations.py e cpq_calculator.py)
+
+Roda sem acesso ao Supabase: as constantes vêm de um snapshot local
+(benchmark_constantes.json). Mede operações por segundo e as latências
+p50/p99 de calcular_custo_caixa_completo e de calcular_preco (cinco modelos
+× dois materiais) e das funções de planificação, área de colagem PVA e
+perímetro de cada modelo. Os resultados podem ser gravados como baseline e comparados nas
+execuções seguintes.
+
+Uso:
+    python benchmark_cpq.py                     # mede e compara com o baseline, se existir
+    python benchmark_cpq.py --salvar-baseline   # mede e grava o baseline
+    python benchmark_cpq.py --filtro planificacao --tempo 0.5
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import constants
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_PADRAO = os.path.join(DIRETORIO, "benchmark_constantes.json")
+BASELINE_PADRAO = os.path.join(DIRETORIO, "benchmark_baseline.json")
+
+MATERIAIS = ("Papelão", "Acrílico")
+
+# Dimensões (mm) usadas em sequência em cada benchmark
+DIMENSOES = (
+    (200.0, 150.0, 100.0),
+    (120.0, 120.0, 60.0),
+    (350.0, 250.0, 80.0),
+    (80.0, 60.0, 40.0),
+)
+
+# Opções do orçamento medido (além de modelo, material e dimensões)
+OPCOES_ORCAMENTO = {
+    "quantidade": 100,
+    "serigrafia": True,
+    "num_cores_serigrafia": 2,
+    "metros_fita": 1.5,
+    "markup": 0.3,
+}
+
+
+def _benchmarks():
+    """Lista de (nome, função, lista de argumentos) de cada benchmark"""
+    import calculations
+    from cpq_calculator import BoxSpec, calcular_custo_caixa_completo, calcular_preco
+
+    casos = []
+    for modelo in calculations.GEOMETRIAS:
+        for material in MATERIAIS:
+            argumentos = [
+                dict(OPCOES_ORCAMENTO, largura_mm=largura, altura_mm=altura, profundidade_mm=profundidade,
+                     modelo=modelo, material=material)
+                for largura, altura, profundidade in DIMENSOES
+            ]
+            casos.append((f"calcular_custo_caixa_completo[{modelo} / {material}]",
+                          lambda kwargs: calcular_custo_caixa_completo(**kwargs), argumentos))
+            casos.append((f"calcular_preco[{modelo} / {material}]",
+                          calcular_preco, [BoxSpec(**kwargs) for kwargs in argumentos]))
+
+    # Funções geométricas: dependem só do modelo (o material não entra no cálculo)
+    for modelo, geometria in calculations.GEOMETRIAS.items():
+        sufixo = geometria.__name__.replace("calcular_geometria_", "")
+        for prefixo in ("calcular_planificacao_", "calcular_area_colagem_pva_"):
+            funcao = getattr(calculations, prefixo + sufixo)
+            casos.append((prefixo + sufixo, lambda args, funcao=funcao: funcao(*args), list(DIMENSOES)))
+        casos.append((f"calcular_perimetro_papelao[{modelo}]",
+                      lambda args, modelo=modelo: calculations.calcular_perimetro_papelao(*args, modelo),
+                      list(DIMENSOES)))
+    return casos
+
+
+def medir(funcao, argumentos, tempo=0.3, minimo_amostras=200):
+    """
+    Executa funcao(argumento) em sequência durante `tempo` segundos (e pelo
+    menos minimo_amostras vezes), cronometrando cada chamada.
+    Retorna ops/s e as latências p50/p99 em microssegundos.
+    """
+    # Aquecimento (caches de encaixe, regras compiladas etc.)
+    for argumento in argumentos:
+        funcao(argumento)
+
+    relogio = time.perf_counter_ns
+    latencias = []
+    limite = relogio() + int(tempo * 1e9)
+    i = 0
+    while relogio() < limite or len(latencias) < minimo_amostras:
+        argumento = argumentos[i % len(argumentos)]
+        inicio = relogio()
+        funcao(argumento)
+        latencias.append(relogio() - inicio)
+        i += 1
+
+    latencias.sort()
+    total_ns = sum(latencias)
+    return {
+        "ops_por_segundo": len(latencias) / (total_ns / 1e9) if total_ns else float("inf"),
+        "p50_us": latencias[len(latencias) // 2] / 1000,
+        "p99_us": latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))] / 1000,
+        "amostras": len(latencias),
+    }
+
+
+def executar(filtro=None, tempo=0.3, mostrar=True):
+    """Roda os benchmarks (opcionalmente só os que contêm `filtro` no nome)"""
+    resultados = {}
+    for nome, funcao, argumentos in _benchmarks():
+        if filtro and filtro not in nome:
+            continue
+        resultados[nome] = medir(funcao, argumentos, tempo)
+        if mostrar:
+            print(_linha(nome, resultados[nome]), flush=True)
+    return resultados
+
+
+def _linha(nome, resultado, comparacao=""):
+    return (f"{nome:<58} {resultado['ops_por_segundo']:>12,.0f} ops/s "
+            f"p50 {resultado['p50_us']:>9.2f} µs  p99 {resultado['p99_us']:>9.2f} µs{comparacao}")
+
+
+def comparar(resultados, baseline, limite=0.10):
+    """
+    Compara a mediana (p50) de cada benchmark com o baseline.
+    Retorna a lista de benchmarks mais lentos que o baseline além de `limite`.
+    """
+    regressoes = []
+    print(f"Comparação com o baseline de {baseline.get('ambiente', {}).get('data', '?')} "
+          f"(limite de {limite:.0%}):")
+    for nome, resultado in resultados.items():
+        anterior = baseline.get("resultados", {}).get(nome)
+        if not anterior:
+            print(_linha(nome, resultado, "  (novo)"))
+            continue
+        razao = resultado["p50_us"] / anterior["p50_us"] if anterior["p50_us"] else 1.0
+        if razao > 1 + limite:
+            situacao = f"  ❌ {razao:.2f}x mais lento"
+            regressoes.append(nome)
+        elif razao < 1 - limite:
+            situacao = f"  ✅ {1 / razao:.2f}x mais rápido"
+        else:
+            situacao = f"  = {razao:.2f}x"
+        print(_linha(nome, resultado, situacao))
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks do motor de cálculo do CPQ")
+    parser.add_argument("--snapshot", default=SNAPSHOT_PADRAO, help="JSON com as constantes (sem Supabase)")
+    parser.add_argument("--baseline", default=BASELINE_PADRAO, help="arquivo do baseline")
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava os resultados como baseline")
+    parser.add_argument("--filtro", help="roda só os benchmarks que contêm este texto no nome")
+    parser.add_argument("--tempo", type=float, default=0.3, help="segundos de medição por benchmark")
+    parser.add_argument("--limite", type=float, default=0.10,
+                        help="variação relativa do p50 considerada regressão (padrão 0.10)")
+    args = parser.parse_args(argv)
+
+    with open(args.snapshot, encoding="utf-8") as arquivo:
+        constants.carregar_snapshot(json.load(arquivo))
+
+    comparando = not args.salvar_baseline and os.path.exists(args.baseline)
+    resultados = executar(args.filtro, args.tempo, mostrar=not comparando)
+
+    if args.salvar_baseline:
+        baseline = {
+            "ambiente": {
+                "data": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+            },
+            "resultados": resultados,
+        }
+        with open(args.baseline, "w", encoding="utf-8") as arquivo:
+            json.dump(baseline, arquivo, indent=2, ensure_ascii=False)
+        print(f"\n✅ Baseline gravado em {args.baseline}")
+        return 0
+
+    if not comparando:
+        print(f"\nNenhum baseline em {args.baseline}; use --salvar-baseline para criar um.")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as arquivo:
+        baseline = json.load(arquivo)
+    regressoes = comparar(resultados, baseline, args.limite)
+    if regressoes:
+        print(f"\n❌ {len(regressoes)} benchmark(s) mais lentos que o baseline")
+        return 1
+    print("\n✅ Nenhuma regressão em relação ao baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Modelos de caixa paramétricos (tabela modelos_caixa no Supabase).
+
+Um modelo é descrito por uma lista de painéis planificados: retângulos
+(largura e altura) ou círculos (diâmetro), com as medidas dadas por
+expressões de L, H e P (largura, altura e profundidade da caixa em mm), das
+constantes do Supabase e de pi, na linguagem das regras de precificação.
+Cada painel pode informar quantas vezes aparece na caixa (quantidade) e o
+próprio perímetro de corte (perimetro; padrão: o contorno do retângulo ou
+do círculo). O modelo informa a área de colagem PVA (area_colagem), que
+também pode usar a área planificada total (area_caixa_completa_mm2).
+
+Exemplo (tampa-livro):
+
+    {"nome": "Tampa Livro",
+     "paineis": [{"forma": "retangulo", "largura": "L + 2 * P", "altura": "2 * H + P"}],
+     "area_colagem": "2 * (P * L) + 2 * (P * H)"}
+
+Cada modelo é compilado uma única vez (pricing_rules) em uma função escalar
+e em uma variante em lote, que calculam a área planificada, a área de
+colagem, o perímetro e as peças do encaixe na chapa. Os modelos escritos à
+mão em calculations.GEOMETRIAS têm precedência; os paramétricos acrescentam
+modelos novos sem mudança de código.
+"""
+
+import ast
+import hashlib
+import json
+import math
+import numpy as np
+from constants import get_modelos_caixa, registrar_limpeza_cache
+from pricing_rules import AssinaturaRegras, PricingRules
+
+FORMAS = ("retangulo", "circulo")
+
+# Entradas das funções compiladas e valores de geometria calculados para o CPQ
+_ENTRADAS = ("L", "H", "P")
+_GEOMETRIA = ("area_caixa_completa_mm2", "area_colagem_pva_mm2", "perimetro_mm")
+
+# Modelos já compilados, por hash do conteúdo, e os modelos ativos do Supabase por nome
+_modelos_compilados = {}
+_modelos_ativos = None
+
+
+class _TrocarPi(ast.NodeTransformer):
+    """Troca o nome pi pelo valor numérico (a linguagem das regras não tem constantes próprias)"""
+
+    def visit_Name(self, no):
+        if no.id == "pi":
+            return ast.copy_location(ast.Constant(math.pi), no)
+        return no
+
+
+def _expressao(texto):
+    """Texto da expressão com pi substituído (erros de sintaxe ficam para a validação das regras)"""
+    texto = str(texto)
+    try:
+        arvore = ast.parse(texto, mode="eval")
+    except SyntaxError:
+        return texto
+    return ast.unparse(_TrocarPi().visit(arvore))
+
+
+class BoxTemplate:
+    """
+    Modelo paramétrico compilado e imutável.
+
+    geometria() devolve o mesmo dicionário básico das funções de
+    calculations.GEOMETRIAS (area_caixa_completa_mm2, area_colagem_pva_mm2,
+    perimetro_mm e pecas), para escalares ou arrays NumPy.
+    """
+
+    __slots__ = ("nome", "paineis", "area_colagem", "versao", "regras", "_medidas", "_assinatura",
+                 "_assinatura_lote")
+
+    def __init__(self, nome, paineis, area_colagem):
+        if not paineis:
+            raise ValueError(f"Modelo '{nome}' sem painéis")
+
+        regras = []
+        areas = []
+        perimetros = []
+        medidas = []  # (largura, altura, quantidade) de cada painel, para as peças do encaixe
+        for numero, painel in enumerate(paineis, start=1):
+            prefixo = f"painel_{numero}"
+            forma = painel.get("forma", "retangulo")
+            if forma not in FORMAS:
+                raise ValueError(f"Modelo '{nome}': forma '{forma}' não suportada (use {' ou '.join(FORMAS)})")
+            quantidade = int(painel.get("quantidade", 1))
+            if quantidade <= 0:
+                raise ValueError(f"Modelo '{nome}': quantidade do painel {numero} deve ser maior que zero")
+
+            try:
+                if forma == "retangulo":
+                    regras.append((f"{prefixo}_largura", painel["largura"]))
+                    regras.append((f"{prefixo}_altura", painel["altura"]))
+                    medidas.append((f"{prefixo}_largura", f"{prefixo}_altura", quantidade))
+                    area = f"{prefixo}_largura * {prefixo}_altura"
+                    perimetro = f"2 * ({prefixo}_largura + {prefixo}_altura)"
+                else:
+                    regras.append((f"{prefixo}_diametro", painel["diametro"]))
+                    medidas.append((f"{prefixo}_diametro", f"{prefixo}_diametro", quantidade))
+                    area = f"({prefixo}_diametro / 2) ** 2 * pi"
+                    perimetro = f"{prefixo}_diametro * pi"
+            except KeyError as e:
+                raise ValueError(f"Modelo '{nome}': painel {numero} ({forma}) sem a medida {e.args[0]}")
+
+            perimetro = painel.get("perimetro", perimetro)
+            if quantidade > 1:
+                area = f"({area}) * {quantidade}"
+                perimetro = f"({perimetro}) * {quantidade}"
+            regras.append((f"{prefixo}_area", area))
+            regras.append((f"{prefixo}_perimetro", perimetro))
+            areas.append(f"{prefixo}_area")
+            perimetros.append(f"{prefixo}_perimetro")
+
+        regras.append(("area_caixa_completa_mm2", " + ".join(areas)))
+        regras.append(("perimetro_mm", " + ".join(perimetros)))
+        regras.append(("area_colagem_pva_mm2", area_colagem))
+
+        definir = super().__setattr__
+        definir("nome", nome)
+        definir("paineis", tuple(dict(painel) for painel in paineis))
+        definir("area_colagem", area_colagem)
+        definir("versao", _versao_modelo(nome, paineis, area_colagem))
+        definir("regras", PricingRules([(componente, _expressao(expressao)) for componente, expressao in regras]))
+        definir("_medidas", tuple(medidas))
+
+        # Saídas: geometria e as medidas (sem repetição) das peças, na ordem dos painéis
+        saidas = list(_GEOMETRIA)
+        for largura, altura, _ in medidas:
+            saidas += [nome_medida for nome_medida in (largura, altura) if nome_medida not in saidas]
+        definir("_assinatura", AssinaturaRegras(_ENTRADAS, saidas, tupla=True))
+        definir("_assinatura_lote", AssinaturaRegras(_ENTRADAS, saidas, vetorial=True, tupla=True))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BoxTemplate é imutável")
+
+    def geometria(self, largura, altura, profundidade, contexto):
+        """Geometria da caixa (escalares ou arrays NumPy), com as constantes do contexto"""
+        lote = any(isinstance(valor, np.ndarray) for valor in (largura, altura, profundidade))
+        assinatura = self._assinatura_lote if lote else self._assinatura
+        funcao = contexto.regras_vinculadas(assinatura, self.regras)
+        try:
+            valores = dict(zip(assinatura.saidas, funcao(largura, altura, profundidade)))
+        except NameError as e:
+            raise ValueError(f"Modelo '{self.nome}': {str(e)}")
+
+        pecas = []
+        for nome_largura, nome_altura, quantidade in self._medidas:
+            pecas += [(valores[nome_largura], valores[nome_altura])] * quantidade
+
+        return {
+            'area_caixa_completa_mm2': valores['area_caixa_completa_mm2'],
+            'area_colagem_pva_mm2': valores['area_colagem_pva_mm2'],
+            'perimetro_mm': valores['perimetro_mm'],
+            'pecas': tuple(pecas)
+        }
+
+    def __repr__(self):
+        return f"BoxTemplate('{self.nome}', {len(self.paineis)} painéis, versão {self.versao})"
+
+
+def _versao_modelo(nome, paineis, area_colagem):
+    """Hash do conteúdo de um modelo"""
+    conteudo = json.dumps([nome, list(paineis), area_colagem], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(conteudo.encode()).hexdigest()[:16]
+
+
+def compilar_modelo(nome, paineis, area_colagem):
+    """Compila um modelo paramétrico (memorizado pelo conteúdo); lança ValueError se for inválido"""
+    versao = _versao_modelo(nome, paineis, area_colagem)
+    if versao not in _modelos_compilados:
+        _modelos_compilados[versao] = BoxTemplate(nome, paineis, area_colagem)
+    return _modelos_compilados[versao]
+
+
+@registrar_limpeza_cache
+def limpar_modelos_parametricos():
+    """Descarta os modelos ativos carregados (chamada também por constants.clear_cache)"""
+    global _modelos_ativos
+    _modelos_ativos = None
+
+
+def modelos_parametricos():
+    """
+    Modelos paramétricos ativos do Supabase: dicionário {nome: BoxTemplate}.
+    Modelos inválidos são ignorados (com aviso).
+    """
+    global _modelos_ativos
+
+    # Se já temos cache, retornar
+    if _modelos_ativos is not None:
+        return _modelos_ativos
+
+    modelos = {}
+    for dados in get_modelos_caixa():
+        try:
+            modelos[dados['nome']] = compilar_modelo(dados['nome'], dados['paineis'], dados['area_colagem'])
+        except Exception as e:
+            print(f"⚠️ Modelo de caixa '{dados.get('nome')}' ignorado: {str(e)}")
+    _modelos_ativos = modelos
+    return _modelos_ativos
@@ -1,6 +1,9 @@
 import math
-from itertools import permutations
-from constants import get_constant
+import numpy as np
+from constants import get_pricing_context, get_caixas_despache
+from nesting import calcular_encaixe_chapa, calcular_encaixe_circulos
+from box_templates import modelos_parametricos
+from shipping import EMBALAGEM_PADRAO, calcular_max_caixas_embalagem, selecionar_caixas_despache
 from enum import Enum
 
 def calcular_area_papelao(largura, altura, profundidade, tipo_tampa):
@@ -40,23 +43,35 @@ def calcular_area_papelao(largura, altura, profundidade, tipo_tampa):
     else:
         return area_base
 
-def calcular_custo_papelao(largura, altura):
+def calcular_custo_papelao(largura, altura, contexto=None):
     """Calcula o custo do papelão baseado na área"""
+    if contexto is None:
+        contexto = get_pricing_context()
+    
     area_m2 = (largura * altura) / 10000  # Converter cm² para m²
-    return area_m2 * get_constant("custo_papelao_m2")
+    return area_m2 * contexto.custo_papelao_m2
 
-def calcular_custo_vinil_uv(largura_vinil, altura_vinil):
+def calcular_custo_vinil_uv(largura_vinil, altura_vinil, contexto=None):
     """Calcula o custo do vinil UV baseado na área"""
+    if contexto is None:
+        contexto = get_pricing_context()
+    
     area_m2 = (largura_vinil * altura_vinil) / 10000
-    return area_m2 * get_constant("custo_vinil_uv_por_m2")
+    return area_m2 * contexto.custo_vinil_uv_por_m2
 
-def calcular_custo_acrilico(largura_acrilico, altura_acrilico):
+def calcular_custo_acrilico(largura_acrilico, altura_acrilico, contexto=None):
     """Calcula o custo do acrílico baseado na área"""
+    if contexto is None:
+        contexto = get_pricing_context()
+    
     area_m2 = (largura_acrilico * altura_acrilico) / 10000
-    return area_m2 * get_constant("custo_acrilico_m2")
+    return area_m2 * contexto.custo_acrilico_m2
 
-def calcular_custo_ima_chapa_automatico(tipo_tampa, largura):
+def calcular_custo_ima_chapa_automatico(tipo_tampa, largura, contexto=None):
     """Calcula automaticamente o custo de imã + chapa baseado no tipo de tampa"""
+    if contexto is None:
+        contexto = get_pricing_context()
+    
     # Converter enum para string se necessário
     if hasattr(tipo_tampa, 'value'):
         tipo_tampa = tipo_tampa.value
@@ -64,64 +79,42 @@ def calcular_custo_ima_chapa_automatico(tipo_tampa, largura):
     if tipo_tampa == "Tampa Imã":
         # Regra: 1 par se largura ≤ 10cm, 2 pares se > 10cm
         num_pares = 1 if largura <= 10 else 2
-        return num_pares * get_constant("custo_ima_chapa_par")
+        return num_pares * contexto.custo_ima_chapa_par
     return 0
 
 def calcular_max_caixas_por_embalagem(largura, altura, profundidade):
     """Calcula o número máximo de caixas que cabem na embalagem 50x35x35"""
-    # Dimensões da caixa de papelão ondulado
-    embalagem_largura = 50
-    embalagem_altura = 35
-    embalagem_profundidade = 35
-    
-    # Verificar se alguma dimensão da caixa é maior que a dimensão correspondente da embalagem
-    # (considerando todas as rotações possíveis)
-    caixa_dims = [largura, altura, profundidade]
-    embalagem_dims = [embalagem_largura, embalagem_altura, embalagem_profundidade]
-    
-    # Verificar se a caixa cabe em alguma rotação
-    cabe_em_alguma_rotacao = False
-    for dims in permutations(caixa_dims):
-        l, a, p = dims
-        if l <= embalagem_largura and a <= embalagem_altura and p <= embalagem_profundidade:
-            cabe_em_alguma_rotacao = True
-            break
-    
-    # Se não cabe em nenhuma rotação, retorna 0
-    if not cabe_em_alguma_rotacao:
-        return 0
-    
-    max_caixas = 0
-    
-    # Testar todas as 6 rotações possíveis (3! = 6)
-    for dims in permutations(caixa_dims):
-        l, a, p = dims
-        
-        # Calcular quantas caixas cabem em cada direção
-        num_largura = embalagem_largura // l
-        num_altura = embalagem_altura // a
-        num_profundidade = embalagem_profundidade // p
-        
-        # Total de caixas para esta rotação
-        total_esta_rotacao = num_largura * num_altura * num_profundidade
-        
-        if total_esta_rotacao > max_caixas:
-            max_caixas = total_esta_rotacao
-    
-    return max_caixas
+    # Combina blocos de orientações diferentes; dimensões inteiras (cm) vêm da tabela pré-calculada
+    return calcular_max_caixas_embalagem(largura, altura, profundidade, EMBALAGEM_PADRAO)
 
-def calcular_custo_caixa_papelao(num_caixas_por_embalagem):
-    """Calcula o custo da caixa de papelão ondulado por unidade"""
-    if num_caixas_por_embalagem > 0:
-        return get_constant("custo_caixa_despache_unidade") / num_caixas_por_embalagem
-    return 0
+def calcular_custo_caixa_papelao(largura, altura, profundidade, quantidade, contexto=None):
+    """
+    Calcula as caixas de papelão ondulado de menor custo para despachar o pedido
+    (dimensões em cm), entre as do catálogo caixas_despache; sem catálogo, usa
+    a embalagem 50x35x35 a custo_caixa_despache_unidade.
+    Retorna o dicionário de selecionar_caixas_despache.
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
+    
+    caixas = get_caixas_despache() or [{
+        'nome': 'Padrão',
+        'largura_cm': EMBALAGEM_PADRAO[0],
+        'altura_cm': EMBALAGEM_PADRAO[1],
+        'profundidade_cm': EMBALAGEM_PADRAO[2],
+        'custo': contexto.custo_caixa_despache_unidade
+    }]
+    return selecionar_caixas_despache(largura, altura, profundidade, quantidade, caixas)
 
-def aplicar_multiplicador_complexidade(custo_variavel, tem_berco, tem_nicho):
+def aplicar_multiplicador_complexidade(custo_variavel, tem_berco, tem_nicho, contexto=None):
     """Aplica multiplicador de complexidade"""
+    if contexto is None:
+        contexto = get_pricing_context()
+    
     if tem_berco and tem_nicho:
-        return custo_variavel * get_constant("multiplicador_ambos")
+        return custo_variavel * contexto.multiplicador_ambos
     elif tem_berco:
-        return custo_variavel * get_constant("multiplicador_berco")
+        return custo_variavel * contexto.multiplicador_berco
     else:
         return custo_variavel
 
@@ -161,439 +154,435 @@ def determinar_revestimentos_disponiveis(estrutura):
     else:
         return []
 
-def calcular_planificacao_tampa_solta(largura, altura, profundidade):
+def _maximo(a, b):
+    """max() que também funciona elemento a elemento com arrays NumPy"""
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return np.maximum(a, b)
+    return max(a, b)
+
+def _geometria_base_tampa(largura_mm, altura_mm, profundidade_mm, contexto):
     """
-    Calcula a planificação para caixas com tampa solta
-    Retorna: (area_base, area_tampa, caixas_por_chapa, chapas_necessarias)
+    Base e tampa planificadas compartilhadas por tampa solta, imã e luva
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
-    
     # Cálculo da base planificada
     largura_base_planificada = largura_mm + 2 * profundidade_mm
     altura_base_planificada = altura_mm + 2 * profundidade_mm
     area_base_planificada = largura_base_planificada * altura_base_planificada
     
-    # Cálculo da tampa solta
     # Profundidade da tampa é fixa em 25mm
     profundidade_tampa_mm = 25
     
     # Largura e altura da face central da tampa (maior que a base em 3×espessura)
-    largura_tampa = largura_mm + 3 * get_constant("espessura_papelao_mm")
-    altura_tampa = altura_mm + 3 * get_constant("espessura_papelao_mm")
+    espessura_mm = contexto.espessura_papelao_mm
+    largura_tampa = largura_mm + 3 * espessura_mm
+    altura_tampa = altura_mm + 3 * espessura_mm
     
     # Planificação da tampa
     largura_tampa_planificada = largura_tampa + 2 * profundidade_tampa_mm
     altura_tampa_planificada = altura_tampa + 2 * profundidade_tampa_mm
     area_tampa_planificada = largura_tampa_planificada * altura_tampa_planificada
     
-    # Calcular quantas caixas completas cabem em uma chapa
-    # Área disponível na chapa (descontando margens)
-    area_disponivel = (get_constant("largura_placa_papelao_mm") - get_constant("margem_mm")) * (get_constant("altura_placa_papelao_mm") - get_constant("margem_mm"))
-    
-    # Área necessária para uma caixa completa (base + tampa)
-    area_caixa_completa = area_base_planificada + area_tampa_planificada
-    
-    # Número de caixas que cabem em uma chapa
-    caixas_por_chapa = int(area_disponivel / area_caixa_completa)
+    # Perímetros da base e da tampa planificadas
+    perimetro_base = 2 * (largura_base_planificada + altura_base_planificada)
+    perimetro_tampa = 2 * (largura_tampa_planificada + altura_tampa_planificada)
     
     return {
         'area_base_mm2': area_base_planificada,
         'area_tampa_mm2': area_tampa_planificada,
-        'area_caixa_completa_mm2': area_caixa_completa,
-        'caixas_por_chapa': caixas_por_chapa,
         'dimensoes_base': (largura_base_planificada, altura_base_planificada),
-        'dimensoes_tampa': (largura_tampa_planificada, altura_tampa_planificada)
+        'dimensoes_tampa': (largura_tampa_planificada, altura_tampa_planificada),
+        'perimetro_base_mm': perimetro_base,
+        'perimetro_tampa_mm': perimetro_tampa
     }
 
-def calcular_planificacao_tampa_livro(largura, altura, profundidade):
+def calcular_geometria_tampa_solta(largura, altura, profundidade, contexto=None):
     """
-    Calcula a planificação para caixas com tampa-livro
-    Retorna: (area_planificada, caixas_por_chapa, chapas_necessarias)
+    Calcula de uma só vez a planificação, a área de colagem PVA e o perímetro
+    de uma caixa com tampa solta. Aceita escalares ou arrays NumPy.
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
+    if contexto is None:
+        contexto = get_pricing_context()
+    
+    geometria = _geometria_base_tampa(largura, altura, profundidade, contexto)
     
-    # Cálculo da planificação da tampa-livro
+    # Área necessária para uma caixa completa (base + tampa)
+    area_caixa_completa = geometria['area_base_mm2'] + geometria['area_tampa_mm2']
+    
+    geometria['area_caixa_completa_mm2'] = area_caixa_completa
+    geometria['pecas'] = (geometria['dimensoes_base'], geometria['dimensoes_tampa'])
+    # A cola PVA é aplicada em toda a área do papelão
+    geometria['area_colagem_pva_mm2'] = area_caixa_completa
+    geometria['perimetro_mm'] = geometria['perimetro_base_mm'] + geometria['perimetro_tampa_mm']
+    return geometria
+
+def calcular_geometria_tampa_livro(largura, altura, profundidade, contexto=None):
+    """
+    Calcula de uma só vez a planificação, a área de colagem PVA e o perímetro
+    de uma caixa com tampa-livro. Aceita escalares ou arrays NumPy.
+    """
     # Largura planificada = largura da base + 2 × profundidade
-    largura_planificada = largura_mm + 2 * profundidade_mm
+    largura_planificada = largura + 2 * profundidade
     
     # Altura planificada = 2 × altura + profundidade
-    altura_planificada = 2 * altura_mm + profundidade_mm
+    altura_planificada = 2 * altura + profundidade
     
-    # Área planificada
     area_planificada = largura_planificada * altura_planificada
     
-    # Calcular quantas caixas cabem por chapa
-    # Colunas por chapa = parte inteira de: 1040 ÷ (largura planificada + margem)
-    colunas_por_chapa = int(get_constant("largura_placa_papelao_mm") / (largura_planificada + get_constant("margem_mm")))
-    
-    # Linhas por chapa = parte inteira de: 860 ÷ (altura planificada + margem)
-    linhas_por_chapa = int(get_constant("altura_placa_papelao_mm") / (altura_planificada + get_constant("margem_mm")))
-    
-    # Caixas por chapa = colunas × linhas
-    caixas_por_chapa = colunas_por_chapa * linhas_por_chapa
+    # Para tampa-livro, a colagem é nas laterais
+    area_laterais_largura = 2 * (profundidade * largura)
+    area_laterais_altura = 2 * (profundidade * altura)
     
     return {
         'area_planificada_mm2': area_planificada,
-        'caixas_por_chapa': caixas_por_chapa,
+        'area_caixa_completa_mm2': area_planificada,
         'dimensoes_planificacao': (largura_planificada, altura_planificada),
-        'colunas_por_chapa': colunas_por_chapa,
-        'linhas_por_chapa': linhas_por_chapa
+        'pecas': ((largura_planificada, altura_planificada),),
+        'area_colagem_pva_mm2': area_laterais_largura + area_laterais_altura,
+        'area_laterais_largura_mm2': area_laterais_largura,
+        'area_laterais_altura_mm2': area_laterais_altura,
+        'perimetro_mm': 2 * (largura_planificada + altura_planificada)
     }
 
-def calcular_planificacao_tampa_ima(largura, altura, profundidade):
+def calcular_geometria_tampa_ima(largura, altura, profundidade, contexto=None):
     """
-    Calcula a planificação para caixas com tampa-imã
-    Retorna: (area_base, area_tampa, area_ima, caixas_por_chapa)
+    Calcula de uma só vez a planificação, a área de colagem PVA e o perímetro
+    de uma caixa com tampa-imã. Aceita escalares ou arrays NumPy.
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
+    if contexto is None:
+        contexto = get_pricing_context()
     
-    # Cálculo da base planificada
-    largura_base_planificada = largura_mm + 2 * profundidade_mm
-    altura_base_planificada = altura_mm + 2 * profundidade_mm
-    area_base_planificada = largura_base_planificada * altura_base_planificada
+    geometria = _geometria_base_tampa(largura, altura, profundidade, contexto)
     
-    # Cálculo da tampa com imã
-    # Profundidade da tampa é fixa em 25mm
-    profundidade_tampa_mm = 25
+    # Cálculo da área para imã (2cm de altura)
+    altura_ima_mm = 20
+    area_ima_planificada = largura * altura_ima_mm
     
-    # Largura e altura da face central da tampa (maior que a base em 3×espessura)
-    largura_tampa = largura_mm + 3 * get_constant("espessura_papelao_mm")
-    altura_tampa = altura_mm + 3 * get_constant("espessura_papelao_mm")
+    # Área de colagem = área das laterais da base
+    area_laterais_largura = 2 * (largura * profundidade)
+    area_laterais_altura = 2 * (altura * profundidade)
+    
+    geometria['area_ima_mm2'] = area_ima_planificada
+    geometria['dimensoes_ima'] = (largura, altura_ima_mm)
+    geometria['area_caixa_completa_mm2'] = geometria['area_base_mm2'] + geometria['area_tampa_mm2'] + area_ima_planificada
+    geometria['pecas'] = (geometria['dimensoes_base'], geometria['dimensoes_tampa'], geometria['dimensoes_ima'])
+    geometria['area_colagem_pva_mm2'] = area_laterais_largura + area_laterais_altura
+    geometria['area_laterais_largura_mm2'] = area_laterais_largura
+    geometria['area_laterais_altura_mm2'] = area_laterais_altura
+    geometria['perimetro_mm'] = geometria['perimetro_base_mm'] + geometria['perimetro_tampa_mm'] + 2 * (largura + altura_ima_mm)
+    return geometria
+
+def calcular_geometria_tampa_luva(largura, altura, profundidade, contexto=None):
+    """
+    Calcula de uma só vez a planificação, a área de colagem PVA e o perímetro
+    de uma caixa com tampa-luva. Aceita escalares ou arrays NumPy.
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
     
-    # Planificação da tampa
-    largura_tampa_planificada = largura_tampa + 2 * profundidade_tampa_mm
-    altura_tampa_planificada = altura_tampa + 2 * profundidade_tampa_mm
-    area_tampa_planificada = largura_tampa_planificada * altura_tampa_planificada
+    geometria = _geometria_base_tampa(largura, altura, profundidade, contexto)
     
-    # Cálculo da área para imã (2cm de altura)
-    altura_ima_mm = 20  # 2cm
-    area_ima_planificada = largura_mm * altura_ima_mm
+    # A aba tem a largura da caixa e profundidade de 15mm
+    profundidade_aba = 15
+    area_aba_planificada = largura * profundidade_aba
     
-    # Calcular quantas caixas completas cabem em uma chapa
-    # Área disponível na chapa (descontando margens)
-    area_disponivel = (get_constant("largura_placa_papelao_mm") - get_constant("margem_mm")) * (get_constant("altura_placa_papelao_mm") - get_constant("margem_mm"))
+    # Área de colagem = área das laterais da base
+    area_laterais_largura = 2 * (largura * profundidade)
+    area_laterais_altura = 2 * (altura * profundidade)
+    
+    geometria['area_aba_mm2'] = area_aba_planificada
+    geometria['dimensoes_aba'] = (largura, profundidade_aba)
+    geometria['area_caixa_completa_mm2'] = geometria['area_base_mm2'] + geometria['area_tampa_mm2'] + area_aba_planificada
+    geometria['pecas'] = (geometria['dimensoes_base'], geometria['dimensoes_tampa'], geometria['dimensoes_aba'])
+    geometria['area_colagem_pva_mm2'] = area_laterais_largura + area_laterais_altura
+    geometria['area_laterais_largura_mm2'] = area_laterais_largura
+    geometria['area_laterais_altura_mm2'] = area_laterais_altura
+    # Perímetro da aba lateral
+    geometria['perimetro_mm'] = geometria['perimetro_base_mm'] + geometria['perimetro_tampa_mm'] + 2 * (largura + profundidade)
+    return geometria
+
+def calcular_geometria_tampa_redonda(largura, altura, profundidade, contexto=None):
+    """
+    Calcula de uma só vez a planificação, a área de colagem PVA e o perímetro
+    de uma caixa com tampa redonda. Aceita escalares ou arrays NumPy.
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
+    
+    # Para caixas redondas, usar o diâmetro maior
+    diametro = _maximo(largura, altura)
     
-    # Área necessária para uma caixa completa (base + tampa + imã)
-    area_caixa_completa = area_base_planificada + area_tampa_planificada + area_ima_planificada
+    # Base circular e tampa um pouco maior (3mm de cada lado)
+    area_base = (diametro / 2) ** 2 * math.pi
+    diametro_tampa = diametro + 6
+    area_tampa = (diametro_tampa / 2) ** 2 * math.pi
     
-    # Número de caixas que cabem em uma chapa
-    caixas_por_chapa = int(area_disponivel / area_caixa_completa)
+    # Área de colagem = perímetro da base × profundidade
+    perimetro_base = diametro * math.pi
+    
+    # Perímetro de papelão: base e tampa circulares a partir da largura
+    raio_mm = largura / 2
+    raio_tampa_mm = raio_mm + 3 * contexto.espessura_papelao_mm
     
     return {
-        'area_base_mm2': area_base_planificada,
-        'area_tampa_mm2': area_tampa_planificada,
-        'area_ima_mm2': area_ima_planificada,
-        'area_caixa_completa_mm2': area_caixa_completa,
-        'caixas_por_chapa': caixas_por_chapa,
-        'dimensoes_base': (largura_base_planificada, altura_base_planificada),
-        'dimensoes_tampa': (largura_tampa_planificada, altura_tampa_planificada),
-        'dimensoes_ima': (largura_mm, altura_ima_mm)
+        'area_base_mm2': area_base,
+        'area_tampa_mm2': area_tampa,
+        'area_caixa_completa_mm2': area_base + area_tampa,
+        'diametro_base': diametro,
+        'diametro_tampa': diametro_tampa,
+        # Peças circulares: quadrado que as contém (encaixe retangular) e diâmetros (encaixe de círculos)
+        'pecas': ((diametro, diametro), (diametro_tampa, diametro_tampa)),
+        'diametros': (diametro, diametro_tampa),
+        'area_colagem_pva_mm2': perimetro_base * profundidade,
+        'perimetro_base_mm': perimetro_base,
+        'perimetro_mm': 2 * math.pi * raio_mm + 2 * math.pi * raio_tampa_mm
     }
 
-def calcular_planificacao_tampa_luva(largura, altura, profundidade):
+# Núcleo de geometria de cada modelo de caixa
+GEOMETRIAS = {
+    "Tampa Solta": calcular_geometria_tampa_solta,
+    "Tampa Livro": calcular_geometria_tampa_livro,
+    "Tampa Imã": calcular_geometria_tampa_ima,
+    "Tampa Luva": calcular_geometria_tampa_luva,
+    "Tampa Redonda": calcular_geometria_tampa_redonda
+}
+
+def calcular_geometria(largura, altura, profundidade, tipo_tampa, contexto=None):
     """
-    Calcula a planificação para caixas com tampa-luva
-    Retorna: (area_base, area_tampa, area_aba, caixas_por_chapa)
+    Calcula toda a geometria de uma caixa (planificação, área de colagem PVA e
+    perímetro) em uma única chamada, a partir do tipo de tampa. Modelos fora
+    de GEOMETRIAS vêm dos modelos paramétricos (box_templates)
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
+    # Converter enum para string se necessário
+    if hasattr(tipo_tampa, 'value'):
+        tipo_tampa = tipo_tampa.value
     
-    # Cálculo da base planificada
-    largura_base_planificada = largura_mm + 2 * profundidade_mm
-    altura_base_planificada = altura_mm + 2 * profundidade_mm
-    area_base_planificada = largura_base_planificada * altura_base_planificada
+    if tipo_tampa in GEOMETRIAS:
+        return GEOMETRIAS[tipo_tampa](largura, altura, profundidade, contexto)
     
-    # Cálculo da tampa-luva
-    # Profundidade da tampa é fixa em 25mm
-    profundidade_tampa_mm = 25
+    modelo = modelos_parametricos().get(tipo_tampa)
+    if modelo is None:
+        raise ValueError(f"Modelo '{tipo_tampa}' não suportado")
+    if contexto is None:
+        contexto = get_pricing_context()
+    return modelo.geometria(largura, altura, profundidade, contexto)
+
+def calcular_encaixe_pecas(geometria, contexto):
+    """
+    Encaixa as peças planificadas de uma caixa na chapa de papelão; peças
+    circulares usam também o encaixe de círculos, e vale o que couber mais
+    """
+    encaixe = calcular_encaixe_chapa(
+        geometria['pecas'],
+        contexto.largura_placa_papelao_mm,
+        contexto.altura_placa_papelao_mm,
+        contexto.margem_mm
+    )
+    if 'diametros' in geometria:
+        encaixe_circulos = calcular_encaixe_circulos(
+            geometria['diametros'],
+            contexto.largura_placa_papelao_mm,
+            contexto.altura_placa_papelao_mm,
+            contexto.margem_mm
+        )
+        if encaixe_circulos['caixas_por_chapa'] > encaixe['caixas_por_chapa']:
+            return encaixe_circulos
+    return encaixe
+
+def calcular_planificacao_tampa_solta(largura, altura, profundidade, contexto=None):
+    """
+    Calcula a planificação para caixas com tampa solta
+    Retorna: (area_base, area_tampa, caixas_por_chapa, chapas_necessarias)
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
     
-    # Largura e altura da face central da tampa (maior que a base em 3×espessura)
-    largura_tampa = largura_mm + 3 * get_constant("espessura_papelao_mm")
-    altura_tampa = altura_mm + 3 * get_constant("espessura_papelao_mm")
+    geometria = calcular_geometria_tampa_solta(largura, altura, profundidade, contexto)
     
-    # Planificação da tampa
-    largura_tampa_planificada = largura_tampa + 2 * profundidade_tampa_mm
-    altura_tampa_planificada = altura_tampa + 2 * profundidade_tampa_mm
-    area_tampa_planificada = largura_tampa_planificada * altura_tampa_planificada
+    # Encaixe real das peças (base + tampa) na chapa, com rotação
+    encaixe = calcular_encaixe_pecas(geometria, contexto)
+    caixas_por_chapa = encaixe['caixas_por_chapa']
     
-    # Cálculo da aba (para tampa-luva)
-    # A aba tem a largura da caixa e profundidade de 15mm
-    largura_aba = largura_mm
-    profundidade_aba = 15
-    area_aba_planificada = largura_aba * profundidade_aba
+    return {
+        'area_base_mm2': geometria['area_base_mm2'],
+        'area_tampa_mm2': geometria['area_tampa_mm2'],
+        'area_caixa_completa_mm2': geometria['area_caixa_completa_mm2'],
+        'caixas_por_chapa': caixas_por_chapa,
+        'layout_chapa': encaixe['layout'],
+        'dimensoes_base': geometria['dimensoes_base'],
+        'dimensoes_tampa': geometria['dimensoes_tampa']
+    }
+
+def calcular_planificacao_tampa_livro(largura, altura, profundidade, contexto=None):
+    """
+    Calcula a planificação para caixas com tampa-livro
+    Retorna: (area_planificada, caixas_por_chapa, chapas_necessarias)
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
     
-    # Calcular quantas caixas completas cabem em uma chapa
-    # Área disponível na chapa (descontando margens)
-    area_disponivel = (get_constant("largura_placa_papelao_mm") - get_constant("margem_mm")) * (get_constant("altura_placa_papelao_mm") - get_constant("margem_mm"))
+    geometria = calcular_geometria_tampa_livro(largura, altura, profundidade, contexto)
+    largura_planificada, altura_planificada = geometria['dimensoes_planificacao']
     
-    # Área necessária para uma caixa completa (base + tampa + aba)
-    area_caixa_completa = area_base_planificada + area_tampa_planificada + area_aba_planificada
+    # Calcular quantas caixas cabem por chapa
+    # Colunas por chapa = parte inteira de: 1040 ÷ (largura planificada + margem)
+    colunas_por_chapa = int(contexto.largura_placa_papelao_mm / (largura_planificada + contexto.margem_mm))
     
-    # Número de caixas que cabem em uma chapa
-    caixas_por_chapa = int(area_disponivel / area_caixa_completa)
+    # Linhas por chapa = parte inteira de: 860 ÷ (altura planificada + margem)
+    linhas_por_chapa = int(contexto.altura_placa_papelao_mm / (altura_planificada + contexto.margem_mm))
+    
+    # Caixas por chapa = colunas × linhas
+    caixas_por_chapa = colunas_por_chapa * linhas_por_chapa
     
     return {
-        'area_base_mm2': area_base_planificada,
-        'area_tampa_mm2': area_tampa_planificada,
-        'area_aba_mm2': area_aba_planificada,
-        'area_caixa_completa_mm2': area_caixa_completa,
+        'area_planificada_mm2': geometria['area_planificada_mm2'],
         'caixas_por_chapa': caixas_por_chapa,
-        'dimensoes_base': (largura_base_planificada, altura_base_planificada),
-        'dimensoes_tampa': (largura_tampa_planificada, altura_tampa_planificada),
-        'dimensoes_aba': (largura_mm, profundidade_aba)
-    } 
+        'dimensoes_planificacao': geometria['dimensoes_planificacao'],
+        'colunas_por_chapa': colunas_por_chapa,
+        'linhas_por_chapa': linhas_por_chapa
+    }
 
-def calcular_area_colagem_pva_tampa_solta(largura, altura, profundidade):
+def calcular_planificacao_tampa_ima(largura, altura, profundidade, contexto=None):
     """
-    Calcula a área de colagem PVA para tampa solta
+    Calcula a planificação para caixas com tampa-imã
+    Retorna: (area_base, area_tampa, area_ima, caixas_por_chapa)
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
+    if contexto is None:
+        contexto = get_pricing_context()
     
-    # Para tampa solta, a cola PVA é aplicada em toda a área do papelão
-    # Usar a mesma lógica da planificação para obter a área total
+    geometria = calcular_geometria_tampa_ima(largura, altura, profundidade, contexto)
     
-    # Cálculo da base planificada
-    largura_base_planificada = largura_mm + 2 * profundidade_mm
-    altura_base_planificada = altura_mm + 2 * profundidade_mm
-    area_base_planificada = largura_base_planificada * altura_base_planificada
+    # Encaixe real das peças (base + tampa + imã) na chapa, com rotação
+    encaixe = calcular_encaixe_pecas(geometria, contexto)
+    caixas_por_chapa = encaixe['caixas_por_chapa']
     
-    # Cálculo da tampa planificada
-    profundidade_tampa_mm = 25
-    largura_tampa = largura_mm + 3 * get_constant("espessura_papelao_mm")
-    altura_tampa = altura_mm + 3 * get_constant("espessura_papelao_mm")
-    largura_tampa_planificada = largura_tampa + 2 * profundidade_tampa_mm
-    altura_tampa_planificada = altura_tampa + 2 * profundidade_tampa_mm
-    area_tampa_planificada = largura_tampa_planificada * altura_tampa_planificada
+    return {
+        'area_base_mm2': geometria['area_base_mm2'],
+        'area_tampa_mm2': geometria['area_tampa_mm2'],
+        'area_ima_mm2': geometria['area_ima_mm2'],
+        'area_caixa_completa_mm2': geometria['area_caixa_completa_mm2'],
+        'caixas_por_chapa': caixas_por_chapa,
+        'layout_chapa': encaixe['layout'],
+        'dimensoes_base': geometria['dimensoes_base'],
+        'dimensoes_tampa': geometria['dimensoes_tampa'],
+        'dimensoes_ima': geometria['dimensoes_ima']
+    }
+
+def calcular_planificacao_tampa_luva(largura, altura, profundidade, contexto=None):
+    """
+    Calcula a planificação para caixas com tampa-luva
+    Retorna: (area_base, area_tampa, area_aba, caixas_por_chapa)
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
     
-    # Área total de colagem (base + tampa)
-    area_colagem_total = area_base_planificada + area_tampa_planificada
+    geometria = calcular_geometria_tampa_luva(largura, altura, profundidade, contexto)
+    
+    # Encaixe real das peças (base + tampa + aba) na chapa, com rotação
+    encaixe = calcular_encaixe_pecas(geometria, contexto)
+    caixas_por_chapa = encaixe['caixas_por_chapa']
     
     return {
-        'area_colagem_total_mm2': area_colagem_total,
-        'area_base_mm2': area_base_planificada,
-        'area_tampa_mm2': area_tampa_planificada
+        'area_base_mm2': geometria['area_base_mm2'],
+        'area_tampa_mm2': geometria['area_tampa_mm2'],
+        'area_aba_mm2': geometria['area_aba_mm2'],
+        'area_caixa_completa_mm2': geometria['area_caixa_completa_mm2'],
+        'caixas_por_chapa': caixas_por_chapa,
+        'layout_chapa': encaixe['layout'],
+        'dimensoes_base': geometria['dimensoes_base'],
+        'dimensoes_tampa': geometria['dimensoes_tampa'],
+        'dimensoes_aba': geometria['dimensoes_aba']
     } 
 
-def calcular_area_colagem_pva_tampa_livro(largura, altura, profundidade):
+def calcular_area_colagem_pva_tampa_solta(largura, altura, profundidade, contexto=None):
     """
-    Calcula a área de colagem PVA para tampa-livro
+    Calcula a área de colagem PVA para tampa solta
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
-    
-    # Para tampa-livro, a colagem é nas laterais
-    area_laterais_largura = 2 * (profundidade_mm * largura_mm)
-    area_laterais_altura = 2 * (profundidade_mm * altura_mm)
+    geometria = calcular_geometria_tampa_solta(largura, altura, profundidade, contexto)
     
-    # Área total de colagem
-    area_colagem_total = area_laterais_largura + area_laterais_altura
+    return {
+        'area_colagem_total_mm2': geometria['area_colagem_pva_mm2'],
+        'area_base_mm2': geometria['area_base_mm2'],
+        'area_tampa_mm2': geometria['area_tampa_mm2']
+    } 
+
+def calcular_area_colagem_pva_tampa_livro(largura, altura, profundidade, contexto=None):
+    """
+    Calcula a área de colagem PVA para tampa-livro
+    """
+    geometria = calcular_geometria_tampa_livro(largura, altura, profundidade, contexto)
     
     return {
-        'area_colagem_total_mm2': area_colagem_total,
-        'area_laterais_largura_mm2': area_laterais_largura,
-        'area_laterais_altura_mm2': area_laterais_altura
+        'area_colagem_total_mm2': geometria['area_colagem_pva_mm2'],
+        'area_laterais_largura_mm2': geometria['area_laterais_largura_mm2'],
+        'area_laterais_altura_mm2': geometria['area_laterais_altura_mm2']
     } 
 
-def calcular_area_colagem_pva_tampa_ima(largura, altura, profundidade):
+def calcular_area_colagem_pva_tampa_ima(largura, altura, profundidade, contexto=None):
     """
     Calcula a área de colagem PVA para tampa-imã
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
-    
-    # Área de colagem = área das laterais da base
-    area_laterais_largura = 2 * (largura_mm * profundidade_mm)
-    area_laterais_altura = 2 * (altura_mm * profundidade_mm)
-    
-    # Área total de colagem
-    area_colagem_total = area_laterais_largura + area_laterais_altura
+    geometria = calcular_geometria_tampa_ima(largura, altura, profundidade, contexto)
     
     return {
-        'area_colagem_total_mm2': area_colagem_total,
-        'area_laterais_largura_mm2': area_laterais_largura,
-        'area_laterais_altura_mm2': area_laterais_altura
+        'area_colagem_total_mm2': geometria['area_colagem_pva_mm2'],
+        'area_laterais_largura_mm2': geometria['area_laterais_largura_mm2'],
+        'area_laterais_altura_mm2': geometria['area_laterais_altura_mm2']
     } 
 
-def calcular_planificacao_tampa_redonda(largura, altura, profundidade):
+def calcular_planificacao_tampa_redonda(largura, altura, profundidade, contexto=None):
     """
     Calcula a planificação para caixas com tampa redonda
     Retorna: (area_base, area_tampa, caixas_por_chapa)
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
-    
-    # Para caixas redondas, usar o diâmetro maior
-    diametro = max(largura_mm, altura_mm)
+    if contexto is None:
+        contexto = get_pricing_context()
     
-    # Cálculo da base planificada (circular)
-    area_base = (diametro / 2) ** 2 * math.pi  # π * r²
+    geometria = calcular_geometria_tampa_redonda(largura, altura, profundidade, contexto)
     
-    # Cálculo da tampa redonda
-    # A tampa é um pouco maior que a base
-    diametro_tampa = diametro + 6  # 3mm de cada lado
-    area_tampa = (diametro_tampa / 2) ** 2 * math.pi
-    
-    # Calcular quantas caixas completas cabem em uma chapa
-    # Área disponível na chapa (descontando margens)
-    area_disponivel = (get_constant("largura_placa_papelao_mm") - get_constant("margem_mm")) * (get_constant("altura_placa_papelao_mm") - get_constant("margem_mm"))
-    
-    # Área necessária para uma caixa completa (base + tampa)
-    area_caixa_completa = area_base + area_tampa
-    
-    # Número de caixas que cabem em uma chapa
-    caixas_por_chapa = int(area_disponivel / area_caixa_completa)
+    # Encaixe real das peças (base + tampa) na chapa, com rotação
+    encaixe = calcular_encaixe_pecas(geometria, contexto)
+    caixas_por_chapa = encaixe['caixas_por_chapa']
     
     return {
-        'area_base_mm2': area_base,
-        'area_tampa_mm2': area_tampa,
-        'area_caixa_completa_mm2': area_caixa_completa,
+        'area_base_mm2': geometria['area_base_mm2'],
+        'area_tampa_mm2': geometria['area_tampa_mm2'],
+        'area_caixa_completa_mm2': geometria['area_caixa_completa_mm2'],
         'caixas_por_chapa': caixas_por_chapa,
-        'diametro_base': diametro,
-        'diametro_tampa': diametro_tampa
+        'layout_chapa': encaixe['layout'],
+        'diametro_base': geometria['diametro_base'],
+        'diametro_tampa': geometria['diametro_tampa']
     }
 
-def calcular_perimetro_papelao(largura, altura, profundidade, tipo_tampa):
+def calcular_perimetro_papelao(largura, altura, profundidade, tipo_tampa, contexto=None):
     """
     Calcula o perímetro total do papelão necessário para a caixa
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
-    
-    if tipo_tampa == "Tampa Solta":
-        # Perímetro da base planificada
-        largura_base_planificada = largura_mm + 2 * profundidade_mm
-        altura_base_planificada = altura_mm + 2 * profundidade_mm
-        perimetro_base = 2 * (largura_base_planificada + altura_base_planificada)
-        
-        # Perímetro da tampa planificada
-        largura_tampa = largura_mm + 3 * get_constant("espessura_papelao_mm")
-        altura_tampa = altura_mm + 3 * get_constant("espessura_papelao_mm")
-        largura_tampa_planificada = largura_tampa + 2 * 25  # 25mm de profundidade da tampa
-        altura_tampa_planificada = altura_tampa + 2 * 25
-        perimetro_tampa = 2 * (largura_tampa_planificada + altura_tampa_planificada)
-        
-        perimetro_total = perimetro_base + perimetro_tampa
-        
-    elif tipo_tampa == "Tampa Livro":
-        # Perímetro da planificação única
-        largura_planificada = largura_mm + 2 * profundidade_mm
-        altura_planificada = 2 * altura_mm + profundidade_mm
-        perimetro_total = 2 * (largura_planificada + altura_planificada)
-        
-    elif tipo_tampa == "Tampa Imã":
-        # Perímetro da base planificada
-        largura_base_planificada = largura_mm + 2 * profundidade_mm
-        altura_base_planificada = altura_mm + 2 * profundidade_mm
-        perimetro_base = 2 * (largura_base_planificada + altura_base_planificada)
-        
-        # Perímetro da tampa planificada
-        largura_tampa = largura_mm + 3 * get_constant("espessura_papelao_mm")
-        altura_tampa = altura_mm + 3 * get_constant("espessura_papelao_mm")
-        largura_tampa_planificada = largura_tampa + 2 * 25
-        altura_tampa_planificada = altura_tampa + 2 * 25
-        perimetro_tampa = 2 * (largura_tampa_planificada + altura_tampa_planificada)
-        
-        # Perímetro do imã (largura × altura)
-        perimetro_ima = 2 * (largura_mm + 20)  # 20mm de altura do imã
-        
-        perimetro_total = perimetro_base + perimetro_tampa + perimetro_ima
-        
-    elif tipo_tampa == "Tampa Luva":
-        # Perímetro da base planificada
-        largura_base_planificada = largura_mm + 2 * profundidade_mm
-        altura_base_planificada = altura_mm + 2 * profundidade_mm
-        perimetro_base = 2 * (largura_base_planificada + altura_base_planificada)
-        
-        # Perímetro da tampa planificada
-        largura_tampa = largura_mm + 3 * get_constant("espessura_papelao_mm")
-        altura_tampa = altura_mm + 3 * get_constant("espessura_papelao_mm")
-        largura_tampa_planificada = largura_tampa + 2 * 25
-        altura_tampa_planificada = altura_tampa + 2 * 25
-        perimetro_tampa = 2 * (largura_tampa_planificada + altura_tampa_planificada)
-        
-        # Perímetro da aba lateral
-        perimetro_aba = 2 * (largura_mm + profundidade_mm)
-        
-        perimetro_total = perimetro_base + perimetro_tampa + perimetro_aba
-    elif tipo_tampa == "Tampa Redonda":
-        # Perímetro da base circular
-        diametro_mm = largura_mm
-        raio_mm = diametro_mm / 2
-        perimetro_base = 2 * math.pi * raio_mm
-        
-        # Perímetro da tampa circular
-        raio_tampa_mm = raio_mm + 3 * get_constant("espessura_papelao_mm")
-        perimetro_tampa = 2 * math.pi * raio_tampa_mm
-        
-        perimetro_total = perimetro_base + perimetro_tampa
-
+    perimetro_total = calcular_geometria(largura, altura, profundidade, tipo_tampa, contexto)['perimetro_mm']
     
     return {
         'perimetro_total_mm': perimetro_total,
         'perimetro_total_m': perimetro_total / 1000  # Converter para metros
     }
 
-def calcular_area_colagem_pva_tampa_luva(largura, altura, profundidade):
+def calcular_area_colagem_pva_tampa_luva(largura, altura, profundidade, contexto=None):
     """
     Calcula a área de colagem PVA para tampa-luva
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
-    
-    # Área de colagem = área das laterais da base
-    area_laterais_largura = 2 * (largura_mm * profundidade_mm)
-    area_laterais_altura = 2 * (altura_mm * profundidade_mm)
-    
-    # Área total de colagem
-    area_colagem_total = area_laterais_largura + area_laterais_altura
+    geometria = calcular_geometria_tampa_luva(largura, altura, profundidade, contexto)
     
     return {
-        'area_colagem_total_mm2': area_colagem_total,
-        'area_laterais_largura_mm2': area_laterais_largura,
-        'area_laterais_altura_mm2': area_laterais_altura
+        'area_colagem_total_mm2': geometria['area_colagem_pva_mm2'],
+        'area_laterais_largura_mm2': geometria['area_laterais_largura_mm2'],
+        'area_laterais_altura_mm2': geometria['area_laterais_altura_mm2']
     }
 
-def calcular_area_colagem_pva_tampa_redonda(largura, altura, profundidade):
+def calcular_area_colagem_pva_tampa_redonda(largura, altura, profundidade, contexto=None):
     """
     Calcula a área de colagem PVA para tampa redonda
     """
-    # As dimensões já estão em mm
-    largura_mm = largura
-    altura_mm = altura
-    profundidade_mm = profundidade
-    
-    # Para caixas redondas, usar o diâmetro maior
-    diametro = max(largura_mm, altura_mm)
-    
-    # Área de colagem = perímetro da base × profundidade
-    perimetro = diametro * math.pi  # π * d
-    area_colagem_total = perimetro * profundidade_mm
+    geometria = calcular_geometria_tampa_redonda(largura, altura, profundidade, contexto)
     
     return {
-        'area_colagem_total_mm2': area_colagem_total,
-        'perimetro_base_mm': perimetro
-    } 
\ No newline at end of file
+        'area_colagem_total_mm2': geometria['area_colagem_pva_mm2'],
+        'perimetro_base_mm': geometria['perimetro_base_mm']
+    }
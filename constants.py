@@ -1,9 +1,20 @@
 # Constantes para cálculo de custos de caixas
+from types import MappingProxyType
+import hashlib
 from supabase_client import get_supabase_manager
+from pricing_rules import compilar_regras
 
 # Cache para evitar múltiplas consultas ao Supabase
 _constants_cache = None
 _custos_fixos_cache = None
+_pricing_context_cache = None
+_caixas_despache_cache = None
+_regras_cache = None
+_modelos_cache = None
+_formatos_chapa_cache = None
+
+# Funções chamadas por clear_cache (caches derivados das constantes em outros módulos)
+_ao_limpar_cache = []
 
 # Função para obter custos fixos do Supabase
 def get_custos_fixos():
@@ -30,23 +41,25 @@ def get_custos_fixos_constantes():
     custos = get_custos_fixos_dinamicos()
     constants = get_constants()
     
+    return {
+        'TOTAL_CUSTOS_FIXOS': _somar_custos_fixos(custos),
+        'CAIXAS_POR_MES': _caixas_por_mes(constants)
+    }
+
+def _somar_custos_fixos(custos):
+    """Soma os custos fixos (ou usa o campo 'total', se existir)"""
     # Se existe campo 'total', usar ele. Senão, somar todos
     if isinstance(custos, dict):
         if 'total' in custos:
-            total_custos = custos['total']
-        else:
-            total_custos = sum(value for key, value in custos.items())
-    else:
-        raise Exception("Formato inválido de custos fixos")
-    
-    # Buscar 'caixas_por_mes' na tabela constants
+            return custos['total']
+        return sum(value for key, value in custos.items())
+    raise Exception("Formato inválido de custos fixos")
+
+def _caixas_por_mes(constants):
+    """Busca 'caixas_por_mes' na tabela constants"""
     if 'caixas_por_mes' not in constants:
         raise Exception("Campo 'caixas_por_mes' não encontrado na tabela constants do Supabase")
-    
-    return {
-        'TOTAL_CUSTOS_FIXOS': total_custos,
-        'CAIXAS_POR_MES': constants['caixas_por_mes']
-    }
+    return constants['caixas_por_mes']
 
 # Função para obter constantes do Supabase
 def get_constants():
@@ -69,9 +82,246 @@ def get_constant(name: str):
         raise Exception(f"Constante '{name}' não encontrada no Supabase")
     return constants[name]
 
+class PricingContext:
+    """
+    Retrato imutável das constantes e dos custos fixos usados em um orçamento.
+    
+    Cada constante conhecida vira um atributo (ex.: contexto.espessura_papelao_mm),
+    evitando uma chamada a get_constant por acesso. Constantes ausentes no
+    Supabase só geram erro quando lidas, como em get_constant.
+    """
+    
+    # Constantes da tabela constants lidas pelos cálculos
+    CONSTANTES = (
+        'espessura_papelao_mm',
+        'largura_placa_papelao_mm',
+        'altura_placa_papelao_mm',
+        'margem_mm',
+        'custo_papelao_m2',
+        'custo_vinil_uv_por_m2',
+        'custo_acrilico_m2',
+        'custo_ima_chapa_par',
+        'custo_caixa_despache_unidade',
+        'multiplicador_ambos',
+        'multiplicador_berco',
+        'consumo_cola_pva_ml_m2',
+        'custo_cola_pva_ml',
+        'consumo_cola_adesiva_ml_m',
+        'custo_cola_adesiva_ml',
+        'custo_papel_m2',
+        'custo_vinil_uv_m2',
+        'custo_serigrafia_cor',
+        'custo_impressao_a4',
+        'custo_impressao_a3',
+        'custo_cola_quente_fixo',
+        'custo_cola_isopor_fixo',
+        'custo_fita_m',
+        'custo_rebite_unidade',
+        'caixas_por_mes',
+    )
+    
+    __slots__ = CONSTANTES + ('constantes', 'custos_fixos', 'regras', 'total_custos_fixos', 'custo_fixo_unitario',
+                              '_versao', '_funcoes_regras')
+    
+    def __init__(self, constantes, custos_fixos, regras=None):
+        definir = super().__setattr__
+        definir('constantes', MappingProxyType(dict(constantes)))
+        definir('custos_fixos', MappingProxyType(dict(custos_fixos)))
+        # Regras de precificação compiladas (pricing_rules.PricingRules) ou None para as fórmulas padrão
+        definir('regras', regras)
+        definir('_funcoes_regras', {})
+        for nome in self.CONSTANTES:
+            if nome in constantes:
+                definir(nome, constantes[nome])
+        
+        total_custos_fixos = _somar_custos_fixos(dict(custos_fixos))
+        definir('total_custos_fixos', total_custos_fixos)
+        definir('custo_fixo_unitario', total_custos_fixos / _caixas_por_mes(constantes))
+    
+    def __getattr__(self, name):
+        # Só é chamado para slots não preenchidos: constante ausente no Supabase
+        if name in PricingContext.CONSTANTES:
+            raise Exception(f"Constante '{name}' não encontrada no Supabase")
+        raise AttributeError(name)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError("PricingContext é imutável")
+    
+    def __delattr__(self, name):
+        raise AttributeError("PricingContext é imutável")
+    
+    def __getitem__(self, name):
+        """Busca uma constante qualquer pelo nome, como get_constant"""
+        if name not in self.constantes:
+            raise Exception(f"Constante '{name}' não encontrada no Supabase")
+        return self.constantes[name]
+    
+    @property
+    def versao(self):
+        """Impressão digital das constantes e custos fixos, usada em chaves de cache"""
+        try:
+            return object.__getattribute__(self, '_versao')
+        except AttributeError:
+            pass
+        
+        def serializar(valor):
+            # Arrays (contextos em lote) entram pelo conteúdo binário
+            return valor.tobytes() if getattr(valor, 'ndim', 0) > 0 else repr(float(valor)).encode()
+        
+        digest = hashlib.sha256()
+        for origem in (self.constantes, self.custos_fixos):
+            for nome in sorted(origem):
+                digest.update(nome.encode() + b'=' + serializar(origem[nome]) + b';')
+            digest.update(b'|')
+        if self.regras is not None:
+            digest.update(self.regras.versao.encode())
+        versao = digest.hexdigest()[:16]
+        super().__setattr__('_versao', versao)
+        return versao
+    
+    def regras_vinculadas(self, assinatura, regras=None):
+        """
+        Função compilada das regras de precificação (ou de outro PricingRules,
+        como o de um modelo de caixa paramétrico) com as constantes deste
+        contexto já ligadas (memorizada por AssinaturaRegras)
+        """
+        try:
+            return self._funcoes_regras[assinatura]
+        except KeyError:
+            globais = dict(self.constantes)
+            globais.update(
+                custo_fixo_unitario=self.custo_fixo_unitario,
+                total_custos_fixos=self.total_custos_fixos
+            )
+            if regras is None:
+                regras = self.regras
+            self._funcoes_regras[assinatura] = regras.vincular(assinatura, globais)
+            return self._funcoes_regras[assinatura]
+    
+    def selecionar(self, linhas):
+        """
+        Restringe o contexto a algumas linhas quando as constantes são arrays
+        (um valor por linha do cálculo em lote); valores escalares são mantidos
+        """
+        def recortar(valores):
+            return {nome: valor[linhas] if getattr(valor, 'ndim', 0) > 0 else valor
+                    for nome, valor in valores.items()}
+        
+        if not any(getattr(valor, 'ndim', 0) > 0
+                   for valor in list(self.constantes.values()) + list(self.custos_fixos.values())):
+            return self
+        return PricingContext(recortar(self.constantes), recortar(self.custos_fixos), self.regras)
+    
+    def __repr__(self):
+        return f"PricingContext({len(self.constantes)} constantes, {len(self.custos_fixos)} custos fixos)"
+
+# Função para obter o contexto de precificação (constantes + custos fixos)
+def get_pricing_context():
+    """Retorna um PricingContext com as constantes e custos fixos atuais"""
+    global _pricing_context_cache
+    
+    # Se já temos cache, retornar
+    if _pricing_context_cache is not None:
+        return _pricing_context_cache
+    
+    _pricing_context_cache = PricingContext(
+        get_constants(), get_custos_fixos_dinamicos(), compilar_regras(get_regras_precificacao(), get_constants())
+    )
+    return _pricing_context_cache
+
+# Função para obter o catálogo de caixas de despache do Supabase
+def get_caixas_despache():
+    """Busca o catálogo de caixas de despache do Supabase"""
+    global _caixas_despache_cache
+    
+    # Se já temos cache, retornar
+    if _caixas_despache_cache is not None:
+        return _caixas_despache_cache
+    
+    supabase_manager = get_supabase_manager()
+    _caixas_despache_cache = supabase_manager.get_caixas_despache()
+    return _caixas_despache_cache
+
+# Função para obter as regras de precificação do Supabase
+def get_regras_precificacao():
+    """Busca as regras de precificação do Supabase (lista vazia = fórmulas padrão)"""
+    global _regras_cache
+    
+    # Se já temos cache, retornar
+    if _regras_cache is not None:
+        return _regras_cache
+    
+    supabase_manager = get_supabase_manager()
+    _regras_cache = supabase_manager.get_regras_precificacao()
+    return _regras_cache
+
+# Função para obter os modelos de caixa paramétricos do Supabase
+def get_modelos_caixa():
+    """Busca os modelos de caixa paramétricos do Supabase (lista vazia = só os modelos padrão)"""
+    global _modelos_cache
+    
+    # Se já temos cache, retornar
+    if _modelos_cache is not None:
+        return _modelos_cache
+    
+    supabase_manager = get_supabase_manager()
+    _modelos_cache = supabase_manager.get_modelos_caixa()
+    return _modelos_cache
+
+# Função para obter o catálogo de formatos de chapa de papelão do Supabase
+def get_formatos_chapa():
+    """Busca o catálogo de formatos de chapa de papelão do Supabase (lista vazia = só a chapa padrão)"""
+    global _formatos_chapa_cache
+    
+    # Se já temos cache, retornar
+    if _formatos_chapa_cache is not None:
+        return _formatos_chapa_cache
+    
+    supabase_manager = get_supabase_manager()
+    _formatos_chapa_cache = supabase_manager.get_formatos_chapa()
+    return _formatos_chapa_cache
+
+# Função para registrar caches derivados que devem ser limpos junto com as constantes
+def registrar_limpeza_cache(funcao):
+    """Registra uma função chamada sempre que clear_cache() for executado"""
+    if funcao not in _ao_limpar_cache:
+        _ao_limpar_cache.append(funcao)
+    return funcao
+
 # Função para limpar cache (útil para testes ou quando dados mudam)
 def clear_cache():
-    """Limpa o cache de constantes e custos fixos"""
-    global _constants_cache, _custos_fixos_cache
+    """Limpa o cache de constantes, custos fixos, regras, modelos, formatos de chapa e caixas de despache"""
+    global _constants_cache, _custos_fixos_cache, _pricing_context_cache, _caixas_despache_cache, _regras_cache
+    global _modelos_cache, _formatos_chapa_cache
     _constants_cache = None
-    _custos_fixos_cache = None
\ No newline at end of file
+    _custos_fixos_cache = None
+    _pricing_context_cache = None
+    _caixas_despache_cache = None
+    _regras_cache = None
+    _modelos_cache = None
+    _formatos_chapa_cache = None
+    
+    # Caches derivados (ex.: orçamentos memorizados no CPQ)
+    for funcao in _ao_limpar_cache:
+        funcao()
+
+# Função para usar um snapshot local no lugar do Supabase (benchmarks, uso offline)
+def carregar_snapshot(snapshot):
+    """
+    Preenche os caches com um snapshot local das tabelas do Supabase, de modo
+    que get_supabase_manager() não seja chamado. snapshot: dicionário com
+    'constants' e 'custos_fixos' e, opcionalmente, 'regras_precificacao'
+    (lista de [componente, expressao]), 'modelos_caixa' (lista de dicionários
+    com nome, paineis e area_colagem), 'formatos_chapa' (lista de dicionários
+    com nome, largura_mm, altura_mm e custo_m2) e 'caixas_despache'.
+    """
+    global _constants_cache, _custos_fixos_cache, _caixas_despache_cache, _regras_cache, _modelos_cache
+    global _formatos_chapa_cache
+    clear_cache()
+    _constants_cache = {nome: float(valor) for nome, valor in snapshot['constants'].items()}
+    _custos_fixos_cache = {nome: float(valor) for nome, valor in snapshot['custos_fixos'].items()}
+    _regras_cache = [tuple(regra) for regra in snapshot.get('regras_precificacao', [])]
+    _modelos_cache = [dict(modelo) for modelo in snapshot.get('modelos_caixa', [])]
+    _formatos_chapa_cache = [dict(formato) for formato in snapshot.get('formatos_chapa', [])]
+    if 'caixas_despache' in snapshot:
+        _caixas_despache_cache = list(snapshot['caixas_despache'])
@@ -5,8 +5,17 @@ Versão síncrona para integração com Streamlit
 """
 
 from calculations import *
-from constants import get_custos_fixos_constantes, get_constant
+from constants import get_pricing_context, get_formatos_chapa, PricingContext, registrar_limpeza_cache
+from pricing_rules import AssinaturaRegras, VARIAVEIS_ENTRADA
+from nesting import calcular_encaixe_kit, selecionar_formato_chapa
+from box_templates import modelos_parametricos
+from collections import OrderedDict
+import inspect
 import math
+import threading
+from typing import NamedTuple, Optional
+import numpy as np
+import pandas as pd
 
 def calcular_custo_caixa_completo(
     largura_mm: float,
@@ -27,220 +36,1848 @@ def calcular_custo_caixa_completo(
     usar_cola_isopor: bool = False,
     metros_fita: float = 0,
     num_rebites: int = 0,
-    markup: float = 0.0
+    markup: float = 0.0,
+    centavos: bool = False,
+    contexto=None
 ):
     """
     Calcula o custo de produção de caixas customizadas.
     Versão síncrona para integração com Streamlit.
+    
+    centavos: se verdadeiro, inclui também os valores em inteiros de ponto
+    fixo (ver valores_em_centavos), usados no PDF e ao salvar o orçamento.
+    contexto: PricingContext com as constantes do orçamento; se omitido,
+    usa o contexto atual de constants.get_pricing_context().
+    Versão tipada (BoxSpec -> QuoteResult, memorizada): calcular_orcamento.
     """
     try:
-        # Validar parâmetros
-        if largura_mm <= 0 or altura_mm <= 0 or profundidade_mm <= 0:
-            raise ValueError("Dimensões devem ser maiores que zero")
+        resultado = _calcular_orcamento(
+            largura_mm, altura_mm, profundidade_mm, modelo, material, quantidade, berco, nicho, serigrafia,
+            num_cores_serigrafia, num_impressoes_serigrafia, usar_impressao_digital, tipo_impressao,
+            tipo_revestimento, usar_cola_quente, usar_cola_isopor, metros_fita, num_rebites, markup, contexto
+        )
+    except Exception as e:
+        print(f"Erro no cálculo CPQ: {str(e)}")
+        return None
+    
+    response = dict(zip(CHAVES_RESULTADO_CPQ, resultado))
+    if centavos:
+        response.update(valores_em_centavos(response, markup, quantidade))
+    return response
+
+def _calcular_orcamento(largura_mm, altura_mm, profundidade_mm, modelo, material, quantidade, berco, nicho,
+                        serigrafia, num_cores_serigrafia, num_impressoes_serigrafia, usar_impressao_digital,
+                        tipo_impressao, tipo_revestimento, usar_cola_quente, usar_cola_isopor, metros_fita,
+                        num_rebites, markup, contexto, somente_preco=False):
+    """
+    Cálculo de um orçamento (parâmetros na ordem de BoxSpec); retorna um
+    QuoteResult sem os centavos e lança exceção se a especificação for inválida.
+    Com somente_preco, retorna só o preco_unitario (mesmo valor do QuoteResult),
+    sem montar o detalhamento.
+    """
+    # Validar parâmetros
+    if largura_mm <= 0 or altura_mm <= 0 or profundidade_mm <= 0:
+        raise ValueError("Dimensões devem ser maiores que zero")
+    
+    if quantidade <= 0:
+        raise ValueError("Quantidade deve ser maior que zero")
+    
+    if nicho and not berco:
+        raise ValueError("Nicho só pode ser selecionado junto com berço")
+    
+    # Aplicar revestimento padrão se material for Papelão e revestimento não foi especificado
+    if material == "Papelão" and tipo_revestimento == "Nenhum":
+        tipo_revestimento = "Papel"
+    
+    # Resolver constantes e custos fixos uma única vez para todo o orçamento
+    if contexto is None:
+        contexto = get_pricing_context()
+    
+    # Geometria completa do modelo (planificação, área de colagem PVA e perímetro) em uma única chamada
+    geometria = calcular_geometria(largura_mm, altura_mm, profundidade_mm, modelo, contexto)
+    
+    # Regras de precificação do Supabase, se existirem, substituem as fórmulas abaixo
+    if contexto.regras is not None:
+        # Mesmas opções aceitas pelas fórmulas escritas à mão
+        if material == "Papelão" and tipo_revestimento not in ("Papel", "Vinil UV"):
+            raise ValueError(f"Revestimento '{tipo_revestimento}' não suportado")
+        if usar_impressao_digital and tipo_impressao not in ("A4", "A3"):
+            raise ValueError(f"Tipo de impressão '{tipo_impressao}' não suportado")
+        
+        # Parâmetros na ordem da assinatura, passados direto à função compilada (que já monta o QuoteResult)
+        regras = contexto.regras_vinculadas(_ASSINATURA_PRECO if somente_preco else _ASSINATURA_REGRAS)
+        try:
+            resultado = regras(
+                largura_mm, altura_mm, profundidade_mm, modelo, material, quantidade, berco, nicho, serigrafia,
+                num_cores_serigrafia, num_impressoes_serigrafia, usar_impressao_digital, tipo_impressao,
+                tipo_revestimento, usar_cola_quente, usar_cola_isopor, metros_fita, num_rebites, markup,
+                geometria['area_caixa_completa_mm2'], geometria['area_colagem_pva_mm2'], geometria['perimetro_mm']
+            )
+        except NameError as e:
+            raise _constante_ausente(e)
+        return resultado[0] if somente_preco else resultado
+    
+    # Calcular custos fixos unitários
+    caixas_por_mes = contexto.caixas_por_mes
+    custo_fixo_unitario = contexto.custo_fixo_unitario
+    
+    # Inicializar variáveis
+    area_acrilico_m2 = 0
+    custo_acrilico = 0
+    
+    # Calcular área do papelão/acrílico
+    if material == "Papelão":
+        # Converter para m²
+        area_papelao_m2 = geometria['area_caixa_completa_mm2'] / 1000000
         
-        if quantidade <= 0:
-            raise ValueError("Quantidade deve ser maior que zero")
+        # Calcular custo do papelão
+        custo_papelao = area_papelao_m2 * contexto.custo_papelao_m2
         
-        if nicho and not berco:
-            raise ValueError("Nicho só pode ser selecionado junto com berço")
+        # Converter área de colagem PVA para m²
+        area_colagem_pva_m2 = geometria['area_colagem_pva_mm2'] / 1000000
         
-        # Aplicar revestimento padrão se material for Papelão e revestimento não foi especificado
-        if material == "Papelão" and tipo_revestimento == "Nenhum":
-            tipo_revestimento = "Papel"
+        # A cola PVA é aplicada interno e externo (2x a área)
+        area_colagem_pva_m2 = area_colagem_pva_m2 * 2
+        ml_cola_pva = area_colagem_pva_m2 * contexto.consumo_cola_pva_ml_m2
+        custo_cola_pva = ml_cola_pva * contexto.custo_cola_pva_ml
         
-        # Calcular custos fixos unitários
-        custos_constantes = get_custos_fixos_constantes()
-        caixas_por_mes = custos_constantes['CAIXAS_POR_MES']
-        custo_fixo_unitario = custos_constantes['TOTAL_CUSTOS_FIXOS'] / caixas_por_mes
+        # Perímetro para cola adesiva
+        perimetro_papelao_m = geometria['perimetro_mm'] / 1000
+        ml_cola_adesiva = perimetro_papelao_m * contexto.consumo_cola_adesiva_ml_m
+        custo_cola_adesiva = ml_cola_adesiva * contexto.custo_cola_adesiva_ml
         
-        # Inicializar variáveis
-        area_acrilico_m2 = 0
+        # Inicializar custos de acrílico como zero
         custo_acrilico = 0
+        custo_cola_acrilico = 0
         
-        # Calcular área do papelão/acrílico
-        if material == "Papelão":
-            # Calcular área baseada no modelo
-            if modelo == "Tampa Solta":
-                area_planificada = calcular_planificacao_tampa_solta(largura_mm, altura_mm, profundidade_mm)
-                area_papelao_mm2 = area_planificada['area_base_mm2'] + area_planificada['area_tampa_mm2']
-            elif modelo == "Tampa Livro":
-                area_planificada = calcular_planificacao_tampa_livro(largura_mm, altura_mm, profundidade_mm)
-                area_papelao_mm2 = area_planificada['area_planificada_mm2']
-            elif modelo == "Tampa Imã":
-                area_planificada = calcular_planificacao_tampa_ima(largura_mm, altura_mm, profundidade_mm)
-                area_papelao_mm2 = area_planificada['area_base_mm2'] + area_planificada['area_tampa_mm2'] + area_planificada['area_ima_mm2']
-            elif modelo == "Tampa Luva":
-                area_planificada = calcular_planificacao_tampa_luva(largura_mm, altura_mm, profundidade_mm)
-                area_papelao_mm2 = area_planificada['area_planificada_mm2']
-            elif modelo == "Tampa Redonda":
-                area_planificada = calcular_planificacao_tampa_redonda(largura_mm, altura_mm, profundidade_mm)
-                area_papelao_mm2 = area_planificada['area_planificada_mm2']
-            else:
-                raise ValueError(f"Modelo '{modelo}' não suportado")
-            
-            # Converter para m²
-            area_papelao_m2 = area_papelao_mm2 / 1000000
-            
-            # Calcular custo do papelão
-            custo_papelao = area_papelao_m2 * get_constant("custo_papelao_m2")
-            
-            # Calcular área de colagem PVA
-            if modelo == "Tampa Solta":
-                area_colagem_pva = calcular_area_colagem_pva_tampa_solta(largura_mm, altura_mm, profundidade_mm)
-            elif modelo == "Tampa Livro":
-                area_colagem_pva = calcular_area_colagem_pva_tampa_livro(largura_mm, altura_mm, profundidade_mm)
-            elif modelo == "Tampa Imã":
-                area_colagem_pva = calcular_area_colagem_pva_tampa_ima(largura_mm, altura_mm, profundidade_mm)
-            elif modelo == "Tampa Luva":
-                area_colagem_pva = calcular_area_colagem_pva_tampa_luva(largura_mm, altura_mm, profundidade_mm)
-            elif modelo == "Tampa Redonda":
-                area_colagem_pva = calcular_area_colagem_pva_tampa_redonda(largura_mm, altura_mm, profundidade_mm)
-            
-            # Converter para m²
-            area_colagem_pva_mm2 = area_colagem_pva['area_colagem_total_mm2']
-            area_colagem_pva_m2 = area_colagem_pva_mm2 / 1000000
-            
-            # A cola PVA é aplicada interno e externo (2x a área)
-            area_colagem_pva_m2 = area_colagem_pva_m2 * 2
-            ml_cola_pva = area_colagem_pva_m2 * get_constant("consumo_cola_pva_ml_m2")
-            custo_cola_pva = ml_cola_pva * get_constant("custo_cola_pva_ml")
-            
-            # Calcular perímetro para cola adesiva
-            perimetro_papelao = calcular_perimetro_papelao(largura_mm, altura_mm, profundidade_mm, modelo)
-            perimetro_papelao_m = perimetro_papelao['perimetro_total_m']
-            ml_cola_adesiva = perimetro_papelao_m * get_constant("consumo_cola_adesiva_ml_m")
-            custo_cola_adesiva = ml_cola_adesiva * get_constant("custo_cola_adesiva_ml")
-            
-            # Inicializar custos de acrílico como zero
-            custo_acrilico = 0
-            custo_cola_acrilico = 0
-            
-        else:  # Acrílico
-            # Calcular área do acrílico
-            if modelo == "Tampa Solta":
-                area_planificada = calcular_planificacao_tampa_solta(largura_mm, altura_mm, profundidade_mm)
-                area_acrilico_mm2 = area_planificada['area_base_mm2'] + area_planificada['area_tampa_mm2']
-            elif modelo == "Tampa Livro":
-                area_planificada = calcular_planificacao_tampa_livro(largura_mm, altura_mm, profundidade_mm)
-                area_acrilico_mm2 = area_planificada['area_planificada_mm2']
-            elif modelo == "Tampa Imã":
-                area_planificada = calcular_planificacao_tampa_ima(largura_mm, altura_mm, profundidade_mm)
-                area_acrilico_mm2 = area_planificada['area_base_mm2'] + area_planificada['area_tampa_mm2'] + area_planificada['area_ima_mm2']
-            elif modelo == "Tampa Luva":
-                area_planificada = calcular_planificacao_tampa_luva(largura_mm, altura_mm, profundidade_mm)
-                area_acrilico_mm2 = area_planificada['area_planificada_mm2']
-            elif modelo == "Tampa Redonda":
-                area_planificada = calcular_planificacao_tampa_redonda(largura_mm, altura_mm, profundidade_mm)
-                area_acrilico_mm2 = area_planificada['area_planificada_mm2']
-            
-            # Converter para m²
-            area_acrilico_m2 = area_acrilico_mm2 / 1000000
-            
-            # Calcular custo do acrílico
-            custo_acrilico = area_acrilico_m2 * get_constant("custo_acrilico_m2")
-            
-            # Para acrílico, não há cola PVA
-            custo_cola_pva = 0
-            custo_cola_adesiva = 0
-            ml_cola_pva = 0
-            ml_cola_adesiva = 0
-            area_papelao_m2 = 0
-            custo_papelao = 0
-        
-        # Calcular custos de revestimento
-        if tipo_revestimento != "Nenhum" and material == "Papelão":
-            if tipo_revestimento == "Papel":
-                area_revestimento_m2 = area_papelao_m2
-                custo_revestimento = area_revestimento_m2 * get_constant("custo_papel_m2")
-            elif tipo_revestimento == "Vinil UV":
-                area_revestimento_m2 = area_papelao_m2
-                custo_revestimento = area_revestimento_m2 * get_constant("custo_vinil_uv_m2")
+    else:  # Acrílico
+        # Converter para m²
+        area_acrilico_m2 = geometria['area_caixa_completa_mm2'] / 1000000
+        
+        # Calcular custo do acrílico
+        custo_acrilico = area_acrilico_m2 * contexto.custo_acrilico_m2
+        
+        # Para acrílico, não há cola PVA
+        custo_cola_pva = 0
+        custo_cola_adesiva = 0
+        ml_cola_pva = 0
+        ml_cola_adesiva = 0
+        area_papelao_m2 = 0
+        custo_papelao = 0
+    
+    # Calcular custos de revestimento
+    if tipo_revestimento != "Nenhum" and material == "Papelão":
+        if tipo_revestimento == "Papel":
+            area_revestimento_m2 = area_papelao_m2
+            custo_revestimento = area_revestimento_m2 * contexto.custo_papel_m2
+        elif tipo_revestimento == "Vinil UV":
+            area_revestimento_m2 = area_papelao_m2
+            custo_revestimento = area_revestimento_m2 * contexto.custo_vinil_uv_m2
+    else:
+        area_revestimento_m2 = 0
+        custo_revestimento = 0
+    
+    # Calcular custos de serigrafia
+    if serigrafia:
+        custo_serigrafia = num_cores_serigrafia * num_impressoes_serigrafia * contexto.custo_serigrafia_cor
+    else:
+        custo_serigrafia = 0
+    
+    # Calcular custos de impressão digital
+    if usar_impressao_digital:
+        if tipo_impressao == "A4":
+            custo_impressao = contexto.custo_impressao_a4
+        elif tipo_impressao == "A3":
+            custo_impressao = contexto.custo_impressao_a3
+    else:
+        custo_impressao = 0
+    
+    # Calcular custos de cola
+    custo_cola_quente = contexto.custo_cola_quente_fixo if usar_cola_quente else 0
+    custo_cola_isopor = contexto.custo_cola_isopor_fixo if usar_cola_isopor else 0
+    
+    # Calcular custos de fita e rebites
+    custo_fita = metros_fita * contexto.custo_fita_m
+    custo_rebites = num_rebites * contexto.custo_rebite_unidade
+    
+    # Calcular custo de imã e chapa
+    custo_ima_chapa = calcular_custo_ima_chapa_automatico(modelo, largura_mm, contexto)
+    
+    # Calcular custo total unitário
+    custo_total_unitario = (
+        custo_fixo_unitario +
+        custo_papelao +
+        custo_acrilico +
+        custo_revestimento +
+        custo_cola_pva +
+        custo_cola_adesiva +
+        custo_serigrafia +
+        custo_impressao +
+        custo_cola_quente +
+        custo_cola_isopor +
+        custo_fita +
+        custo_rebites +
+        custo_ima_chapa
+    )
+    
+    # Aplicar markup
+    if markup > 0:
+        preco_unitario = custo_total_unitario * (1 + markup)
+    else:
+        preco_unitario = custo_total_unitario
+    
+    if somente_preco:
+        return preco_unitario
+    
+    # Calcular preço total do projeto
+    preco_total = preco_unitario * quantidade
+    
+    return QuoteResult(
+        preco_total, preco_unitario, custo_fixo_unitario, caixas_por_mes, custo_papelao, custo_acrilico,
+        custo_revestimento, custo_cola_pva, custo_cola_adesiva, custo_serigrafia, custo_impressao,
+        custo_cola_quente, custo_cola_isopor, custo_fita, custo_rebites, custo_ima_chapa, area_papelao_m2,
+        area_acrilico_m2, area_revestimento_m2, ml_cola_pva, ml_cola_adesiva
+    )
+
+
+# Parâmetros aceitos pelo cálculo em lote (mesmos nomes e padrões da versão unitária)
+_PARAMETROS_CPQ = {
+    nome: parametro.default
+    for nome, parametro in inspect.signature(calcular_custo_caixa_completo).parameters.items()
+    if nome not in ('centavos', 'contexto')
+}
+
+# Chaves numéricas retornadas pelo cálculo em lote (mesmas da versão unitária)
+CHAVES_RESULTADO_CPQ = (
+    "preco_total",
+    "preco_unitario",
+    "custo_fixo_unitario",
+    "caixas_por_mes",
+    "custo_papelao",
+    "custo_acrilico",
+    "custo_revestimento",
+    "custo_cola_pva",
+    "custo_cola_adesiva",
+    "custo_serigrafia",
+    "custo_impressao",
+    "custo_cola_quente",
+    "custo_cola_isopor",
+    "custo_fita",
+    "custo_rebites",
+    "custo_ima_chapa",
+    "area_papelao_m2",
+    "area_acrilico_m2",
+    "area_revestimento_m2",
+    "ml_cola_pva",
+    "ml_cola_adesiva"
+)
+
+# Componentes somados no custo total unitário (na ordem da soma)
+CHAVES_CUSTO_CPQ = (
+    "custo_fixo_unitario",
+    "custo_papelao",
+    "custo_acrilico",
+    "custo_revestimento",
+    "custo_cola_pva",
+    "custo_cola_adesiva",
+    "custo_serigrafia",
+    "custo_impressao",
+    "custo_cola_quente",
+    "custo_cola_isopor",
+    "custo_fita",
+    "custo_rebites",
+    "custo_ima_chapa"
+)
+
+class BoxSpec(NamedTuple):
+    """
+    Especificação de uma caixa: os mesmos parâmetros, na mesma ordem e com os
+    mesmos padrões de calcular_custo_caixa_completo (dimensões em mm).
+    Imutável, sem __dict__ por instância e hashável (serve de chave de cache).
+    """
+    largura_mm: float
+    altura_mm: float
+    profundidade_mm: float
+    modelo: str
+    material: str
+    quantidade: int = 1
+    berco: bool = False
+    nicho: bool = False
+    serigrafia: bool = False
+    num_cores_serigrafia: int = 1
+    num_impressoes_serigrafia: int = 1
+    usar_impressao_digital: bool = False
+    tipo_impressao: str = "A4"
+    tipo_revestimento: str = "Nenhum"
+    usar_cola_quente: bool = False
+    usar_cola_isopor: bool = False
+    metros_fita: float = 0
+    num_rebites: int = 0
+    markup: float = 0.0
+    
+    @classmethod
+    def de_dicionario(cls, dados):
+        """
+        BoxSpec a partir de um dicionário com os nomes dos parâmetros; as
+        dimensões também são aceitas em cm (largura_cm, altura_cm,
+        profundidade_cm), como nos formulários do app
+        """
+        if 'largura_cm' in dados or 'altura_cm' in dados or 'profundidade_cm' in dados:
+            dados = dict(dados)
+            for nome in ('largura', 'altura', 'profundidade'):
+                if f'{nome}_cm' in dados and f'{nome}_mm' not in dados:
+                    dados[f'{nome}_mm'] = float(dados.pop(f'{nome}_cm')) * 10
+        
+        try:
+            return cls(**dados)
+        except TypeError:
+            desconhecidos = set(dados) - set(cls._fields)
+            if desconhecidos:
+                raise ValueError(f"Parâmetros não suportados: {sorted(desconhecidos)}")
+            faltando = [nome for nome in cls._fields if nome not in dados and nome not in cls._field_defaults]
+            raise ValueError(f"Parâmetro obrigatório ausente: {faltando[0] if faltando else '?'}")
+    
+    def normalizada(self):
+        """
+        Forma canônica para chaves de cache: o papelão sem revestimento recebe
+        o revestimento padrão. A igualdade de tuplas já trata 1, 1.0 e True
+        como o mesmo valor.
+        """
+        if self.material == "Papelão" and self.tipo_revestimento == "Nenhum":
+            return self._replace(tipo_revestimento="Papel")
+        return self
+    
+    @property
+    def dimensoes_cm(self):
+        """(largura, altura, profundidade) em cm"""
+        return (self.largura_mm / 10, self.altura_mm / 10, self.profundidade_mm / 10)
+    
+    def descricao(self):
+        """Descrição curta usada nos itens do orçamento"""
+        largura_cm, altura_cm, profundidade_cm = self.dimensoes_cm
+        return f"Caixa {self.modelo} - {self.material} ({largura_cm:g}x{altura_cm:g}x{profundidade_cm:g}cm)"
+    
+    @classmethod
+    def colunas(cls, especificacoes):
+        """Colunas (nome -> array NumPy) de uma lista de BoxSpec, no formato do cálculo em lote"""
+        if not especificacoes:
+            return {nome: np.array([]) for nome in cls._fields}
+        return {nome: np.array(valores) for nome, valores in zip(cls._fields, zip(*especificacoes))}
+    
+    @classmethod
+    def de_colunas(cls, colunas):
+        """Lista de BoxSpec a partir de colunas (DataFrame ou dicionário; faltantes usam o padrão)"""
+        colunas = _preparar_colunas_lote(colunas, {})
+        return [cls._make(linha) for linha in zip(*(colunas[nome].tolist() for nome in cls._fields))]
+
+class QuoteResult(NamedTuple):
+    """
+    Resultado de um orçamento: os valores de CHAVES_RESULTADO_CPQ, na mesma
+    ordem, e os preços em centavos inteiros (None se não calculados).
+    Imutável e hashável; pode ser compartilhado sem cópia (ex.: memorização).
+    """
+    preco_total: float
+    preco_unitario: float
+    custo_fixo_unitario: float
+    caixas_por_mes: float
+    custo_papelao: float
+    custo_acrilico: float
+    custo_revestimento: float
+    custo_cola_pva: float
+    custo_cola_adesiva: float
+    custo_serigrafia: float
+    custo_impressao: float
+    custo_cola_quente: float
+    custo_cola_isopor: float
+    custo_fita: float
+    custo_rebites: float
+    custo_ima_chapa: float
+    area_papelao_m2: float
+    area_acrilico_m2: float
+    area_revestimento_m2: float
+    ml_cola_pva: float
+    ml_cola_adesiva: float
+    preco_unitario_centavos: Optional[int] = None
+    preco_total_centavos: Optional[int] = None
+    
+    @classmethod
+    def de_dicionario(cls, dados):
+        """QuoteResult a partir do dicionário de calcular_custo_caixa_completo"""
+        return cls(**{nome: dados[nome] for nome in cls._fields if nome in dados})
+    
+    def como_dicionario(self):
+        """Dicionário no formato de calcular_custo_caixa_completo (centavos só se calculados)"""
+        dados = dict(zip(CHAVES_RESULTADO_CPQ, self))
+        if self.preco_unitario_centavos is not None:
+            dados['preco_unitario_centavos'] = self.preco_unitario_centavos
+            dados['preco_total_centavos'] = self.preco_total_centavos
+        return dados
+    
+    @classmethod
+    def colunas(cls, resultados):
+        """Colunas (nome -> array NumPy) de uma lista de QuoteResult"""
+        if not resultados:
+            return {nome: np.array([]) for nome in cls._fields}
+        return {nome: np.array(valores) for nome, valores in zip(cls._fields, zip(*resultados))}
+    
+    @classmethod
+    def de_colunas(cls, colunas):
+        """
+        Lista de QuoteResult a partir do resultado de calcular_custo_caixa_lote
+        (None nas linhas inválidas)
+        """
+        valido = colunas['valido'].tolist()
+        valores = [colunas[nome].tolist() if nome in colunas else [None] * len(valido) for nome in cls._fields]
+        return [cls._make(linha) if ok else None for linha, ok in zip(zip(*valores), valido)]
+
+# Valores por caixa produzidos pelas regras de precificação
+_CHAVES_REGRAS = tuple(
+    chave for chave in CHAVES_RESULTADO_CPQ if chave not in ("preco_total", "preco_unitario", "caixas_por_mes")
+)
+
+# Entradas das regras de precificação: parâmetros da caixa (ordem da assinatura) e geometria
+_GEOMETRIA_REGRAS = ('area_caixa_completa_mm2', 'area_colagem_pva_mm2', 'perimetro_mm')
+_ENTRADAS_REGRAS = tuple(_PARAMETROS_CPQ) + _GEOMETRIA_REGRAS
+# compilar_regras valida os nomes das regras do Supabase contra VARIAVEIS_ENTRADA
+assert set(_ENTRADAS_REGRAS) == set(VARIAVEIS_ENTRADA), "VARIAVEIS_ENTRADA desatualizada em pricing_rules"
+
+# Totais da versão unitária, calculados na própria função compilada (mesma ordem de soma)
+_TOTAIS_REGRAS = (
+    ("custo_total_unitario", " + ".join(CHAVES_CUSTO_CPQ)),
+    ("preco_unitario", "custo_total_unitario * (1 + markup) if markup > 0 else custo_total_unitario"),
+    ("preco_total", "preco_unitario * quantidade"),
+)
+
+# Funções compiladas: unitária (resposta completa ou só o preço) e em lote (componentes por caixa)
+_ASSINATURA_REGRAS = AssinaturaRegras(
+    _ENTRADAS_REGRAS, CHAVES_RESULTADO_CPQ, derivados=_TOTAIS_REGRAS, construtor=QuoteResult
+)
+_ASSINATURA_PRECO = AssinaturaRegras(_ENTRADAS_REGRAS, ('preco_unitario',), derivados=_TOTAIS_REGRAS, tupla=True)
+_ASSINATURA_REGRAS_LOTE = AssinaturaRegras(
+    _ENTRADAS_REGRAS, _CHAVES_REGRAS, vetorial=True,
+    # Máscaras que o cálculo em lote já tem das validações e da geometria
+    comparacoes=(
+        ('material == "Papelão"', '_papelao'),
+        ('tipo_revestimento == "Papel"', '_tipo_papel'),
+        ('tipo_revestimento == "Vinil UV"', '_tipo_vinil'),
+        ('tipo_impressao == "A4"', '_tipo_a4'),
+        ('tipo_impressao == "A3"', '_tipo_a3'),
+        ('modelo == "Tampa Imã"', '_tampa_ima'),
+    )
+)
+
+def _constante_ausente(erro):
+    """Erro de uma variável das regras que não existe (NameError da função compilada)"""
+    nome = str(erro).split("'")[1] if "'" in str(erro) else str(erro)
+    return Exception(f"Constante '{nome}' não encontrada no Supabase")
+
+def _avaliar_regras(contexto, assinatura, parametros, geometria, *comparacoes):
+    """Avalia as regras compiladas do contexto; retorna as saídas da assinatura (dicionário ou tupla)"""
+    try:
+        return contexto.regras_vinculadas(assinatura)(
+            *parametros,
+            geometria['area_caixa_completa_mm2'], geometria['area_colagem_pva_mm2'], geometria['perimetro_mm'],
+            *comparacoes
+        )
+    except NameError as e:
+        raise _constante_ausente(e)
+
+# Ponto fixo: 1 real = 100 centavos = 100.000 milicentavos
+CENTAVOS_POR_REAL = 100
+MILICENTAVOS_POR_CENTAVO = 1000
+
+def _arredondar_meio_acima(valor):
+    """Inteiro mais próximo, empates para cima; arrays viram int64 (NaN vira 0)"""
+    arredondado = np.floor(np.asarray(valor, dtype=float) + 0.5)
+    if arredondado.ndim:
+        return np.nan_to_num(arredondado).astype(np.int64)
+    return int(arredondado)
+
+def reais_para_centavos(valor):
+    """Converte um valor em reais para centavos inteiros (meio centavo para cima)"""
+    return _arredondar_meio_acima(valor * CENTAVOS_POR_REAL)
+
+def formatar_centavos(centavos):
+    """Formata centavos inteiros como 'R$1234.56'"""
+    sinal = "-" if centavos < 0 else ""
+    return f"{sinal}R${abs(centavos) // CENTAVOS_POR_REAL}.{abs(centavos) % CENTAVOS_POR_REAL:02d}"
+
+def valores_em_centavos(resultado, markup, quantidade):
+    """
+    Refaz a soma do orçamento em inteiros de ponto fixo (escalares ou arrays int64).
+    
+    Regras de arredondamento (sempre meio para cima):
+    - cada componente de CHAVES_CUSTO_CPQ vira milicentavos ('<chave>_mc');
+    - o custo total é a soma exata dos componentes ('custo_total_unitario_mc');
+    - o markup é aplicado sobre o total e arredondado em milicentavos
+      ('preco_unitario_mc');
+    - o preço unitário cobrado é arredondado para centavos
+      ('preco_unitario_centavos') e o total é esse valor vezes a quantidade
+      ('preco_total_centavos'), de modo que PDF e banco batem no centavo.
+    """
+    fator = CENTAVOS_POR_REAL * MILICENTAVOS_POR_CENTAVO
+    valores = {f"{chave}_mc": _arredondar_meio_acima(resultado[chave] * fator) for chave in CHAVES_CUSTO_CPQ}
+    custo_total_mc = sum(valores.values())
+    
+    if np.ndim(markup):
+        preco_unitario_mc = np.where(markup > 0, _arredondar_meio_acima(custo_total_mc * (1 + markup)), custo_total_mc)
+    elif markup > 0:
+        preco_unitario_mc = _arredondar_meio_acima(custo_total_mc * (1 + markup))
+    else:
+        preco_unitario_mc = custo_total_mc
+    
+    preco_unitario_centavos = (preco_unitario_mc + MILICENTAVOS_POR_CENTAVO // 2) // MILICENTAVOS_POR_CENTAVO
+    quantidade = _arredondar_meio_acima(quantidade)
+    
+    valores["custo_total_unitario_mc"] = custo_total_mc
+    valores["preco_unitario_mc"] = preco_unitario_mc
+    valores["preco_unitario_centavos"] = preco_unitario_centavos
+    valores["preco_total_centavos"] = preco_unitario_centavos * quantidade
+    return valores
+
+def _preparar_colunas_lote(especificacoes, colunas):
+    """
+    Normaliza as entradas do cálculo em lote para arrays NumPy de mesmo tamanho.
+    Aceita um DataFrame, um dicionário de colunas, uma lista de BoxSpec e/ou
+    colunas passadas por nome; valores escalares são replicados para todas as linhas.
+    """
+    entradas = {}
+    if especificacoes is not None:
+        if isinstance(especificacoes, pd.DataFrame):
+            entradas.update({nome: especificacoes[nome].to_numpy() for nome in especificacoes.columns})
+        elif isinstance(especificacoes, BoxSpec):
+            entradas.update(BoxSpec.colunas([especificacoes]))
+        elif isinstance(especificacoes, (list, tuple)):
+            entradas.update(BoxSpec.colunas(especificacoes))
         else:
-            area_revestimento_m2 = 0
-            custo_revestimento = 0
+            entradas.update(especificacoes)
+    entradas.update(colunas)
+    
+    desconhecidas = set(entradas) - set(_PARAMETROS_CPQ)
+    if desconhecidas:
+        raise ValueError(f"Colunas não suportadas no cálculo em lote: {sorted(desconhecidas)}")
+    
+    faltando = [nome for nome, padrao in _PARAMETROS_CPQ.items()
+                if padrao is inspect.Parameter.empty and nome not in entradas]
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias ausentes no cálculo em lote: {faltando}")
+    
+    nomes = list(_PARAMETROS_CPQ)
+    valores = [np.asarray(entradas.get(nome, _PARAMETROS_CPQ[nome])) for nome in nomes]
+    try:
+        valores = np.broadcast_arrays(*[np.atleast_1d(valor) for valor in valores])
+    except ValueError:
+        raise ValueError("Todas as colunas do cálculo em lote devem ter o mesmo tamanho")
+    
+    return {nome: valor for nome, valor in zip(nomes, valores)}
+
+def calcular_custo_caixa_lote(especificacoes=None, contexto=None, centavos=False, somente_preco=False, **colunas):
+    """
+    Calcula o custo de várias caixas de uma só vez, de forma vetorizada.
+    
+    Recebe as mesmas entradas de calcular_custo_caixa_completo em formato
+    colunar (DataFrame, dicionário de arrays, lista de BoxSpec ou colunas por
+    nome) e retorna um dicionário com um array NumPy por componente de custo,
+    com os mesmos valores da versão unitária (QuoteResult.de_colunas converte
+    para uma lista de QuoteResult). Linhas em que a versão unitária retornaria
+    None ficam com NaN e False em 'valido'. Todas as linhas usam o mesmo
+    PricingContext (o atual, se contexto for omitido); as constantes do
+    contexto também podem ser arrays com um valor por linha. Com centavos,
+    inclui os valores de ponto fixo de valores_em_centavos como arrays int64
+    (zerados nas linhas inválidas). Com somente_preco, retorna só
+    preco_unitario, preco_total e valido (mesmos valores, sem o detalhamento).
+    """
+    if centavos and somente_preco:
+        raise ValueError("Os valores em centavos exigem o detalhamento completo (somente_preco=False)")
+    
+    entrada = _preparar_colunas_lote(especificacoes, colunas)
+    n = len(entrada['largura_mm'])
+    
+    largura_mm = entrada['largura_mm'].astype(float)
+    altura_mm = entrada['altura_mm'].astype(float)
+    profundidade_mm = entrada['profundidade_mm'].astype(float)
+    modelo = entrada['modelo'].astype(object)
+    material = entrada['material'].astype(object)
+    quantidade = entrada['quantidade'].astype(float)
+    berco = entrada['berco'].astype(bool)
+    nicho = entrada['nicho'].astype(bool)
+    serigrafia = entrada['serigrafia'].astype(bool)
+    num_cores_serigrafia = entrada['num_cores_serigrafia'].astype(float)
+    num_impressoes_serigrafia = entrada['num_impressoes_serigrafia'].astype(float)
+    usar_impressao_digital = entrada['usar_impressao_digital'].astype(bool)
+    tipo_impressao = entrada['tipo_impressao'].astype(object)
+    tipo_revestimento = entrada['tipo_revestimento'].astype(object)
+    usar_cola_quente = entrada['usar_cola_quente'].astype(bool)
+    usar_cola_isopor = entrada['usar_cola_isopor'].astype(bool)
+    metros_fita = entrada['metros_fita'].astype(float)
+    num_rebites = entrada['num_rebites'].astype(float)
+    markup = entrada['markup'].astype(float)
+    
+    papelao = material == "Papelão"
+    
+    # Mesmas validações da versão unitária
+    valido = (largura_mm > 0) & (altura_mm > 0) & (profundidade_mm > 0) & (quantidade > 0)
+    valido &= ~(nicho & ~berco)
+    
+    # Aplicar revestimento padrão se material for Papelão e revestimento não foi especificado
+    tipo_revestimento = np.where(papelao & (tipo_revestimento == "Nenhum"), "Papel", tipo_revestimento)
+    
+    # Custos fixos unitários
+    if contexto is None:
+        contexto = get_pricing_context()
+    caixas_por_mes = contexto.caixas_por_mes
+    custo_fixo_unitario = contexto.custo_fixo_unitario
+    
+    # Geometria por modelo (área planificada, área de colagem PVA e perímetro)
+    area_mm2 = np.zeros(n)
+    area_colagem_pva_mm2 = np.zeros(n)
+    perimetro_mm = np.zeros(n)
+    modelo_conhecido = np.zeros(n, dtype=bool)
+    mascaras_modelo = {}
+    for nome_modelo, calcular_geometria_modelo in GEOMETRIAS.items():
+        mascara = mascaras_modelo[nome_modelo] = modelo == nome_modelo
+        if not mascara.any():
+            continue
+        modelo_conhecido |= mascara
+        geometria = calcular_geometria_modelo(
+            largura_mm[mascara], altura_mm[mascara], profundidade_mm[mascara], contexto.selecionar(mascara)
+        )
+        area_mm2[mascara] = geometria['area_caixa_completa_mm2']
+        area_colagem_pva_mm2[mascara] = geometria['area_colagem_pva_mm2']
+        perimetro_mm[mascara] = geometria['perimetro_mm']
+    
+    # Demais modelos: paramétricos (box_templates), um cálculo em lote por modelo
+    if not modelo_conhecido.all():
+        parametricos = modelos_parametricos()
+        for nome_modelo in set(modelo[~modelo_conhecido].tolist()):
+            if nome_modelo not in parametricos:
+                continue
+            mascara = modelo == nome_modelo
+            try:
+                with np.errstate(all='ignore'):
+                    geometria = parametricos[nome_modelo].geometria(
+                        largura_mm[mascara], altura_mm[mascara], profundidade_mm[mascara], contexto.selecionar(mascara)
+                    )
+            except Exception as e:
+                print(f"Erro na geometria do modelo '{nome_modelo}': {str(e)}")
+                continue
+            modelo_conhecido |= mascara
+            area_mm2[mascara] = geometria['area_caixa_completa_mm2']
+            area_colagem_pva_mm2[mascara] = geometria['area_colagem_pva_mm2']
+            perimetro_mm[mascara] = geometria['perimetro_mm']
+    valido &= modelo_conhecido
+    
+    # Revestimentos e impressões aceitos (mesmas validações da versão unitária)
+    tipo_papel = tipo_revestimento == "Papel"
+    tipo_vinil = tipo_revestimento == "Vinil UV"
+    tipo_a4 = tipo_impressao == "A4"
+    tipo_a3 = tipo_impressao == "A3"
+    revestimento_papel = papelao & tipo_papel
+    revestimento_vinil = papelao & tipo_vinil
+    valido &= ~papelao | revestimento_papel | revestimento_vinil
+    impressao_a4 = usar_impressao_digital & tipo_a4
+    impressao_a3 = usar_impressao_digital & tipo_a3
+    valido &= ~usar_impressao_digital | impressao_a4 | impressao_a3
+    
+    if contexto.regras is not None:
+        # Regras de precificação do Supabase no lugar das fórmulas abaixo
+        locais = locals()
+        with np.errstate(all='ignore'):
+            valores = _avaliar_regras(
+                contexto,
+                _ASSINATURA_REGRAS_LOTE,
+                [locais[nome] for nome in _PARAMETROS_CPQ],
+                {'area_caixa_completa_mm2': area_mm2, 'area_colagem_pva_mm2': area_colagem_pva_mm2,
+                 'perimetro_mm': perimetro_mm},
+                papelao, tipo_papel, tipo_vinil, tipo_a4, tipo_a3, mascaras_modelo["Tampa Imã"]
+            )
+        valores = {chave: np.broadcast_to(np.asarray(valor, dtype=float), (n,)) for chave, valor in valores.items()}
+        custo_fixo_unitario = valores['custo_fixo_unitario']
+        custo_papelao = valores['custo_papelao']
+        custo_acrilico = valores['custo_acrilico']
+        custo_revestimento = valores['custo_revestimento']
+        custo_cola_pva = valores['custo_cola_pva']
+        custo_cola_adesiva = valores['custo_cola_adesiva']
+        custo_serigrafia = valores['custo_serigrafia']
+        custo_impressao = valores['custo_impressao']
+        custo_cola_quente = valores['custo_cola_quente']
+        custo_cola_isopor = valores['custo_cola_isopor']
+        custo_fita = valores['custo_fita']
+        custo_rebites = valores['custo_rebites']
+        custo_ima_chapa = valores['custo_ima_chapa']
+        area_papelao_m2 = valores['area_papelao_m2']
+        area_acrilico_m2 = valores['area_acrilico_m2']
+        area_revestimento_m2 = valores['area_revestimento_m2']
+        ml_cola_pva = valores['ml_cola_pva']
+        ml_cola_adesiva = valores['ml_cola_adesiva']
+    else:
+        zeros = np.zeros(n)
         
-        # Calcular custos de serigrafia
-        if serigrafia:
-            custo_serigrafia = num_cores_serigrafia * num_impressoes_serigrafia * get_constant("custo_serigrafia_cor")
+        # Papelão: área, colas PVA e adesiva
+        if papelao.any():
+            area_papelao_m2 = np.where(papelao, area_mm2 / 1000000, zeros)
+            custo_papelao = area_papelao_m2 * contexto.custo_papelao_m2
+            area_colagem_pva_m2 = area_colagem_pva_mm2 / 1000000 * 2
+            ml_cola_pva = np.where(papelao, area_colagem_pva_m2 * contexto.consumo_cola_pva_ml_m2, zeros)
+            custo_cola_pva = ml_cola_pva * contexto.custo_cola_pva_ml
+            ml_cola_adesiva = np.where(papelao, perimetro_mm / 1000 * contexto.consumo_cola_adesiva_ml_m, zeros)
+            custo_cola_adesiva = ml_cola_adesiva * contexto.custo_cola_adesiva_ml
         else:
-            custo_serigrafia = 0
-        
-        # Calcular custos de impressão digital
-        if usar_impressao_digital:
-            if tipo_impressao == "A4":
-                custo_impressao = get_constant("custo_impressao_a4")
-            elif tipo_impressao == "A3":
-                custo_impressao = get_constant("custo_impressao_a3")
+            area_papelao_m2 = custo_papelao = ml_cola_pva = custo_cola_pva = ml_cola_adesiva = custo_cola_adesiva = zeros
+        
+        # Acrílico
+        if (~papelao).any():
+            area_acrilico_m2 = np.where(papelao, zeros, area_mm2 / 1000000)
+            custo_acrilico = area_acrilico_m2 * contexto.custo_acrilico_m2
         else:
-            custo_impressao = 0
-        
-        # Calcular custos de cola
-        custo_cola_quente = get_constant("custo_cola_quente_fixo") if usar_cola_quente else 0
-        custo_cola_isopor = get_constant("custo_cola_isopor_fixo") if usar_cola_isopor else 0
-        
-        # Calcular custos de fita e rebites
-        custo_fita = metros_fita * get_constant("custo_fita_m")
-        custo_rebites = num_rebites * get_constant("custo_rebite_unidade")
-        
-        # Calcular custo de imã e chapa
-        custo_ima_chapa = calcular_custo_ima_chapa_automatico(modelo, largura_mm)
-        
-        # Calcular custo total unitário
-        custo_total_unitario = (
-            custo_fixo_unitario +
-            custo_papelao +
-            custo_acrilico +
-            custo_revestimento +
-            custo_cola_pva +
-            custo_cola_adesiva +
-            custo_serigrafia +
-            custo_impressao +
-            custo_cola_quente +
-            custo_cola_isopor +
-            custo_fita +
-            custo_rebites +
-            custo_ima_chapa
+            area_acrilico_m2 = custo_acrilico = zeros
+        
+        # Revestimento (apenas papelão)
+        area_revestimento_m2 = np.where(revestimento_papel | revestimento_vinil, area_papelao_m2, zeros)
+        custo_revestimento = zeros
+        if revestimento_papel.any():
+            custo_revestimento = np.where(revestimento_papel, area_revestimento_m2 * contexto.custo_papel_m2, custo_revestimento)
+        if revestimento_vinil.any():
+            custo_revestimento = np.where(revestimento_vinil, area_revestimento_m2 * contexto.custo_vinil_uv_m2, custo_revestimento)
+        
+        # Serigrafia
+        custo_serigrafia = zeros
+        if serigrafia.any():
+            custo_serigrafia = np.where(
+                serigrafia, num_cores_serigrafia * num_impressoes_serigrafia * contexto.custo_serigrafia_cor, zeros
+            )
+        
+        # Impressão digital
+        custo_impressao = zeros
+        if impressao_a4.any():
+            custo_impressao = np.where(impressao_a4, contexto.custo_impressao_a4, custo_impressao)
+        if impressao_a3.any():
+            custo_impressao = np.where(impressao_a3, contexto.custo_impressao_a3, custo_impressao)
+        
+        # Colas, fita e rebites
+        custo_cola_quente = np.where(usar_cola_quente, contexto.custo_cola_quente_fixo, zeros) if usar_cola_quente.any() else zeros
+        custo_cola_isopor = np.where(usar_cola_isopor, contexto.custo_cola_isopor_fixo, zeros) if usar_cola_isopor.any() else zeros
+        custo_fita = metros_fita * contexto.custo_fita_m
+        custo_rebites = num_rebites * contexto.custo_rebite_unidade
+        
+        # Imã e chapa (Tampa Imã: 1 par se largura ≤ 10, senão 2 pares)
+        tampa_ima = modelo == "Tampa Imã"
+        custo_ima_chapa = zeros
+        if tampa_ima.any():
+            custo_ima_chapa = np.where(
+                tampa_ima, np.where(largura_mm <= 10, 1, 2) * contexto.custo_ima_chapa_par, zeros
+            )
+    
+    # Custo total unitário (mesma ordem de soma da versão unitária)
+    custo_total_unitario = (
+        custo_fixo_unitario +
+        custo_papelao +
+        custo_acrilico +
+        custo_revestimento +
+        custo_cola_pva +
+        custo_cola_adesiva +
+        custo_serigrafia +
+        custo_impressao +
+        custo_cola_quente +
+        custo_cola_isopor +
+        custo_fita +
+        custo_rebites +
+        custo_ima_chapa
+    )
+    
+    # Aplicar markup
+    preco_unitario = np.where(markup > 0, custo_total_unitario * (1 + markup), custo_total_unitario)
+    preco_total = preco_unitario * quantidade
+    
+    if somente_preco:
+        return {
+            "preco_total": np.where(valido, preco_total, np.nan),
+            "preco_unitario": np.where(valido, preco_unitario, np.nan),
+            "valido": valido
+        }
+    
+    resultado = {
+        "preco_total": preco_total,
+        "preco_unitario": preco_unitario,
+        "custo_fixo_unitario": np.full(n, custo_fixo_unitario),
+        "caixas_por_mes": np.full(n, caixas_por_mes),
+        "custo_papelao": custo_papelao,
+        "custo_acrilico": custo_acrilico,
+        "custo_revestimento": custo_revestimento,
+        "custo_cola_pva": custo_cola_pva,
+        "custo_cola_adesiva": custo_cola_adesiva,
+        "custo_serigrafia": custo_serigrafia,
+        "custo_impressao": custo_impressao,
+        "custo_cola_quente": custo_cola_quente,
+        "custo_cola_isopor": custo_cola_isopor,
+        "custo_fita": custo_fita,
+        "custo_rebites": custo_rebites,
+        "custo_ima_chapa": custo_ima_chapa,
+        "area_papelao_m2": area_papelao_m2,
+        "area_acrilico_m2": area_acrilico_m2,
+        "area_revestimento_m2": area_revestimento_m2,
+        "ml_cola_pva": ml_cola_pva,
+        "ml_cola_adesiva": ml_cola_adesiva
+    }
+    
+    # Linhas inválidas ficam com NaN (a versão unitária retornaria None)
+    for chave in CHAVES_RESULTADO_CPQ:
+        resultado[chave] = np.where(valido, resultado[chave], np.nan)
+    resultado["valido"] = valido
+    
+    if centavos:
+        valores = valores_em_centavos(resultado, markup, quantidade)
+        resultado.update({chave: np.where(valido, valor, 0) for chave, valor in valores.items()})
+    
+    return resultado
+
+# Faixas de quantidade padrão pedidas pelos clientes
+QUANTIDADES_PADRAO = (50, 100, 250, 500, 1000)
+
+def calcular_curva_precos(especificacao, quantidades=QUANTIDADES_PADRAO, contexto=None):
+    """
+    Calcula a tabela de preços por faixa de quantidade para uma única caixa.
+    
+    especificacao: dicionário com os parâmetros de calcular_custo_caixa_completo
+    (dimensões em mm ou em cm, como em BoxSpec.de_dicionario; a 'quantidade',
+    se presente, é ignorada). Geometria, constantes e custos
+    unitários são calculados uma única vez; por faixa só variam os termos que
+    dependem da quantidade. Retorna um DataFrame com uma linha por quantidade
+    ou None se a especificação for inválida.
+    """
+    try:
+        quantidades = [int(quantidade) for quantidade in quantidades]
+        if not quantidades or min(quantidades) <= 0:
+            raise ValueError("Quantidades devem ser maiores que zero")
+        
+        if contexto is None:
+            contexto = get_pricing_context()
+        
+        especificacao = BoxSpec.de_dicionario(
+            {nome: valor for nome, valor in especificacao.items() if nome != 'quantidade'}
+        )
+        base = calcular_preco(especificacao, contexto)
+        if base is None:
+            return None
+        
+        # Encaixe na chapa para estimar o número de chapas de cada faixa
+        geometria = calcular_geometria(
+            especificacao.largura_mm, especificacao.altura_mm, especificacao.profundidade_mm,
+            especificacao.modelo, contexto
+        )
+        caixas_por_chapa = calcular_encaixe_pecas(geometria, contexto)['caixas_por_chapa']
+        
+        preco_unitario = base.preco_unitario
+        linhas = []
+        for quantidade in quantidades:
+            linhas.append({
+                'quantidade': quantidade,
+                'preco_unitario': preco_unitario,
+                'preco_total': preco_unitario * quantidade,
+                'chapas_necessarias': math.ceil(quantidade / caixas_por_chapa) if caixas_por_chapa > 0 else None
+            })
+        
+        return pd.DataFrame(linhas)
+        
+    except Exception as e:
+        print(f"Erro no cálculo da curva de preços: {str(e)}")
+        return None
+
+def selecionar_chapa(especificacao, contexto=None):
+    """
+    Formato de chapa de menor custo total para o pedido de uma caixa de
+    papelão (BoxSpec com a quantidade pedida), entre os formatos da tabela
+    formatos_chapa; sem catálogo, usa a chapa padrão das constantes. Retorna
+    o dicionário de nesting.selecionar_formato_chapa, ou None para acrílico
+    e especificações inválidas.
+    """
+    try:
+        if especificacao.material != "Papelão":
+            return None
+        
+        if contexto is None:
+            contexto = get_pricing_context()
+        
+        formatos = get_formatos_chapa() or [{
+            'nome': 'Padrão',
+            'largura_mm': contexto.largura_placa_papelao_mm,
+            'altura_mm': contexto.altura_placa_papelao_mm,
+            'custo_m2': contexto.custo_papelao_m2
+        }]
+        geometria = calcular_geometria(
+            especificacao.largura_mm, especificacao.altura_mm, especificacao.profundidade_mm,
+            especificacao.modelo, contexto
+        )
+        return selecionar_formato_chapa(
+            geometria['pecas'], especificacao.quantidade, formatos, contexto.margem_mm, geometria.get('diametros')
+        )
+        
+    except Exception as e:
+        print(f"Erro na seleção da chapa: {str(e)}")
+        return None
+
+def selecionar_embalagem(especificacao, contexto=None):
+    """
+    Caixas de despache de menor custo para enviar o pedido de uma caixa
+    (BoxSpec com a quantidade pedida), entre as da tabela caixas_despache;
+    sem catálogo, usa a embalagem padrão das constantes. Retorna o dicionário
+    de shipping.selecionar_caixas_despache, ou None se nenhuma caixa de
+    despache comportar a caixa.
+    """
+    try:
+        return calcular_custo_caixa_papelao(
+            especificacao.largura_mm / 10, especificacao.altura_mm / 10, especificacao.profundidade_mm / 10,
+            especificacao.quantidade, contexto
+        )
+        
+    except Exception as e:
+        print(f"Erro na seleção da embalagem: {str(e)}")
+        return None
+
+# Impressões comparadas pelo explorador de configurações: (usar_impressao_digital, tipo_impressao)
+IMPRESSOES_EXPLORADAS = ((False, "A4"), (True, "A4"), (True, "A3"))
+MATERIAIS_EXPLORADOS = ("Papelão", "Acrílico")
+
+# Campos que o explorador varia (os demais podem ser fixados em opcoes)
+CAMPOS_EXPLORADOS = ('largura_mm', 'altura_mm', 'profundidade_mm', 'quantidade', 'modelo', 'material',
+                      'tipo_revestimento', 'usar_impressao_digital', 'tipo_impressao')
+
+def explorar_configuracoes(largura_mm, altura_mm, profundidade_mm, quantidade=1, modelos=None,
+                           impressoes=IMPRESSOES_EXPLORADAS, contexto=None, **opcoes):
+    """
+    Compara todas as combinações de modelo, material, revestimento e
+    impressão para uma caixa de dimensões dadas (mm), da mais barata à mais cara.
+    
+    Os revestimentos de cada material vêm de determinar_revestimentos_disponiveis
+    e as colas quente e de isopor de determinar_colas_automaticas. modelos:
+    padrão, os de GEOMETRIAS mais os paramétricos. opcoes fixa os demais
+    campos de BoxSpec (ex.: berco=True, markup=0.3). Todas as combinações
+    são calculadas em uma única chamada de calcular_custo_caixa_lote.
+    Retorna um DataFrame (posicao, modelo, material, tipo_revestimento,
+    usar_impressao_digital, tipo_impressao, preco_unitario, preco_total,
+    custo_material e os preços em centavos) só com as combinações válidas,
+    ou None em caso de erro.
+    """
+    try:
+        invalidos = set(opcoes) & set(CAMPOS_EXPLORADOS) | set(opcoes) - set(BoxSpec._fields)
+        if invalidos:
+            raise ValueError(f"Parâmetros não suportados em opcoes: {sorted(invalidos)}")
+        
+        if contexto is None:
+            contexto = get_pricing_context()
+        
+        if modelos is None:
+            modelos = list(GEOMETRIAS)
+            try:
+                modelos += [nome for nome in modelos_parametricos() if nome not in GEOMETRIAS]
+            except Exception as e:
+                print(f"⚠️ Modelos paramétricos indisponíveis: {str(e)}")
+        
+        especificacoes = []
+        for modelo in modelos:
+            for material in MATERIAIS_EXPLORADOS:
+                colas = determinar_colas_automaticas(material, material == "Acrílico")
+                automaticas = {
+                    'usar_cola_quente': colas['cola_quente'],
+                    'usar_cola_isopor': colas['cola_isopor']
+                }
+                for tipo_revestimento in determinar_revestimentos_disponiveis(material):
+                    for usar_impressao_digital, tipo_impressao in impressoes:
+                        especificacoes.append(BoxSpec(
+                            largura_mm=largura_mm,
+                            altura_mm=altura_mm,
+                            profundidade_mm=profundidade_mm,
+                            modelo=modelo,
+                            material=material,
+                            quantidade=quantidade,
+                            tipo_revestimento=tipo_revestimento,
+                            usar_impressao_digital=usar_impressao_digital,
+                            tipo_impressao=tipo_impressao,
+                            **{**automaticas, **opcoes}
+                        ))
+        
+        colunas = ['posicao', 'modelo', 'material', 'tipo_revestimento', 'usar_impressao_digital', 'tipo_impressao',
+                   'preco_unitario', 'preco_total', 'custo_material', 'preco_unitario_centavos', 'preco_total_centavos']
+        if not especificacoes:
+            return pd.DataFrame(columns=colunas)
+        
+        resultado = calcular_custo_caixa_lote(especificacoes, contexto, centavos=True)
+        tabela = pd.DataFrame(BoxSpec.colunas(especificacoes))
+        for chave in ('preco_unitario', 'preco_total', 'preco_unitario_centavos', 'preco_total_centavos'):
+            tabela[chave] = resultado[chave]
+        tabela['custo_material'] = resultado['custo_papelao'] + resultado['custo_acrilico'] + resultado['custo_revestimento']
+        
+        tabela = tabela[resultado['valido']].sort_values(
+            ['preco_unitario_centavos', 'preco_unitario'], kind='stable'
+        ).reset_index(drop=True)
+        tabela['posicao'] = np.arange(1, len(tabela) + 1)
+        return tabela[colunas]
+        
+    except Exception as e:
+        print(f"Erro no explorador de configurações: {str(e)}")
+        return None
+
+def calcular_sensibilidade_lote(especificacoes=None, contexto=None, passo_relativo=1e-4, **colunas):
+    """
+    Sensibilidade do preco_unitario a cada constante (tabela constants) e a
+    cada custo fixo (tabela de custos fixos), para uma ou várias caixas.
+    
+    As derivadas parciais são obtidas por diferenças centrais em uma única
+    avaliação em lote: cada caixa é replicada com cada constante deslocada
+    para cima e para baixo (exato para os termos lineares e quadráticos).
+    Recebe as especificações no mesmo formato de calcular_custo_caixa_lote.
+    Retorna um dicionário com 'preco_unitario' (array) e os DataFrames
+    'derivadas' e 'elasticidades' (uma linha por caixa, uma coluna por
+    constante; custos fixos com prefixo 'custos_fixos.').
+    """
+    entrada = _preparar_colunas_lote(especificacoes, colunas)
+    m = len(entrada['largura_mm'])
+    
+    if contexto is None:
+        contexto = get_pricing_context()
+    
+    parametros = ([('constantes', nome, float(valor)) for nome, valor in contexto.constantes.items()] +
+                  [('custos_fixos', nome, float(valor)) for nome, valor in contexto.custos_fixos.items()])
+    valores = np.array([valor for _, _, valor in parametros])
+    passos = np.where(valores != 0, np.abs(valores) * passo_relativo, passo_relativo)
+    
+    # Linha 0: valores nominais; linhas 2i+1 e 2i+2: parâmetro i deslocado para cima e para baixo
+    linhas = 2 * len(parametros) + 1
+    perturbados = {'constantes': {}, 'custos_fixos': {}}
+    for i, (fonte, nome, valor) in enumerate(parametros):
+        coluna = np.full(linhas, valor)
+        coluna[2 * i + 1] += passos[i]
+        coluna[2 * i + 2] -= passos[i]
+        perturbados[fonte][nome] = np.tile(coluna, m)
+    
+    contexto_perturbado = PricingContext(perturbados['constantes'], perturbados['custos_fixos'], contexto.regras)
+    entrada_replicada = {nome: np.repeat(valor, linhas) for nome, valor in entrada.items()}
+    precos = calcular_custo_caixa_lote(entrada_replicada, contexto_perturbado, somente_preco=True)['preco_unitario']
+    precos = precos.reshape(m, linhas)
+    
+    preco_unitario = precos[:, 0]
+    derivadas = (precos[:, 1::2] - precos[:, 2::2]) / (2 * passos)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        elasticidades = derivadas * valores / preco_unitario[:, None]
+    
+    nomes = [nome if fonte == 'constantes' else f"custos_fixos.{nome}" for fonte, nome, _ in parametros]
+    return {
+        'preco_unitario': preco_unitario,
+        'derivadas': pd.DataFrame(derivadas, columns=nomes),
+        'elasticidades': pd.DataFrame(elasticidades, columns=nomes)
+    }
+
+def calcular_sensibilidade_precos(especificacao, contexto=None):
+    """
+    Sensibilidade do preco_unitario de uma caixa às constantes do Supabase.
+    
+    especificacao: dicionário com os parâmetros de calcular_custo_caixa_completo.
+    Retorna um DataFrame (parametro, valor, derivada, elasticidade) ordenado
+    pelo impacto relativo, pronto para um gráfico de tornado, ou None se a
+    especificação for inválida.
+    """
+    try:
+        if contexto is None:
+            contexto = get_pricing_context()
+        sensibilidade = calcular_sensibilidade_lote(
+            {nome: [valor] for nome, valor in especificacao.items()}, contexto
         )
+        if np.isnan(sensibilidade['preco_unitario'][0]):
+            raise ValueError("Especificação inválida para o cálculo CPQ")
+        
+        valores = list(contexto.constantes.values()) + list(contexto.custos_fixos.values())
+        tabela = pd.DataFrame({
+            'parametro': sensibilidade['derivadas'].columns,
+            'valor': [float(valor) for valor in valores],
+            'derivada': sensibilidade['derivadas'].iloc[0].to_numpy(),
+            'elasticidade': sensibilidade['elasticidades'].iloc[0].to_numpy()
+        })
+        ordem = tabela['elasticidade'].abs().sort_values(ascending=False).index
+        return tabela.loc[ordem].reset_index(drop=True)
         
-        # Aplicar markup
-        if markup > 0:
-            preco_unitario = custo_total_unitario * (1 + markup)
+    except Exception as e:
+        print(f"Erro no cálculo de sensibilidade: {str(e)}")
+        return None
+
+# Menor valor amostrado de constantes que dividem o cálculo (as demais param em 0)
+_MINIMOS_AMOSTRA = {
+    'caixas_por_mes': 1.0
+}
+
+def _amostrar_distribuicao(distribuicao, gerador, amostras, minimo=0.0):
+    """
+    Gera amostras de uma distribuição: ('normal', media, desvio),
+    ('uniforme', minimo, maximo), ('triangular', minimo, moda, maximo)
+    ou uma função f(gerador, amostras) que retorna um array.
+    Valores abaixo de minimo são levados a minimo.
+    """
+    if callable(distribuicao):
+        valores = np.asarray(distribuicao(gerador, amostras), dtype=float)
+    else:
+        tipo, *parametros = distribuicao
+        if tipo == "normal":
+            valores = gerador.normal(parametros[0], parametros[1], amostras)
+        elif tipo == "uniforme":
+            valores = gerador.uniform(parametros[0], parametros[1], amostras)
+        elif tipo == "triangular":
+            valores = gerador.triangular(parametros[0], parametros[1], parametros[2], amostras)
         else:
-            preco_unitario = custo_total_unitario
-        
-        # Calcular preço total do projeto
-        preco_total = preco_unitario * quantidade
-        
-        # Calcular custo de embalagem
-        custo_caixa_papelao_total = calcular_custo_caixa_papelao(quantidade)
-        
-        # Montar resposta
-        response = {
-            "preco_total": preco_total,
-            "preco_unitario": preco_unitario,
-            "custo_fixo_unitario": custo_fixo_unitario,
-            "caixas_por_mes": caixas_por_mes,
-            "custo_papelao": custo_papelao,
-            "custo_acrilico": custo_acrilico,
-            "custo_revestimento": custo_revestimento,
-            "custo_cola_pva": custo_cola_pva,
-            "custo_cola_adesiva": custo_cola_adesiva,
-            "custo_serigrafia": custo_serigrafia,
-            "custo_impressao": custo_impressao,
-            "custo_cola_quente": custo_cola_quente,
-            "custo_cola_isopor": custo_cola_isopor,
-            "custo_fita": custo_fita,
-            "custo_rebites": custo_rebites,
-            "custo_ima_chapa": custo_ima_chapa,
-            "area_papelao_m2": area_papelao_m2,
-            "area_acrilico_m2": area_acrilico_m2,
-            "area_revestimento_m2": area_revestimento_m2,
-            "ml_cola_pva": ml_cola_pva,
-            "ml_cola_adesiva": ml_cola_adesiva
+            raise ValueError(f"Distribuição '{tipo}' não suportada")
+    
+    if valores.shape != (amostras,):
+        raise ValueError("A distribuição deve gerar um valor por amostra")
+    # Preços e quantidades não podem ser negativos (nem nulos, se dividem o cálculo)
+    return np.maximum(valores, minimo)
+
+def simular_custos_monte_carlo(especificacao, distribuicoes, amostras=20000, percentis=(5, 50, 95),
+                               semente=None, contexto=None):
+    """
+    Simulação de Monte Carlo da incerteza do custo unitário de uma caixa.
+    
+    especificacao: dicionário com os parâmetros de calcular_custo_caixa_completo
+    distribuicoes: {constante: distribuição} (ver _amostrar_distribuicao);
+                   custos fixos usam o prefixo 'custos_fixos.'
+    
+    Todas as amostras são avaliadas em uma única passada vetorizada de
+    calcular_custo_caixa_lote. O preço cotado é o nominal (constantes atuais
+    com o markup da especificação); a margem de cada amostra é
+    (preço - custo) / preço. Retorna um dicionário com os percentis de custo
+    unitário e de margem, ou None se a simulação não puder ser feita.
+    """
+    try:
+        if contexto is None:
+            contexto = get_pricing_context()
+        
+        nominal = calcular_custo_caixa_completo(**especificacao, contexto=contexto)
+        if nominal is None:
+            raise ValueError("Especificação inválida para o cálculo CPQ")
+        preco_unitario = nominal['preco_unitario']
+        custo_nominal = calcular_custo_caixa_completo(**{**especificacao, 'markup': 0.0}, contexto=contexto)['preco_unitario']
+        
+        gerador = np.random.default_rng(semente)
+        constantes = dict(contexto.constantes)
+        custos_fixos = dict(contexto.custos_fixos)
+        for nome, distribuicao in distribuicoes.items():
+            if nome.startswith("custos_fixos."):
+                destino, chave = custos_fixos, nome[len("custos_fixos."):]
+            else:
+                destino, chave = constantes, nome
+            if chave not in destino:
+                raise ValueError(f"Constante '{nome}' não encontrada no Supabase")
+            destino[chave] = _amostrar_distribuicao(distribuicao, gerador, amostras, _MINIMOS_AMOSTRA.get(chave, 0.0))
+        
+        # Sem markup, o preço unitário do lote é o custo total unitário
+        entrada = {nome: [valor] for nome, valor in especificacao.items()}
+        entrada['markup'] = [0.0]
+        entrada['largura_mm'] = np.repeat(float(especificacao['largura_mm']), amostras)
+        custos = calcular_custo_caixa_lote(
+            entrada, PricingContext(constantes, custos_fixos, contexto.regras), somente_preco=True
+        )['preco_unitario']
+        margens = (preco_unitario - custos) / preco_unitario
+        if not np.isfinite(custos).all():
+            raise ValueError("A simulação gerou custos não finitos; revise as distribuições")
+        
+        return {
+            'preco_unitario': preco_unitario,
+            'custo_nominal': custo_nominal,
+            'amostras': amostras,
+            'custo_unitario': {p: float(v) for p, v in zip(percentis, np.percentile(custos, percentis))},
+            'margem': {p: float(v) for p, v in zip(percentis, np.percentile(margens, percentis))},
+            'custo_medio': float(custos.mean()),
+            'probabilidade_prejuizo': float((custos > preco_unitario).mean())
         }
         
-        return response
+    except Exception as e:
+        print(f"Erro na simulação de Monte Carlo: {str(e)}")
+        return None
+
+# Pontos avaliados por iteração da bisseção em lote
+_PONTOS_BISSECAO = 64
+
+def _precos_lote(especificacao, contexto, exato=False, **colunas):
+    """
+    preco_unitario de várias variações de uma especificação (NaN = inválida).
+    Se só as dimensões variam, usa o polinômio do preço (polinomio_preco),
+    quando disponível, a menos que exato seja verdadeiro.
+    """
+    if not exato and set(colunas) <= set(_DIMENSOES_PREVIA):
+        polinomio = polinomio_preco(BoxSpec.de_dicionario(especificacao), contexto)
+        if polinomio is not None:
+            return polinomio.avaliar(*[np.asarray(colunas.get(nome, especificacao[nome]), dtype=float)
+                                       for nome in _DIMENSOES_PREVIA])
+    
+    entrada = {nome: [valor] for nome, valor in especificacao.items()}
+    entrada.update(colunas)
+    return calcular_custo_caixa_lote(entrada, contexto, somente_preco=True)['preco_unitario']
+
+def _bissecao_lote(dentro_do_alvo, inferior, superior, tolerancia):
+    """
+    Bisseção K-ária sobre um predicado monótono avaliado em lote.
+    
+    dentro_do_alvo(valores) -> array de bool, verdadeiro em [inferior, x*]
+    e falso depois (inferior deve satisfazer o predicado e superior não).
+    Cada iteração avalia _PONTOS_BISSECAO pontos em uma única chamada.
+    Retorna o maior valor que satisfaz o predicado, com a tolerância dada.
+    """
+    while superior - inferior > tolerancia:
+        pontos = np.linspace(inferior, superior, _PONTOS_BISSECAO)
+        pontos = pontos[(pontos > inferior) & (pontos < superior)]
+        if len(pontos) == 0:
+            break
+        dentro = dentro_do_alvo(pontos)
+        
+        # Último ponto dentro do alvo e primeiro fora dele delimitam o novo intervalo
+        fora = np.nonzero(~dentro)[0]
+        ultimo_dentro = (fora[0] if len(fora) else len(pontos)) - 1
+        if ultimo_dentro >= 0:
+            inferior = pontos[ultimo_dentro]
+        if ultimo_dentro + 1 < len(pontos):
+            superior = pontos[ultimo_dentro + 1]
+    return inferior
+
+def resolver_dimensao_maxima(especificacao, preco_alvo, eixo=None, tolerancia_mm=0.1, limite_mm=5000,
+                             contexto=None):
+    """
+    Maior caixa cujo preço unitário não passa de preco_alvo.
+    
+    especificacao: dicionário com os parâmetros de calcular_custo_caixa_completo
+    eixo: None mantém a proporção entre largura, altura e profundidade da
+          especificação; 'largura_mm', 'altura_mm' ou 'profundidade_mm' varia
+          só essa dimensão, com as demais fixas
+    
+    O preço cresce com as dimensões: uma grade geométrica avaliada em lote
+    delimita a solução e a bisseção em lote a refina até tolerancia_mm.
+    Retorna um dicionário com as dimensões (mm) e o preco_unitario da
+    solução, ou None se nem a menor caixa cabe no preço alvo.
+    """
+    try:
+        if eixo is not None and eixo not in ('largura_mm', 'altura_mm', 'profundidade_mm'):
+            raise ValueError(f"Eixo '{eixo}' não suportado")
+        if contexto is None:
+            contexto = get_pricing_context()
+        
+        eixos = [eixo] if eixo else ['largura_mm', 'altura_mm', 'profundidade_mm']
+        base = np.array([float(especificacao[nome]) for nome in eixos])
+        if (base <= 0).any():
+            raise ValueError("Dimensões devem ser maiores que zero")
+        
+        # Variável de busca: fator de escala aplicado às dimensões variáveis
+        def precos(fatores, exato=False):
+            colunas = {nome: fatores * dimensao for nome, dimensao in zip(eixos, base)}
+            return _precos_lote(especificacao, contexto, exato, **colunas)
         
+        def dentro_do_alvo(fatores):
+            return precos(fatores) <= preco_alvo
+        
+        fator_minimo = tolerancia_mm / base.max()
+        fator_maximo = limite_mm / base.max()
+        
+        # Delimitação: grade geométrica entre a menor e a maior caixa
+        grade = np.geomspace(fator_minimo, fator_maximo, _PONTOS_BISSECAO)
+        dentro = dentro_do_alvo(grade)
+        if not dentro[0]:
+            return None
+        fora = np.nonzero(~dentro)[0]
+        if len(fora) == 0:
+            fator = fator_maximo
+        else:
+            fator = _bissecao_lote(dentro_do_alvo, grade[fora[0] - 1], grade[fora[0]], fator_minimo)
+        
+        solucao = {nome: float(especificacao[nome]) for nome in ('largura_mm', 'altura_mm', 'profundidade_mm')}
+        solucao.update({nome: float(fator * dimensao) for nome, dimensao in zip(eixos, base)})
+        solucao['preco_unitario'] = float(precos(np.array([fator]), exato=True)[0])
+        return solucao
+        
+    except Exception as e:
+        print(f"Erro na busca da dimensão máxima: {str(e)}")
+        return None
+
+# Memorização dos orçamentos completos (LRU limitado)
+TAMANHO_MAXIMO_MEMO = 512
+_memo_orcamentos = OrderedDict()
+_memo_estatisticas = {'acertos': 0, 'falhas': 0}
+_memo_lock = threading.Lock()
+
+@registrar_limpeza_cache
+def limpar_memo_cpq():
+    """Esvazia a memorização de orçamentos (chamada também por constants.clear_cache)"""
+    with _memo_lock:
+        _memo_orcamentos.clear()
+
+def estatisticas_memo_cpq():
+    """Acertos, falhas e ocupação da memorização de orçamentos"""
+    with _memo_lock:
+        return {
+            'acertos': _memo_estatisticas['acertos'],
+            'falhas': _memo_estatisticas['falhas'],
+            'tamanho': len(_memo_orcamentos),
+            'capacidade': TAMANHO_MAXIMO_MEMO
+        }
+
+def calcular_orcamento(especificacao, centavos=False, contexto=None):
+    """
+    Versão tipada e memorizada do cálculo: BoxSpec -> QuoteResult (ou None
+    se a especificação for inválida).
+    
+    A chave é a especificação normalizada mais a versão das constantes do
+    contexto; os orçamentos menos usados são descartados acima de
+    TAMANHO_MAXIMO_MEMO. O QuoteResult é imutável e é compartilhado sem
+    cópia. centavos: preenche preco_unitario_centavos e preco_total_centavos.
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
+    
+    normalizada = especificacao.normalizada()
+    chave = (normalizada, bool(centavos), contexto.versao)
+    try:
+        hash(chave)
+    except TypeError as e:
+        print(f"Erro no cálculo CPQ: {str(e)}")
+        return None
+    
+    with _memo_lock:
+        if chave in _memo_orcamentos:
+            _memo_orcamentos.move_to_end(chave)
+            _memo_estatisticas['acertos'] += 1
+            return _memo_orcamentos[chave]
+        _memo_estatisticas['falhas'] += 1
+    
+    try:
+        resultado = _calcular_orcamento(*normalizada, contexto)
+        if centavos:
+            valores = valores_em_centavos(
+                dict(zip(CHAVES_RESULTADO_CPQ, resultado)), normalizada.markup, normalizada.quantidade
+            )
+            resultado = resultado._replace(
+                preco_unitario_centavos=valores['preco_unitario_centavos'],
+                preco_total_centavos=valores['preco_total_centavos']
+            )
+    except Exception as e:
+        print(f"Erro no cálculo CPQ: {str(e)}")
+        resultado = None
+    
+    with _memo_lock:
+        _memo_orcamentos[chave] = resultado
+        _memo_orcamentos.move_to_end(chave)
+        while len(_memo_orcamentos) > TAMANHO_MAXIMO_MEMO:
+            _memo_orcamentos.popitem(last=False)
+    
+    return resultado
+
+# Caminho rápido: só o preço, com o detalhamento calculado sob demanda
+class PriceQuote:
+    """
+    Preço de um orçamento calculado sem o detalhamento (calcular_preco).
+    
+    preco_unitario e preco_total já vêm calculados. O detalhamento completo
+    (QuoteResult com centavos) é calculado no primeiro acesso a detalhes ou a
+    qualquer outro campo de QuoteResult (ex.: cotacao.custo_papelao), com o
+    mesmo contexto, e tem os mesmos valores de calcular_orcamento.
+    """
+    
+    __slots__ = ('especificacao', 'contexto', 'preco_unitario', 'preco_total', '_detalhes')
+    
+    def __init__(self, especificacao, contexto, preco_unitario, preco_total):
+        self.especificacao = especificacao
+        self.contexto = contexto
+        self.preco_unitario = preco_unitario
+        self.preco_total = preco_total
+        self._detalhes = None
+    
+    @property
+    def detalhes(self):
+        """QuoteResult completo (calculado e memorizado no primeiro acesso)"""
+        if self._detalhes is None:
+            detalhes = calcular_orcamento(self.especificacao, centavos=True, contexto=self.contexto)
+            if detalhes is None:
+                raise Exception("Não foi possível calcular o detalhamento do orçamento")
+            self._detalhes = detalhes
+        return self._detalhes
+    
+    def __getattr__(self, name):
+        # Só é chamado para atributos que não são slots: campos do detalhamento
+        if name in QuoteResult._fields:
+            return getattr(self.detalhes, name)
+        raise AttributeError(name)
+    
+    def __repr__(self):
+        return f"PriceQuote(preco_unitario={self.preco_unitario!r}, preco_total={self.preco_total!r})"
+
+def calcular_preco(especificacao, contexto=None):
+    """
+    Caminho rápido para quem só precisa do preço (prévias, catálogos, faixas
+    de quantidade): BoxSpec -> PriceQuote, ou None se a especificação for
+    inválida. Não monta o detalhamento nem calcula a embalagem; o preço é o
+    mesmo de calcular_custo_caixa_completo.
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
+    
+    try:
+        preco_unitario = _calcular_orcamento(*especificacao, contexto, True)
     except Exception as e:
         print(f"Erro no cálculo CPQ: {str(e)}")
         return None
+    return PriceQuote(especificacao, contexto, preco_unitario, preco_unitario * especificacao.quantidade)
+
+# Kits: várias caixas orçadas juntas, com as peças de papelão encaixadas nas mesmas chapas
+class KitQuote(NamedTuple):
+    """
+    Orçamento de um kit (ex.: caixa externa e duas internas).
+    
+    especificacoes e resultados trazem uma linha por caixa do kit, com a
+    quantidade total do pedido (unidades por kit x quantidade_kits) e os
+    preços de cada caixa dentro do kit, em centavos. preco_avulso_kit_centavos
+    é o preço de um kit com cada caixa orçada sozinha, com o papelão também
+    pelas chapas inteiras (do encaixe de cada caixa). kits_por_chapa e
+    chapas_necessarias vêm do encaixe conjunto das peças de papelão;
+    chapas_separadas é o número de chapas se cada caixa fosse encaixada
+    sozinha (None sem peças de papelão).
+    """
+    especificacoes: tuple
+    resultados: tuple
+    quantidade_kits: int
+    preco_kit_centavos: int
+    preco_total_centavos: int
+    preco_avulso_kit_centavos: int
+    kits_por_chapa: int
+    chapas_necessarias: Optional[int]
+    chapas_separadas: Optional[int]
+    
+    @property
+    def preco_kit(self):
+        """Preço de um kit em reais"""
+        return self.preco_kit_centavos / CENTAVOS_POR_REAL
+    
+    @property
+    def preco_total(self):
+        """Preço do pedido (todos os kits) em reais"""
+        return self.preco_total_centavos / CENTAVOS_POR_REAL
+    
+    def itens(self):
+        """
+        Itens no formato de inserir_orcamento. Vão sem a especificação: o
+        preço de cada caixa depende do kit inteiro e não é reprecificado
+        como o de uma caixa avulsa (repricing.py)
+        """
+        return [
+            {
+                'descricao': f"{especificacao.descricao()} - Kit",
+                'quantidade': int(especificacao.quantidade),
+                'preco_unitario': resultado.preco_unitario,
+                'preco_unitario_centavos': resultado.preco_unitario_centavos
+            }
+            for especificacao, resultado in zip(self.especificacoes, self.resultados)
+        ]
+
+def _chapas_kit(especificacoes, unidades, quantidade_kits, contexto):
+    """
+    (kits_por_chapa, chapas_necessarias, chapas_separadas) das caixas de
+    papelão do kit: chapas do encaixe conjunto e, somando o encaixe de cada
+    caixa sozinha, das mesmas caixas separadas (None se alguma não couber)
+    """
+    caixas = []
+    chapas_separadas = 0
+    for especificacao, unidades_caixa in zip(especificacoes, unidades):
+        if especificacao.material != "Papelão":
+            continue
+        geometria = calcular_geometria(
+            especificacao.largura_mm, especificacao.altura_mm, especificacao.profundidade_mm,
+            especificacao.modelo, contexto
+        )
+        caixas.append((geometria['pecas'], unidades_caixa))
+        caixas_por_chapa = calcular_encaixe_pecas(geometria, contexto)['caixas_por_chapa']
+        if caixas_por_chapa > 0 and chapas_separadas is not None:
+            chapas_separadas += math.ceil(unidades_caixa * quantidade_kits / caixas_por_chapa)
+        else:
+            chapas_separadas = None
+    
+    if not caixas:
+        return 0, None, None
+    
+    kits_por_chapa = calcular_encaixe_kit(
+        caixas, contexto.largura_placa_papelao_mm, contexto.altura_placa_papelao_mm, contexto.margem_mm
+    )['kits_por_chapa']
+    chapas_necessarias = math.ceil(quantidade_kits / kits_por_chapa) if kits_por_chapa > 0 else None
+    
+    # Kit maior que a chapa (ou encaixe conjunto pior que o separado): chapas por caixa
+    if chapas_separadas is not None and (chapas_necessarias is None or chapas_separadas < chapas_necessarias):
+        chapas_necessarias = chapas_separadas
+    return kits_por_chapa, chapas_necessarias, chapas_separadas
+
+def _refazer_totais(colunas, markup, quantidade):
+    """Refaz preco_unitario, preco_total e os valores em centavos como no cálculo unitário (mesma ordem de soma)"""
+    custo_total_unitario = sum(colunas[chave] for chave in CHAVES_CUSTO_CPQ)
+    colunas['preco_unitario'] = np.where(markup > 0, custo_total_unitario * (1 + markup), custo_total_unitario)
+    colunas['preco_total'] = colunas['preco_unitario'] * quantidade
+    colunas.update(valores_em_centavos(colunas, markup, quantidade))
+
+def calcular_kit(especificacoes, quantidade_kits=1, contexto=None):
+    """
+    Orça um kit de caixas: lista de BoxSpec, em que a quantidade de cada um é
+    o número de unidades daquela caixa em um kit -> KitQuote, ou None se
+    alguma caixa for inválida.
+    
+    Todas as caixas são calculadas em uma única chamada de
+    calcular_custo_caixa_lote, com o mesmo contexto, e o kit é precificado
+    como um produto só, a partir dos custos de cada caixa orçada sozinha:
+    - custos fixos: o kit absorve custo_fixo_unitario uma única vez (conta
+      como uma caixa em caixas_por_mes), repartido pelas unidades do kit;
+    - papelão: o custo pela área das peças, como no orçamento unitário,
+      reduzido na proporção das chapas que o encaixe conjunto economiza
+      (chapas_necessarias / chapas_separadas).
+    Os demais componentes, o markup e o arredondamento em centavos seguem o
+    cálculo unitário. preco_avulso_kit_centavos é o preço das mesmas caixas
+    orçadas sozinhas (calcular_custo_caixa_completo com a quantidade do
+    pedido); o preço do kit nunca passa dele.
+    """
+    try:
+        quantidade_kits = int(quantidade_kits)
+        if not especificacoes:
+            raise ValueError("O kit precisa de pelo menos uma caixa")
+        if quantidade_kits <= 0:
+            raise ValueError("Quantidade de kits deve ser maior que zero")
+        
+        if contexto is None:
+            contexto = get_pricing_context()
+        
+        unidades = [int(especificacao.quantidade) for especificacao in especificacoes]
+        if min(unidades) <= 0:
+            raise ValueError("Unidades por kit devem ser maiores que zero")
+        especificacoes = tuple(
+            especificacao._replace(quantidade=unidades_caixa * quantidade_kits)
+            for especificacao, unidades_caixa in zip(especificacoes, unidades)
+        )
+        
+        colunas = calcular_custo_caixa_lote(list(especificacoes), contexto, centavos=True)
+        for posicao, valido in enumerate(colunas['valido'].tolist(), start=1):
+            if not valido:
+                raise ValueError(f"Caixa {posicao} do kit inválida: {especificacoes[posicao - 1].descricao()}")
+        unidades_kit = np.array(unidades, dtype=float)
+        markup = np.array([especificacao.markup for especificacao in especificacoes], dtype=float)
+        quantidade = np.array([especificacao.quantidade for especificacao in especificacoes], dtype=float)
+        
+        kits_por_chapa, chapas_necessarias, chapas_separadas = _chapas_kit(
+            especificacoes, unidades, quantidade_kits, contexto
+        )
+        
+        # Avulsas: as caixas orçadas sozinhas, sem alteração
+        avulsas = QuoteResult.de_colunas(colunas)
+        preco_avulso_kit_centavos = int((colunas['preco_unitario_centavos'] * unidades).sum())
+        
+        # Custos fixos uma vez por kit, repartidos pelas unidades do kit
+        colunas['custo_fixo_unitario'] = colunas['custo_fixo_unitario'] / unidades_kit.sum()
+        
+        # Papelão pela área das peças, com a economia de chapas do encaixe conjunto
+        if chapas_separadas and chapas_necessarias < chapas_separadas:
+            colunas['custo_papelao'] = colunas['custo_papelao'] * (chapas_necessarias / chapas_separadas)
+        
+        # Totais refeitos como no cálculo unitário (mesma ordem de soma, markup e centavos)
+        _refazer_totais(colunas, markup, quantidade)
+        resultados = QuoteResult.de_colunas(colunas)
+        
+        # O kit só aplica economias: nunca fica mais caro que as caixas avulsas
+        if int((colunas['preco_unitario_centavos'] * unidades).sum()) > preco_avulso_kit_centavos:
+            resultados = avulsas
+        
+        return KitQuote(
+            especificacoes=especificacoes,
+            resultados=tuple(resultados),
+            quantidade_kits=quantidade_kits,
+            preco_kit_centavos=sum(
+                unidades_caixa * resultado.preco_unitario_centavos
+                for unidades_caixa, resultado in zip(unidades, resultados)
+            ),
+            preco_total_centavos=sum(resultado.preco_total_centavos for resultado in resultados),
+            preco_avulso_kit_centavos=preco_avulso_kit_centavos,
+            kits_por_chapa=kits_por_chapa,
+            chapas_necessarias=chapas_necessarias,
+            chapas_separadas=chapas_separadas
+        )
+        
+    except Exception as e:
+        print(f"Erro no cálculo do kit: {str(e)}")
+        return None
+
+# Preço como polinômio das dimensões (coeficientes por modelo, material e opções)
+ESCALA_POLINOMIO_MM = 1000.0
+FAIXA_POLINOMIO_MM = (0.5, 5000.0)
+TOLERANCIA_POLINOMIO = 1e-9
+TAMANHO_MAXIMO_POLINOMIOS = 64
+_AMOSTRAS_POLINOMIO = 24
+_polinomios_preco = OrderedDict()
+_polinomios_lock = threading.Lock()
+
+@registrar_limpeza_cache
+def limpar_polinomios_preco():
+    """Descarta os polinômios de preço (chamada também por constants.clear_cache)"""
+    with _polinomios_lock:
+        _polinomios_preco.clear()
+
+def _regiao_polinomio(largura_mm, altura_mm):
+    """
+    Região (0 a 3) em que o preço é um único polinômio: as fórmulas mudam
+    no degrau de imãs da Tampa Imã (largura ≤ 10) e no diâmetro da Tampa
+    Redonda (max(largura, altura))
+    """
+    return 2 * (largura_mm > 10) + (largura_mm >= altura_mm)
+
+def _monomios(largura_mm, altura_mm, profundidade_mm):
+    """Monômios de grau até 2 das dimensões (escaladas), na primeira dimensão do array"""
+    x, y, z = (np.asarray(dimensao, dtype=float) / ESCALA_POLINOMIO_MM
+               for dimensao in (largura_mm, altura_mm, profundidade_mm))
+    return np.stack([np.ones_like(x), x, y, z, x * x, y * y, z * z, x * y, x * z, y * z])
+
+class PricePolynomial:
+    """
+    preco_unitario como polinômio de grau 2 em largura, altura e profundidade,
+    para um modelo, material e conjunto de opções fixos: um vetor de
+    coeficientes por região de _regiao_polinomio, aplicado aos monômios das
+    dimensões. erro_relativo: maior erro relativo medido contra o cálculo
+    completo na verificação.
+    """
+    
+    __slots__ = ('coeficientes', 'erro_relativo', '_linhas')
+    
+    def __init__(self, coeficientes, erro_relativo):
+        self.coeficientes = coeficientes
+        self.erro_relativo = erro_relativo
+        # Coeficientes como listas, para avaliar escalares sem NumPy
+        self._linhas = coeficientes.tolist()
+    
+    def avaliar(self, largura_mm, altura_mm, profundidade_mm):
+        """preco_unitario para dimensões escalares ou arrays (NaN se alguma dimensão ≤ 0)"""
+        if not isinstance(largura_mm, np.ndarray) and not isinstance(altura_mm, np.ndarray) \
+                and not isinstance(profundidade_mm, np.ndarray):
+            if largura_mm <= 0 or altura_mm <= 0 or profundidade_mm <= 0:
+                return math.nan
+            c = self._linhas[_regiao_polinomio(largura_mm, altura_mm)]
+            x = largura_mm / ESCALA_POLINOMIO_MM
+            y = altura_mm / ESCALA_POLINOMIO_MM
+            z = profundidade_mm / ESCALA_POLINOMIO_MM
+            return (c[0] + c[1] * x + c[2] * y + c[3] * z + c[4] * x * x + c[5] * y * y + c[6] * z * z
+                    + c[7] * x * y + c[8] * x * z + c[9] * y * z)
+        
+        largura_mm, altura_mm, profundidade_mm = np.broadcast_arrays(
+            np.asarray(largura_mm, dtype=float), np.asarray(altura_mm, dtype=float),
+            np.asarray(profundidade_mm, dtype=float)
+        )
+        # Polinômio das quatro regiões em um produto de matrizes; cada ponto usa o da sua região
+        monomios = _monomios(largura_mm, altura_mm, profundidade_mm)
+        precos = (self.coeficientes @ monomios.reshape(len(monomios), -1)).reshape((4,) + largura_mm.shape)
+        regiao = _regiao_polinomio(largura_mm, altura_mm)
+        precos = np.take_along_axis(precos, regiao[np.newaxis], axis=0)[0]
+        return np.where((largura_mm > 0) & (altura_mm > 0) & (profundidade_mm > 0), precos, np.nan)
+    
+    def __repr__(self):
+        return f"PricePolynomial(erro_relativo={self.erro_relativo:.1e})"
+
+def _ajustar_polinomio(opcoes, contexto):
+    """
+    Deriva os coeficientes de cada região a partir do cálculo completo em
+    lote (um sistema linear por região, em pontos sorteados dentro dela) e
+    os verifica em outros pontos sorteados. Retorna None se o preço não for
+    um polinômio de grau 2 dentro da tolerância (ou se as opções forem inválidas).
+    """
+    minimo, maximo = FAIXA_POLINOMIO_MM
+    gerador = np.random.default_rng(0)
+    pontos = 2 * _AMOSTRAS_POLINOMIO
+    
+    # Metade dos pontos de cada região para o ajuste, metade para a verificação
+    dimensoes = []
+    for regiao in range(4):
+        larga, largura_maior = divmod(regiao, 2)
+        largura = gerador.uniform(10.5, maximo, pontos) if larga else gerador.uniform(minimo, 10.0, pontos)
+        if largura_maior:
+            altura = largura * gerador.uniform(0.05, 1.0, pontos)
+        else:
+            altura = largura + gerador.uniform(minimo, maximo, pontos)
+        dimensoes.append((largura, altura, gerador.uniform(minimo, maximo, pontos)))
+    largura, altura, profundidade = (np.concatenate(eixo) for eixo in zip(*dimensoes))
+    
+    entrada = {nome: [valor] for nome, valor in opcoes._asdict().items() if nome not in _DIMENSOES_PREVIA}
+    entrada.update(largura_mm=largura, altura_mm=altura, profundidade_mm=profundidade)
+    precos = calcular_custo_caixa_lote(entrada, contexto, somente_preco=True)['preco_unitario']
+    if not np.isfinite(precos).all():
+        return None
+    
+    monomios = _monomios(largura, altura, profundidade).T.reshape(4, pontos, -1)
+    precos = precos.reshape(4, pontos)
+    ajuste, verificacao = slice(0, _AMOSTRAS_POLINOMIO), slice(_AMOSTRAS_POLINOMIO, pontos)
+    coeficientes = np.array([
+        np.linalg.lstsq(monomios[regiao, ajuste], precos[regiao, ajuste], rcond=None)[0] for regiao in range(4)
+    ])
+    
+    estimados = np.einsum('rpk,rk->rp', monomios[:, verificacao], coeficientes)
+    exatos = precos[:, verificacao]
+    erro_relativo = float(np.max(np.abs(estimados - exatos) / np.maximum(np.abs(exatos), 1e-9)))
+    if erro_relativo > TOLERANCIA_POLINOMIO:
+        return None
+    return PricePolynomial(coeficientes, erro_relativo)
+
+def polinomio_preco(especificacao, contexto=None):
+    """
+    Polinômio do preço unitário nas dimensões para o modelo, material e
+    opções de especificacao (BoxSpec; dimensões e quantidade são ignoradas).
+    
+    Os coeficientes são derivados uma vez por (opções, versão das constantes)
+    e verificados contra o cálculo completo; depois, cada preço é um produto
+    escalar de 10 termos (PricePolynomial.avaliar). Retorna None quando o
+    preço não é um polinômio verificado (regras de precificação do Supabase,
+    que podem ter qualquer forma, opções inválidas ou erro acima de
+    TOLERANCIA_POLINOMIO): nesses casos, use o cálculo completo.
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
+    if contexto.regras is not None:
+        return None
+    
+    opcoes = especificacao.normalizada()._replace(largura_mm=0.0, altura_mm=0.0, profundidade_mm=0.0, quantidade=1)
+    chave = (opcoes, contexto.versao)
+    with _polinomios_lock:
+        if chave in _polinomios_preco:
+            _polinomios_preco.move_to_end(chave)
+            return _polinomios_preco[chave]
+    
+    polinomio = _ajustar_polinomio(opcoes, contexto)
+    
+    with _polinomios_lock:
+        _polinomios_preco[chave] = polinomio
+        _polinomios_preco.move_to_end(chave)
+        while len(_polinomios_preco) > TAMANHO_MAXIMO_POLINOMIOS:
+            _polinomios_preco.popitem(last=False)
+    return polinomio
+
+# Prévia de preço: grade de dimensões (mm) avaliada em lote e interpolada
+FAIXA_PREVIA_MM = (20.0, 1000.0)
+PONTOS_PREVIA = 25
+TAMANHO_MAXIMO_GRADES = 16
+_DIMENSOES_PREVIA = ('largura_mm', 'altura_mm', 'profundidade_mm')
+_grades_previa = OrderedDict()
+_grades_lock = threading.Lock()
+
+@registrar_limpeza_cache
+def limpar_grades_previa():
+    """Descarta as grades de prévia de preço (chamada também por constants.clear_cache)"""
+    with _grades_lock:
+        _grades_previa.clear()
+
+def _construir_grade_previa(opcoes, contexto):
+    """
+    Preço unitário nos nós da grade e estimativa de erro da interpolação em
+    cada célula, em uma única chamada do cálculo em lote.
+    
+    O erro de cada célula parte da diferença entre o preço exato no centro e
+    a média dos 8 vértices (a interpolação trilinear no centro): para custos
+    que variam com produtos de dimensões ou seus quadrados, esse já é o maior
+    erro dentro da célula; o dobro dele cobre também um degrau de preço
+    dentro da célula (ex.: número de imãs pela largura). Células com algum
+    vértice inválido ficam com erro infinito (a prévia não é usada).
+    """
+    minimo, maximo = FAIXA_PREVIA_MM
+    eixo = np.linspace(minimo, maximo, PONTOS_PREVIA)
+    centros = (eixo[:-1] + eixo[1:]) / 2
+    nos = np.meshgrid(eixo, eixo, eixo, indexing='ij')
+    meios = np.meshgrid(centros, centros, centros, indexing='ij')
+    
+    entrada = {nome: [valor] for nome, valor in opcoes._asdict().items() if nome not in _DIMENSOES_PREVIA}
+    for indice, nome in enumerate(_DIMENSOES_PREVIA):
+        entrada[nome] = np.concatenate([nos[indice].ravel(), meios[indice].ravel()])
+    precos = calcular_custo_caixa_lote(entrada, contexto, somente_preco=True)['preco_unitario']
+    
+    total_nos = PONTOS_PREVIA ** 3
+    precos_nos = precos[:total_nos].reshape((PONTOS_PREVIA,) * 3)
+    precos_centros = precos[total_nos:].reshape((PONTOS_PREVIA - 1,) * 3)
+    
+    interpolados = sum(
+        precos_nos[i:PONTOS_PREVIA - 1 + i, j:PONTOS_PREVIA - 1 + j, k:PONTOS_PREVIA - 1 + k]
+        for i in (0, 1) for j in (0, 1) for k in (0, 1)
+    ) / 8
+    erro = 2 * np.abs(precos_centros - interpolados)
+    erro[np.isnan(erro)] = np.inf
+    return precos_nos, erro
+
+def _grade_previa(opcoes, contexto):
+    """Grade de prévia das opções no contexto (reconstruída quando a versão das constantes muda)"""
+    chave = (opcoes, contexto.versao)
+    with _grades_lock:
+        if chave in _grades_previa:
+            _grades_previa.move_to_end(chave)
+            return _grades_previa[chave]
+    
+    grade = _construir_grade_previa(opcoes, contexto)
+    
+    with _grades_lock:
+        _grades_previa[chave] = grade
+        _grades_previa.move_to_end(chave)
+        while len(_grades_previa) > TAMANHO_MAXIMO_GRADES:
+            _grades_previa.popitem(last=False)
+    return grade
+
+def calcular_previa_preco(contexto=None, **especificacao):
+    """
+    Prévia instantânea do preço enquanto as dimensões são digitadas
+    (mesmos parâmetros de calcular_custo_caixa_completo).
+    
+    Para cada combinação de modelo, material e opções, a prévia usa o
+    polinômio do preço (polinomio_preco), exato até TOLERANCIA_POLINOMIO;
+    sem ele (ex.: regras de precificação do Supabase), uma grade de
+    PONTOS_PREVIA³ dimensões em FAIXA_PREVIA_MM é calculada em lote uma
+    única vez e a prévia é a interpolação trilinear na grade. Retorna um
+    dicionário com preco_unitario, preco_total e erro_maximo (estimativa
+    do erro do preço unitário), ou None se as dimensões estiverem fora da
+    grade ou a especificação for inválida: nesses casos, e para o
+    orçamento final, use o cálculo exato.
+    """
+    try:
+        if contexto is None:
+            contexto = get_pricing_context()
+        
+        normalizada = BoxSpec.de_dicionario(especificacao).normalizada()
+        polinomio = polinomio_preco(normalizada, contexto)
+        if polinomio is not None:
+            preco_unitario = polinomio.avaliar(normalizada.largura_mm, normalizada.altura_mm, normalizada.profundidade_mm)
+            if not math.isfinite(preco_unitario):
+                return None
+            return {
+                'preco_unitario': preco_unitario,
+                'preco_total': preco_unitario * normalizada.quantidade,
+                'erro_maximo': abs(preco_unitario) * TOLERANCIA_POLINOMIO
+            }
+        
+        opcoes = normalizada._replace(largura_mm=0.0, altura_mm=0.0, profundidade_mm=0.0)
+        precos_nos, erro = _grade_previa(opcoes, contexto)
+        
+        # Célula da grade e posição relativa (0 a 1) dentro dela em cada eixo
+        minimo, maximo = FAIXA_PREVIA_MM
+        passo = (maximo - minimo) / (PONTOS_PREVIA - 1)
+        celula, fracao = [], []
+        for dimensao in (normalizada.largura_mm, normalizada.altura_mm, normalizada.profundidade_mm):
+            posicao = (dimensao - minimo) / passo
+            if not 0 <= posicao <= PONTOS_PREVIA - 1:
+                return None
+            indice = min(int(posicao), PONTOS_PREVIA - 2)
+            celula.append(indice)
+            fracao.append(posicao - indice)
+        
+        i, j, k = celula
+        erro_maximo = float(erro[i, j, k])
+        if not math.isfinite(erro_maximo):
+            return None
+        
+        # Interpolação trilinear: profundidade, altura e depois largura
+        vertices = precos_nos[i:i + 2, j:j + 2, k:k + 2].tolist()
+        tl, ta, tp = fracao
+        planos = [[linha[0] + (linha[1] - linha[0]) * tp for linha in plano] for plano in vertices]
+        linhas = [plano[0] + (plano[1] - plano[0]) * ta for plano in planos]
+        preco_unitario = linhas[0] + (linhas[1] - linhas[0]) * tl
+        
+        return {
+            'preco_unitario': preco_unitario,
+            'preco_total': preco_unitario * normalizada.quantidade,
+            'erro_maximo': erro_maximo
+        }
+        
+    except Exception as e:
+        print(f"Erro na prévia de preço: {str(e)}")
+        return None
@@ -0,0 +1,504 @@
+"""
+Encaixe (nesting) 2D de peças retangulares em chapas de papelão.
+
+Calcula quantas caixas completas cabem em uma chapa, posicionando cada peça
+(base, tampa, imã, aba...) separadamente, com rotação de 90° permitida.
+Usa heurísticas de prateleira (shelf) sobre grupos de peças iguais, o que
+mantém o cálculo em poucos milissegundos mesmo para caixas pequenas.
+
+Peças circulares (tampa redonda) têm um encaixe próprio em malhas
+hexagonais e quadradas, que aproveita os vãos entre os círculos.
+
+Com um catálogo de formatos de chapa (Supabase), escolhe o formato de menor
+custo total para um pedido: limites pela área de todos os formatos são
+calculados de uma vez com NumPy, e o encaixe real só é feito nos formatos
+que ainda podem ser mais baratos que o melhor encontrado. Os formatos
+candidatos são memorizados por faixa de quantidade (de até 1/8 da
+quantidade), e as chapas de cada candidato são contadas para a quantidade
+exata.
+"""
+
+from functools import lru_cache
+import math
+import numpy as np
+from constants import get_formatos_chapa
+
+# Estratégias de orientação testadas em cada prateleira
+_ORIENTACOES = ("deitada", "em_pe", "livre")
+
+
+def _orientar(largura, altura, orientacao):
+    """Retorna (largura, altura) da peça na orientação pedida"""
+    if orientacao == "deitada":
+        return (largura, altura) if largura >= altura else (altura, largura)
+    if orientacao == "em_pe":
+        return (largura, altura) if altura >= largura else (altura, largura)
+    return (largura, altura)
+
+
+def _empacotar_prateleiras(tipos, largura_chapa, altura_chapa, orientacao):
+    """
+    Empacota grupos de peças iguais em prateleiras (First Fit Decreasing Height).
+
+    tipos: lista de (indice_peca, largura, altura, quantidade), já com margem
+    Retorna a lista de fileiras (indice_peca, x, y, largura, altura, rotacionada,
+    quantidade) ou None se as peças não couberem na chapa.
+    """
+    grupos = []
+    for indice, largura, altura, quantidade in tipos:
+        largura_o, altura_o = _orientar(largura, altura, orientacao)
+        grupos.append([indice, largura_o, altura_o, quantidade, (largura_o, altura_o) != (largura, altura)])
+
+    # Peças mais altas primeiro
+    grupos.sort(key=lambda grupo: (grupo[2], grupo[1]), reverse=True)
+
+    prateleiras = []  # [y, altura, x_ocupado] das prateleiras ainda com espaço
+    topo = 0
+    menor_lado = min(min(grupo[1], grupo[2]) for grupo in grupos) if grupos else 0
+    fileiras = []
+
+    for indice, largura, altura, restantes, rotacionada in grupos:
+        while restantes > 0:
+            colocou = False
+            for prateleira in prateleiras:
+                y, altura_prateleira, ocupado = prateleira
+
+                # Orientações possíveis nesta prateleira (a atual e, se livre, a girada)
+                candidatas = [(largura, altura, rotacionada)]
+                if orientacao == "livre" and largura != altura:
+                    candidatas.append((altura, largura, not rotacionada))
+
+                melhor = None
+                for largura_c, altura_c, rotacionada_c in candidatas:
+                    if altura_c > altura_prateleira:
+                        continue
+                    cabem = int((largura_chapa - ocupado) // largura_c)
+                    if cabem > 0 and (melhor is None or cabem > melhor[0]):
+                        melhor = (cabem, largura_c, altura_c, rotacionada_c)
+                if melhor is None:
+                    continue
+
+                cabem, largura_c, altura_c, rotacionada_c = melhor
+                colocar = min(cabem, restantes)
+                fileiras.append((indice, ocupado, y, largura_c, altura_c, rotacionada_c, colocar))
+                prateleira[2] = ocupado + colocar * largura_c
+                restantes -= colocar
+                colocou = True
+                # Prateleira sem espaço nem para a menor peça deixa de ser testada
+                if largura_chapa - prateleira[2] < menor_lado:
+                    prateleiras.remove(prateleira)
+                break
+
+            if colocou:
+                continue
+
+            # Abrir nova prateleira
+            if largura > largura_chapa or topo + altura > altura_chapa:
+                return None
+            prateleiras.append([topo, altura, 0])
+            topo += altura
+
+    return fileiras
+
+
+def _encaixar_quantidade(pecas, caixas, largura_chapa, altura_chapa, margem):
+    """Tenta encaixar `caixas` conjuntos completos de peças; retorna as fileiras ou None"""
+    tipos = [(indice, largura + margem, altura + margem, caixas) for indice, (largura, altura) in enumerate(pecas)]
+
+    for girar_chapa in (False, True):
+        for orientacao in _ORIENTACOES:
+            if girar_chapa:
+                tipos_girados = [(indice, altura, largura, quantidade) for indice, largura, altura, quantidade in tipos]
+                fileiras = _empacotar_prateleiras(tipos_girados, altura_chapa, largura_chapa, orientacao)
+                if fileiras is not None:
+                    # Voltar ao sistema de coordenadas original da chapa (fileiras viram colunas)
+                    return [(indice, y, x, altura, largura, not rotacionada, quantidade, True)
+                            for indice, x, y, largura, altura, rotacionada, quantidade in fileiras]
+            else:
+                fileiras = _empacotar_prateleiras(tipos, largura_chapa, altura_chapa, orientacao)
+                if fileiras is not None:
+                    return [fileira + (False,) for fileira in fileiras]
+    return None
+
+
+@lru_cache(maxsize=2048)
+def _encaixe_memorizado(pecas, largura_chapa, altura_chapa, margem):
+    """Maior número de caixas completas por chapa e o respectivo layout (memorizado)"""
+    area_chapa = largura_chapa * altura_chapa
+    area_caixa = sum((largura + margem) * (altura + margem) for largura, altura in pecas)
+    if area_caixa <= 0:
+        return 0, ()
+
+    # Limite superior pela área; busca binária pelo maior número que encaixa
+    minimo, maximo = 0, int(area_chapa // area_caixa)
+    melhor_layout = ()
+    while minimo < maximo:
+        meio = (minimo + maximo + 1) // 2
+        fileiras = _encaixar_quantidade(pecas, meio, largura_chapa, altura_chapa, margem)
+        if fileiras is not None:
+            minimo, melhor_layout = meio, fileiras
+        else:
+            maximo = meio - 1
+
+    return minimo, tuple(melhor_layout)
+
+
+def calcular_encaixe_chapa(pecas, largura_chapa, altura_chapa, margem=0):
+    """
+    Calcula o encaixe de caixas em uma chapa.
+
+    pecas: sequência de (largura, altura) em mm das peças de UMA caixa
+           (ex.: base e tampa planificadas)
+    margem: espaço em mm reservado ao redor de cada peça (corte)
+
+    Retorna um dicionário com 'caixas_por_chapa', o 'layout' (lista de peças
+    posicionadas, já sem margem) e o 'aproveitamento' da chapa (0 a 1).
+    Resultados são memorizados por combinação de dimensões.
+    """
+    pecas = tuple((float(largura), float(altura)) for largura, altura in pecas)
+    caixas, fileiras = _encaixe_memorizado(pecas, float(largura_chapa), float(altura_chapa), float(margem))
+
+    layout = []
+    for indice, x, y, largura, altura, rotacionada, quantidade, vertical in fileiras:
+        for i in range(quantidade):
+            layout.append({
+                'peca': indice,
+                'x': x if vertical else x + i * largura,
+                'y': y + i * altura if vertical else y,
+                'largura': largura - margem,
+                'altura': altura - margem,
+                'rotacionada': rotacionada
+            })
+
+    area_pecas = sum(largura * altura for largura, altura in pecas) * caixas
+
+    return {
+        'caixas_por_chapa': caixas,
+        'layout': layout,
+        'aproveitamento': area_pecas / (largura_chapa * altura_chapa) if largura_chapa * altura_chapa > 0 else 0
+    }
+
+
+def calcular_encaixe_kit(caixas, largura_chapa, altura_chapa, margem=0):
+    """
+    Calcula o encaixe conjunto das peças de um kit (várias caixas) em uma chapa.
+
+    caixas: sequência de (pecas, unidades) com as peças de UMA caixa, como em
+            calcular_encaixe_chapa, e quantas unidades dela vão em cada kit
+
+    As peças de todas as caixas disputam as mesmas chapas, de modo que a sobra
+    deixada por uma caixa é ocupada pelas peças das outras. Retorna um
+    dicionário com 'kits_por_chapa', o 'layout' (cada peça com o índice da
+    'caixa' no kit e o da 'peca' na caixa) e o 'aproveitamento' da chapa.
+    """
+    origens = []
+    pecas_kit = []
+    for caixa, (pecas, unidades) in enumerate(caixas):
+        for _ in range(int(unidades)):
+            for peca, dimensoes in enumerate(pecas):
+                origens.append((caixa, peca))
+                pecas_kit.append(dimensoes)
+
+    encaixe = calcular_encaixe_chapa(pecas_kit, largura_chapa, altura_chapa, margem)
+    for posicao in encaixe['layout']:
+        posicao['caixa'], posicao['peca'] = origens[posicao['peca']]
+
+    return {
+        'kits_por_chapa': encaixe['caixas_por_chapa'],
+        'layout': encaixe['layout'],
+        'aproveitamento': encaixe['aproveitamento']
+    }
+
+
+_SENO_60 = math.sqrt(3) / 2
+
+
+def _linhas_circulos(passo, largura_chapa, altura_disponivel, hexagonal):
+    """
+    Número de círculos em cada linha de uma malha de passo `passo` (diâmetro
+    mais margem) numa faixa da chapa: quadrada ou hexagonal (linhas ímpares
+    deslocadas de meio passo, a sqrt(3)/2 passos da anterior)
+    """
+    if passo > largura_chapa or passo > altura_disponivel:
+        return []
+    distancia = passo * _SENO_60 if hexagonal else passo
+    linhas = int((altura_disponivel - passo) // distancia) + 1
+    pares = int(largura_chapa // passo)
+    impares = int((largura_chapa - passo / 2) // passo) if hexagonal else pares
+    return [impares if linha % 2 else pares for linha in range(linhas)]
+
+
+def _centros_circulos(passo, linhas, hexagonal, inicio=0.0):
+    """Centros (x, y) das linhas de uma malha (ver _linhas_circulos), a partir de y = inicio"""
+    distancia = passo * _SENO_60 if hexagonal else passo
+    centros = []
+    for linha, colunas in enumerate(linhas):
+        deslocamento = passo / 2 if hexagonal and linha % 2 else 0
+        y = inicio + passo / 2 + linha * distancia
+        centros.extend((deslocamento + passo / 2 + coluna * passo, y) for coluna in range(colunas))
+    return centros
+
+
+@lru_cache(maxsize=2048)
+def _encaixe_circulos_memorizado(grupos, largura_chapa, altura_chapa):
+    """
+    Maior número de caixas por chapa com peças circulares (memorizado).
+
+    grupos: tupla de (passo, pecas_por_caixa) por diâmetro, do maior para o menor
+    Retorna (caixas, centros de cada grupo, chapa_girada).
+    """
+    total_por_caixa = sum(pecas for _, pecas in grupos)
+    melhor = (0, None)
+    for girada in (False, True):
+        largura, altura = (altura_chapa, largura_chapa) if girada else (largura_chapa, altura_chapa)
+        for hexagonal in (True, False):
+            # Malha única com o passo do maior diâmetro: qualquer peça ocupa qualquer posição
+            linhas = _linhas_circulos(grupos[0][0], largura, altura, hexagonal)
+            caixas = sum(linhas) // total_por_caixa
+            if caixas > melhor[0]:
+                melhor = (caixas, (girada, hexagonal, None))
+
+            # Dois diâmetros: um bloco de linhas para cada um, a meia soma dos passos entre os blocos
+            if len(grupos) == 2:
+                (primeiro, pecas_primeiro), (segundo, pecas_segundo) = grupos
+                distancia = primeiro * _SENO_60 if hexagonal else primeiro
+                acumulado = 0
+                for quantidade_linhas in range(len(linhas) + 1):
+                    if quantidade_linhas:
+                        acumulado += linhas[quantidade_linhas - 1]
+                        # Centro da última linha mais a meia soma dos passos, menos o meio passo do segundo
+                        inicio = (quantidade_linhas - 1) * distancia + primeiro
+                    else:
+                        inicio = 0.0
+                    restantes = _linhas_circulos(segundo, largura, altura - inicio, hexagonal)
+                    caixas = min(acumulado // pecas_primeiro, sum(restantes) // pecas_segundo)
+                    if caixas > melhor[0]:
+                        melhor = (caixas, (girada, hexagonal, quantidade_linhas))
+
+    caixas, escolha = melhor
+    if caixas == 0:
+        return 0, tuple(() for _ in grupos), False
+
+    # Centros só da melhor alternativa
+    girada, hexagonal, quantidade_linhas = escolha
+    largura, altura = (altura_chapa, largura_chapa) if girada else (largura_chapa, altura_chapa)
+    linhas = _linhas_circulos(grupos[0][0], largura, altura, hexagonal)
+    if quantidade_linhas is None:
+        centros = _centros_circulos(grupos[0][0], linhas, hexagonal)
+        divisao, inicio = [], 0
+        for _, pecas in grupos:
+            divisao.append(tuple(centros[inicio:inicio + caixas * pecas]))
+            inicio += caixas * pecas
+        return caixas, tuple(divisao), girada
+
+    (primeiro, pecas_primeiro), (segundo, pecas_segundo) = grupos
+    centros_primeiro = _centros_circulos(primeiro, linhas[:quantidade_linhas], hexagonal)
+    distancia = primeiro * _SENO_60 if hexagonal else primeiro
+    inicio = (quantidade_linhas - 1) * distancia + primeiro if quantidade_linhas else 0.0
+    centros_segundo = _centros_circulos(
+        segundo, _linhas_circulos(segundo, largura, altura - inicio, hexagonal), hexagonal, inicio
+    )
+    return caixas, (tuple(centros_primeiro[:caixas * pecas_primeiro]),
+                    tuple(centros_segundo[:caixas * pecas_segundo])), girada
+
+
+def calcular_encaixe_circulos(diametros, largura_chapa, altura_chapa, margem=0):
+    """
+    Calcula o encaixe de caixas com peças circulares (ex.: base e tampa
+    redondas) em uma chapa, em malhas hexagonais e quadradas, com uma malha
+    única ou um bloco de linhas para cada diâmetro.
+
+    diametros: diâmetros em mm das peças de UMA caixa
+    margem: espaço em mm reservado entre as peças (corte)
+
+    Retorna o mesmo dicionário de calcular_encaixe_chapa, com o layout pelo
+    quadrado que contém cada círculo e o aproveitamento pela área dos
+    círculos. Os resultados são memorizados por faixa de diâmetro (mm
+    inteiros, arredondados para cima).
+    """
+    diametros = [float(diametro) for diametro in diametros]
+    if not diametros or min(diametros) <= 0:
+        return {'caixas_por_chapa': 0, 'layout': [], 'aproveitamento': 0}
+
+    # Peças agrupadas por faixa de diâmetro (com margem), do maior para o menor
+    faixas = {}
+    for indice, diametro in enumerate(diametros):
+        faixas.setdefault(float(math.ceil(diametro + margem)), []).append(indice)
+    passos = sorted(faixas, reverse=True)
+    grupos = tuple((passo, len(faixas[passo])) for passo in passos)
+
+    caixas, centros, girada = _encaixe_circulos_memorizado(grupos, float(largura_chapa), float(altura_chapa))
+
+    layout = []
+    for passo, centros_grupo in zip(passos, centros):
+        indices = faixas[passo]
+        for posicao, (x, y) in enumerate(centros_grupo):
+            indice = indices[posicao % len(indices)]
+            if girada:
+                x, y = y, x
+            raio = diametros[indice] / 2
+            layout.append({
+                'peca': indice,
+                'x': x - raio,
+                'y': y - raio,
+                'largura': diametros[indice],
+                'altura': diametros[indice],
+                'rotacionada': False
+            })
+
+    area_caixa = sum(math.pi * (diametro / 2) ** 2 for diametro in diametros)
+    area_chapa = largura_chapa * altura_chapa
+    return {
+        'caixas_por_chapa': caixas,
+        'layout': layout,
+        'aproveitamento': area_caixa * caixas / area_chapa if area_chapa > 0 else 0
+    }
+
+
+def _normalizar_formatos(formatos):
+    """Catálogo como tupla hashável de (nome, largura_mm, altura_mm, custo_m2)"""
+    return tuple(sorted(
+        (str(formato['nome']), float(formato['largura_mm']), float(formato['altura_mm']), float(formato['custo_m2']))
+        for formato in formatos
+    ))
+
+
+def _caixas_por_formato(pecas, diametros, largura_chapa, altura_chapa, margem):
+    """Caixas por chapa: encaixe retangular ou, com peças circulares, o de círculos se couber mais"""
+    caixas, _ = _encaixe_memorizado(pecas, largura_chapa, altura_chapa, margem)
+    if diametros:
+        caixas = max(caixas, calcular_encaixe_circulos(diametros, largura_chapa, altura_chapa, margem)['caixas_por_chapa'])
+    return caixas
+
+
+def _faixa_quantidade(quantidade):
+    """
+    Faixa de quantidade (mínimo, máximo) usada na memorização: múltiplos de
+    uma potência de 2 com largura entre 1/16 e 1/8 da quantidade
+    """
+    passo = 1 << max(quantidade.bit_length() - 4, 0)
+    maximo = -(-quantidade // passo) * passo
+    return maximo - passo + 1, maximo
+
+
+@lru_cache(maxsize=1024)
+def _formatos_candidatos(pecas, catalogo, margem, faixa, diametros=()):
+    """
+    Formatos que podem ser os de menor custo total para alguma quantidade da
+    faixa (mínimo, máximo), com as caixas por chapa de cada um (memorizado).
+    Retorna arrays (indices, caixas_por_chapa, custo_chapa), vazios se nenhum formato comporta a caixa.
+    """
+    minimo, maximo = faixa
+    larguras = np.array([formato[1] for formato in catalogo])
+    alturas = np.array([formato[2] for formato in catalogo])
+    custos_chapa = larguras * alturas / 1000000 * np.array([formato[3] for formato in catalogo])
+
+    # Limite superior de caixas por chapa de todos os formatos: área e peças que cabem (com rotação)
+    area_caixa = sum((largura + margem) * (altura + margem) for largura, altura in pecas)
+    cabe = np.ones(len(catalogo), dtype=bool)
+    for largura, altura in pecas:
+        largura, altura = largura + margem, altura + margem
+        cabe &= ((largura <= larguras) & (altura <= alturas)) | ((altura <= larguras) & (largura <= alturas))
+    limite = np.where(cabe, np.floor(larguras * alturas / area_caixa), 0) if area_caixa > 0 else np.zeros(len(catalogo))
+    if diametros:
+        # Círculos (com margem) não se sobrepõem: limite pela área dos círculos
+        area_circulos = sum(math.pi * ((diametro + margem) / 2) ** 2 for diametro in diametros)
+        cabe_circulos = max(diametros) + margem <= np.minimum(larguras, alturas)
+        limite = np.maximum(limite, np.where(cabe_circulos, np.floor(larguras * alturas / area_circulos), 0))
+
+    # Custo mínimo possível de cada formato na menor quantidade da faixa; o
+    # encaixe real só roda enquanto o formato puder ficar abaixo do custo do
+    # melhor já encaixado na maior quantidade (os custos crescem com a quantidade)
+    with np.errstate(divide='ignore'):
+        custo_minimo = np.where(limite > 0, np.ceil(minimo / limite) * custos_chapa, np.inf)
+
+    indices, caixas_por_chapa = [], []
+    melhor_custo = math.inf
+    for indice in np.argsort(custo_minimo, kind='stable'):
+        if custo_minimo[indice] >= melhor_custo:
+            break
+        caixas = _caixas_por_formato(pecas, diametros, larguras[indice], alturas[indice], margem)
+        if caixas <= 0:
+            continue
+        indices.append(int(indice))
+        caixas_por_chapa.append(caixas)
+        melhor_custo = min(melhor_custo, -(-maximo // caixas) * custos_chapa[indice])
+    return np.array(indices, dtype=np.int64), np.array(caixas_por_chapa, dtype=np.int64), custos_chapa[indices]
+
+
+def _formato_minimo(pecas, catalogo, margem, quantidade, diametros=()):
+    """
+    Formato de menor custo total para `quantidade` caixas: os candidatos vêm
+    da faixa de quantidade memorizada e as chapas são contadas para a
+    quantidade exata. Retorna (indice_formato, caixas_por_chapa, chapas) ou
+    None se nenhum formato comporta a caixa.
+    """
+    indices, caixas_por_chapa, custos_chapa = _formatos_candidatos(
+        pecas, catalogo, margem, _faixa_quantidade(quantidade), diametros
+    )
+    if len(indices) == 0:
+        return None
+    chapas = -(-quantidade // caixas_por_chapa)
+    melhor = int(np.argmin(chapas * custos_chapa))
+    return int(indices[melhor]), int(caixas_por_chapa[melhor]), int(chapas[melhor])
+
+
+def selecionar_formato_chapa(pecas, quantidade, formatos=None, margem=0, diametros=None):
+    """
+    Escolhe o formato de chapa de menor custo total para `quantidade` caixas,
+    contando as chapas inteiras compradas (a sobra entra no custo).
+
+    pecas: sequência de (largura, altura) em mm das peças de UMA caixa
+    diametros: diâmetros em mm das peças circulares, se houver (pecas traz
+               os quadrados que as contêm); em cada formato vale o encaixe
+               de círculos quando couber mais caixas, e o aproveitamento é
+               medido pela área dos círculos
+    formatos: catálogo (lista de dicts com nome, largura_mm, altura_mm e
+              custo_m2); padrão: catálogo do Supabase
+
+    Retorna um dicionário com o formato escolhido, 'caixas_por_chapa',
+    'chapas', custos, 'aproveitamento', 'desperdicio_m2' e o 'layout' de uma
+    chapa. Memorizado por dimensões das peças, catálogo e faixa de quantidade.
+    """
+    quantidade = int(quantidade)
+    if quantidade <= 0:
+        raise ValueError("Quantidade deve ser maior que zero")
+    if formatos is None:
+        formatos = get_formatos_chapa()
+    catalogo = _normalizar_formatos(formatos)
+    if not catalogo:
+        raise ValueError("Nenhum formato de chapa cadastrado")
+
+    pecas = tuple((float(largura), float(altura)) for largura, altura in pecas)
+    diametros = tuple(float(diametro) for diametro in diametros or ())
+    escolha = _formato_minimo(pecas, catalogo, float(margem), quantidade, diametros)
+    if escolha is None:
+        raise ValueError("Nenhum formato de chapa comporta as peças da caixa")
+
+    indice, caixas_por_chapa, chapas = escolha
+    nome, largura_chapa, altura_chapa, custo_m2 = catalogo[indice]
+    area_chapa_m2 = largura_chapa * altura_chapa / 1000000
+    if diametros:
+        # Peças circulares: o papelão usado é o dos discos, não o dos quadrados que os contêm
+        area_pecas_m2 = sum(math.pi * (diametro / 2) ** 2 for diametro in diametros) / 1000000 * quantidade
+    else:
+        area_pecas_m2 = sum(largura * altura for largura, altura in pecas) / 1000000 * quantidade
+    custo_chapa = area_chapa_m2 * custo_m2
+
+    encaixe = calcular_encaixe_chapa(pecas, largura_chapa, altura_chapa, margem)
+    if encaixe['caixas_por_chapa'] < caixas_por_chapa:
+        encaixe = calcular_encaixe_circulos(diametros, largura_chapa, altura_chapa, margem)
+
+    return {
+        'nome': nome,
+        'largura_mm': largura_chapa,
+        'altura_mm': altura_chapa,
+        'caixas_por_chapa': caixas_por_chapa,
+        'chapas': chapas,
+        'custo_chapa': custo_chapa,
+        'custo_total': custo_chapa * chapas,
+        'custo_por_caixa': custo_chapa * chapas / quantidade,
+        'aproveitamento': area_pecas_m2 / (area_chapa_m2 * chapas),
+        'desperdicio_m2': area_chapa_m2 * chapas - area_pecas_m2,
+        'layout': encaixe['layout']
+    }
@@ -10,6 +10,7 @@ from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from cpq_calculator import formatar_centavos, BoxSpec, QuoteResult
 
 class TouchePDFGenerator:
     def __init__(self):
@@ -234,7 +235,7 @@ class TouchePDFGenerator:
         ]))
         return t
 
-    def _create_box_specifications_table(self, request_data):
+    def _create_box_specifications_table(self, request_data, especificacao):
         """Cria a tabela de especificações da caixa"""
         font_name = self._get_available_font() # Get font for tables
         
@@ -247,12 +248,12 @@ class TouchePDFGenerator:
         detalhes_berco = request_data.get('detalhes_berco', '')
         
         dados_caixa = [
-            ["Dimensões (cm)", f"{request_data['largura_cm']} x {request_data['altura_cm']} x {request_data['profundidade_cm']} cm"],
-            ["Modelo", request_data['modelo']],
-            ["Material", request_data['material']],
-            ["Quantidade", str(request_data['quantidade'])],
-            ["Berço", "Sim" if request_data['berco'] else "Não"],
-            ["Nicho", "Sim" if request_data['nicho'] else "Não"],
+            ["Dimensões (cm)", "{:g} x {:g} x {:g} cm".format(*especificacao.dimensoes_cm)],
+            ["Modelo", especificacao.modelo],
+            ["Material", especificacao.material],
+            ["Quantidade", f"{especificacao.quantidade:g}"],
+            ["Berço", "Sim" if especificacao.berco else "Não"],
+            ["Nicho", "Sim" if especificacao.nicho else "Não"],
             ["Revestimento Interno", revestimento_interno], 
             ["Revestimento Externo", revestimento_externo],
             ["Tipo de impressão", tipo_impressao],
@@ -279,13 +280,19 @@ class TouchePDFGenerator:
         font_name = self._get_available_font()
         
         # Dados dinâmicos do resultado ou valores padrão
-        valor_unitario = resultado.get('custo_unitario', 0)
         prazo = request_data.get('prazo', '')
         pagamento = request_data.get('pagamento', '')
         manuseio = request_data.get('manuseio', '')
         prazo_brindes = request_data.get('prazo_brindes', '')
         frete = request_data.get('frete', 0)
-        investimento_total = resultado.get('custo_total_projeto', 0)
+        
+        # Valores em centavos inteiros (os mesmos gravados no orçamento), se disponíveis
+        if resultado.preco_unitario_centavos is not None:
+            valor_unitario_texto = formatar_centavos(resultado.preco_unitario_centavos)
+            investimento_total_texto = formatar_centavos(resultado.preco_total_centavos)
+        else:
+            valor_unitario_texto = f"R${resultado.preco_unitario:.2f}"
+            investimento_total_texto = f"R${resultado.preco_total:.2f}"
         
         # Novos campos
         prazo_entrega = request_data.get('prazo_entrega', '')
@@ -296,13 +303,13 @@ class TouchePDFGenerator:
         pagamento_final = forma_pagamento if forma_pagamento else pagamento
         
         dados_cronograma = [
-            ["Valor unitário por caixa", f"R${valor_unitario:.2f}"],
+            ["Valor unitário por caixa", valor_unitario_texto],
             ["Prazo", prazo_final],
             ["Pagamento", pagamento_final],
             ["Manuseio/Montagem", manuseio],
             ["Prazo de brindes", prazo_brindes],
             ["Frete", f"R${frete:.2f}"],
-            ["Investimento Total", f"R${investimento_total:.2f}"]
+            ["Investimento Total", investimento_total_texto]
         ]
 
         t = Table(dados_cronograma, colWidths=[2*inch, 1*inch])
@@ -346,17 +353,27 @@ class TouchePDFGenerator:
         
         return two_column_table
     
-    def generate_pdf(self, request_data, resultado):
+    def generate_pdf(self, request_data, resultado, especificacao=None):
         """
         Gera um PDF com os detalhes do cálculo usando template da TOUCHÉ
         
         Args:
-            request_data (dict): Dados da requisição
-            resultado (dict): Resultados do cálculo
+            request_data (dict): Dados da requisição (cliente, observações, prazos etc.)
+            resultado (QuoteResult ou dict): Resultados do cálculo
+            especificacao (BoxSpec, opcional): Especificação da caixa; se omitida,
+                é montada a partir dos campos da caixa em request_data
             
         Returns:
             bytes: Conteúdo do PDF em bytes
         """
+        if especificacao is None:
+            campos = set(BoxSpec._fields) | {'largura_cm', 'altura_cm', 'profundidade_cm'}
+            especificacao = BoxSpec.de_dicionario(
+                {nome: valor for nome, valor in request_data.items() if nome in campos}
+            )
+        if isinstance(resultado, dict):
+            resultado = QuoteResult.de_dicionario(resultado)
+        
         # Criar buffer em memória
         buffer = BytesIO()
         
@@ -374,7 +391,7 @@ class TouchePDFGenerator:
         content_story.append(Spacer(1, 10))
 
         # Dados da caixa
-        content_story.append(self._create_box_specifications_table(request_data))
+        content_story.append(self._create_box_specifications_table(request_data, especificacao))
         content_story.append(Spacer(1, 20))  # Mais espaço antes do texto da empresa
         
         # Adicionar observações personalizadas se fornecidas
@@ -421,16 +438,17 @@ class TouchePDFGenerator:
 
 
 # Função de conveniência para uso direto
-def gerar_pdf_calculo(request_data, resultado):
+def gerar_pdf_calculo(request_data, resultado, especificacao=None):
     """
     Função de conveniência para gerar PDF
     
     Args:
         request_data (dict): Dados da requisição
-        resultado (dict): Resultados do cálculo
+        resultado (QuoteResult ou dict): Resultados do cálculo
+        especificacao (BoxSpec, opcional): Especificação da caixa
         
     Returns:
         bytes: Conteúdo do PDF em bytes
     """
     generator = TouchePDFGenerator()
-    return generator.generate_pdf(request_data, resultado) 
\ No newline at end of file
+    return generator.generate_pdf(request_data, resultado, especificacao) 
\ No newline at end of file
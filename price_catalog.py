@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Catálogo de preços de tamanhos padrão, pré-calculado.
+
+A grade (tamanhos padrão × modelos × materiais × faixas de quantidade, com
+as opções padrão de BoxSpec) é calculada em uma única chamada de
+calcular_custo_caixa_lote e gravada como tabela: Parquet local e,
+opcionalmente, a tabela catalogo_precos do Supabase. Cada linha guarda a
+versão das constantes (PricingContext.versao) com que foi calculada; o
+catálogo só é refeito quando essa impressão digital muda.
+
+O CPQ só carrega e consulta o catálogo, por um índice em memória
+(dicionário pela especificação normalizada), sem rodar o motor de cálculo;
+o catálogo é refeito por este script, rodado como job.
+
+Uso:
+    python price_catalog.py                      # refaz o catálogo se as constantes mudaram
+    python price_catalog.py --forcar --supabase  # refaz sempre e envia ao Supabase
+    python price_catalog.py --snapshot benchmark_constantes.json --tamanhos 20x15x10,30x20x10
+"""
+
+import argparse
+import json
+import os
+import threading
+from itertools import product
+import pandas as pd
+import constants
+from constants import get_pricing_context, registrar_limpeza_cache
+from supabase_client import get_supabase_manager
+from cpq_calculator import BoxSpec, QUANTIDADES_PADRAO, calcular_custo_caixa_lote
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_CATALOGO = os.path.join(DIRETORIO, "catalogo_precos.parquet")
+
+# Grade padrão: tamanhos (largura, altura, profundidade em cm) mais pedidos
+TAMANHOS_PADRAO_CM = (
+    (10, 10, 5), (15, 10, 5), (15, 15, 5), (20, 15, 5), (20, 15, 10), (20, 20, 10),
+    (25, 20, 10), (30, 20, 10), (30, 30, 10), (35, 25, 10), (40, 30, 10), (40, 30, 15),
+)
+MODELOS_CATALOGO = ("Tampa Solta", "Tampa Livro", "Tampa Luva", "Tampa Imã", "Tampa Redonda")
+MATERIAIS_CATALOGO = ("Papelão", "Acrílico")
+
+COLUNAS_CATALOGO = ('largura_mm', 'altura_mm', 'profundidade_mm', 'modelo', 'material', 'quantidade',
+                    'preco_unitario', 'preco_unitario_centavos', 'preco_total_centavos', 'versao_constantes')
+
+# Catálogo em uso pelo app: (caminho, data de modificação do arquivo, PriceCatalog ou None)
+_catalogo_atual = None
+_catalogo_lock = threading.Lock()
+
+
+def _chave(especificacao):
+    """Chave do índice: especificação normalizada, sem a quantidade, com as dimensões em décimos de mm"""
+    normalizada = especificacao.normalizada()
+    return normalizada._replace(
+        largura_mm=round(float(normalizada.largura_mm), 1),
+        altura_mm=round(float(normalizada.altura_mm), 1),
+        profundidade_mm=round(float(normalizada.profundidade_mm), 1),
+        quantidade=1
+    )
+
+
+class PriceCatalog:
+    """
+    Catálogo de preços com índice em memória.
+
+    buscar() devolve as faixas de quantidade de uma especificação que está
+    no catálogo (dimensões, modelo e material da grade e as demais opções
+    no padrão) em tempo constante, ou None.
+    """
+
+    __slots__ = ('tabela', 'versao', '_indice')
+
+    def __init__(self, tabela):
+        self.tabela = tabela
+        self.versao = tabela['versao_constantes'].iloc[0] if len(tabela) else None
+        self._indice = {}
+        linhas = zip(*(tabela[nome].tolist() for nome in COLUNAS_CATALOGO[:-1]))
+        for largura, altura, profundidade, modelo, material, quantidade, unitario, unitario_centavos, total_centavos in linhas:
+            chave = _chave(BoxSpec(largura, altura, profundidade, modelo, material))
+            self._indice.setdefault(chave, []).append({
+                'quantidade': int(quantidade),
+                'preco_unitario': unitario,
+                'preco_unitario_centavos': int(unitario_centavos),
+                'preco_total_centavos': int(total_centavos)
+            })
+        for faixas in self._indice.values():
+            faixas.sort(key=lambda faixa: faixa['quantidade'])
+
+    def atualizado(self, contexto=None):
+        """True se o catálogo foi calculado com as constantes do contexto (o atual, se omitido)"""
+        if contexto is None:
+            contexto = get_pricing_context()
+        return self.versao == contexto.versao
+
+    def buscar(self, especificacao):
+        """Faixas de quantidade (lista de dicionários) da especificação, ou None se não estiver no catálogo"""
+        return self._indice.get(_chave(especificacao))
+
+    def __len__(self):
+        return len(self.tabela)
+
+    def __repr__(self):
+        return f"PriceCatalog({len(self.tabela)} linhas, versão {self.versao})"
+
+
+def construir_catalogo(tamanhos_cm=TAMANHOS_PADRAO_CM, modelos=MODELOS_CATALOGO, materiais=MATERIAIS_CATALOGO,
+                       quantidades=QUANTIDADES_PADRAO, contexto=None):
+    """
+    Calcula a grade inteira em uma única chamada de calcular_custo_caixa_lote
+    (preços em centavos, como nos orçamentos). Retorna um DataFrame com
+    COLUNAS_CATALOGO, só com as combinações válidas.
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
+
+    especificacoes = [
+        BoxSpec(largura * 10, altura * 10, profundidade * 10, modelo, material, int(quantidade))
+        for (largura, altura, profundidade), modelo, material, quantidade
+        in product(tamanhos_cm, modelos, materiais, quantidades)
+    ]
+    if not especificacoes:
+        return pd.DataFrame(columns=COLUNAS_CATALOGO)
+
+    resultado = calcular_custo_caixa_lote(especificacoes, contexto, centavos=True)
+    tabela = pd.DataFrame(BoxSpec.colunas(especificacoes))
+    for chave in ('preco_unitario', 'preco_unitario_centavos', 'preco_total_centavos'):
+        tabela[chave] = resultado[chave]
+    tabela['versao_constantes'] = contexto.versao
+    return tabela[resultado['valido']].reset_index(drop=True)[list(COLUNAS_CATALOGO)]
+
+
+def carregar_catalogo(caminho=CAMINHO_CATALOGO):
+    """PriceCatalog gravado em Parquet, ou None se o arquivo não existir ou não puder ser lido"""
+    if not os.path.exists(caminho):
+        return None
+    try:
+        return PriceCatalog(pd.read_parquet(caminho))
+    except Exception as e:
+        print(f"⚠️ Catálogo de preços ilegível ({caminho}): {str(e)}")
+        return None
+
+
+def atualizar_catalogo(caminho=CAMINHO_CATALOGO, supabase=False, forcar=False, contexto=None, **grade):
+    """
+    Refaz o catálogo se a versão das constantes mudou (ou se forcar=True),
+    grava o Parquet e, com supabase=True, substitui a tabela catalogo_precos.
+    grade: tamanhos_cm, modelos, materiais e quantidades de construir_catalogo.
+    Retorna (PriceCatalog, refeito).
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
+
+    if not forcar:
+        catalogo = carregar_catalogo(caminho)
+        if catalogo is not None and catalogo.atualizado(contexto):
+            return catalogo, False
+
+    tabela = construir_catalogo(contexto=contexto, **grade)
+    try:
+        tabela.to_parquet(caminho, index=False)
+    except Exception as e:
+        print(f"⚠️ Não foi possível gravar o catálogo de preços em {caminho}: {str(e)}")
+
+    if supabase:
+        # Via JSON, para que os valores cheguem como tipos nativos do Python
+        linhas = json.loads(tabela.to_json(orient='records'))
+        get_supabase_manager().substituir_catalogo_precos(contexto.versao, linhas)
+    return PriceCatalog(tabela), True
+
+
+@registrar_limpeza_cache
+def limpar_catalogo():
+    """Descarta o catálogo em memória (chamada também por constants.clear_cache)"""
+    global _catalogo_atual
+    with _catalogo_lock:
+        _catalogo_atual = None
+
+
+def catalogo_precos(caminho=CAMINHO_CATALOGO):
+    """
+    Catálogo em uso pelo app, só para consulta: o Parquet é lido uma vez (e
+    de novo quando o arquivo muda) e nunca é refeito aqui; o catálogo é
+    refeito pelo job (python price_catalog.py). Retorna None se não houver
+    catálogo ou se ele foi calculado com outras constantes.
+    """
+    global _catalogo_atual
+    try:
+        modificacao = os.path.getmtime(caminho) if os.path.exists(caminho) else None
+        with _catalogo_lock:
+            if _catalogo_atual is None or _catalogo_atual[:2] != (caminho, modificacao):
+                catalogo = carregar_catalogo(caminho) if modificacao is not None else None
+                _catalogo_atual = (caminho, modificacao, catalogo)
+            catalogo = _catalogo_atual[2]
+        if catalogo is None or not catalogo.atualizado():
+            return None
+        return catalogo
+    except Exception as e:
+        print(f"Erro no catálogo de preços: {str(e)}")
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Catálogo de preços de tamanhos padrão")
+    parser.add_argument("--caminho", default=CAMINHO_CATALOGO, help="arquivo Parquet do catálogo")
+    parser.add_argument("--snapshot", help="JSON com as constantes (sem Supabase), como o do benchmark")
+    parser.add_argument("--tamanhos", help="tamanhos em cm separados por vírgula (ex.: 20x15x10,30x20x10)")
+    parser.add_argument("--supabase", action="store_true", help="envia o catálogo para a tabela catalogo_precos")
+    parser.add_argument("--forcar", action="store_true", help="refaz o catálogo mesmo sem mudança nas constantes")
+    args = parser.parse_args(argv)
+
+    if args.snapshot:
+        with open(args.snapshot, encoding="utf-8") as arquivo:
+            constants.carregar_snapshot(json.load(arquivo))
+
+    grade = {}
+    if args.tamanhos:
+        grade['tamanhos_cm'] = [
+            tuple(float(dimensao) for dimensao in tamanho.lower().split("x")) for tamanho in args.tamanhos.split(",")
+        ]
+
+    catalogo, refeito = atualizar_catalogo(args.caminho, supabase=args.supabase, forcar=args.forcar, **grade)
+    if refeito:
+        print(f"✅ Catálogo refeito: {len(catalogo)} preços (versão {catalogo.versao})")
+    else:
+        print(f"✅ Catálogo já atualizado: {len(catalogo)} preços (versão {catalogo.versao})")
+
+
+if __name__ == "__main__":
+    main()
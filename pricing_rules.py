@@ -0,0 +1,489 @@
+"""
+Regras de precificação configuráveis (tabela regras_precificacao no Supabase).
+
+Cada regra define um componente do orçamento (ex.: custo_papelao) por uma
+expressão em uma linguagem pequena, com a sintaxe de expressões Python:
+números, textos, variáveis, + - * / // % **, comparações simples,
+and/or/not, 'a if condicao else b' e as funções min, max, abs, ceil e floor.
+
+Variáveis disponíveis: parâmetros da caixa (largura_mm, modelo, material...),
+geometria (area_caixa_completa_mm2, area_colagem_pva_mm2, perimetro_mm),
+todas as constantes do Supabase, custos fixos (custo_fixo_unitario,
+caixas_por_mes, total_custos_fixos) e os componentes definidos por outras
+regras. Regras do Supabase substituem as regras padrão de mesmo componente;
+as demais continuam valendo.
+Regras do Supabase inválidas (sintaxe, funções não permitidas ou variáveis
+desconhecidas) são ignoradas com aviso, e o componente volta à regra
+padrão; se o conjunto inteiro for inválido (dependência circular), o último
+conjunto válido continua em uso.
+
+Cada versão do conjunto de regras é validada e compilada uma única vez em
+uma função Python (modo escalar) e em uma variante com np.where (modo em
+lote), e fica memorizada pelo hash do seu conteúdo (só as
+TAMANHO_MAXIMO_REGRAS versões usadas mais recentemente).
+"""
+
+import ast
+import functools
+import hashlib
+import math
+import threading
+import types
+from collections import OrderedDict
+import numpy as np
+
+# Fórmulas padrão (equivalentes às escritas à mão em cpq_calculator)
+REGRAS_PADRAO = (
+    ("area_papelao_m2", 'area_caixa_completa_mm2 / 1000000 if material == "Papelão" else 0'),
+    ("custo_papelao", 'area_papelao_m2 * custo_papelao_m2 if material == "Papelão" else 0'),
+    ("ml_cola_pva", 'area_colagem_pva_mm2 / 1000000 * 2 * consumo_cola_pva_ml_m2 if material == "Papelão" else 0'),
+    ("custo_cola_pva", 'ml_cola_pva * custo_cola_pva_ml if material == "Papelão" else 0'),
+    ("ml_cola_adesiva", 'perimetro_mm / 1000 * consumo_cola_adesiva_ml_m if material == "Papelão" else 0'),
+    ("custo_cola_adesiva", 'ml_cola_adesiva * custo_cola_adesiva_ml if material == "Papelão" else 0'),
+    ("area_acrilico_m2", '0 if material == "Papelão" else area_caixa_completa_mm2 / 1000000'),
+    ("custo_acrilico", '0 if material == "Papelão" else area_acrilico_m2 * custo_acrilico_m2'),
+    ("area_revestimento_m2", 'area_papelao_m2 if material == "Papelão" else 0'),
+    ("custo_revestimento",
+     'area_revestimento_m2 * custo_papel_m2 if material == "Papelão" and tipo_revestimento == "Papel" else '
+     '(area_revestimento_m2 * custo_vinil_uv_m2 if material == "Papelão" and tipo_revestimento == "Vinil UV" else 0)'),
+    ("custo_serigrafia", 'num_cores_serigrafia * num_impressoes_serigrafia * custo_serigrafia_cor if serigrafia else 0'),
+    ("custo_impressao",
+     '(custo_impressao_a4 if tipo_impressao == "A4" else custo_impressao_a3) if usar_impressao_digital else 0'),
+    ("custo_cola_quente", 'custo_cola_quente_fixo if usar_cola_quente else 0'),
+    ("custo_cola_isopor", 'custo_cola_isopor_fixo if usar_cola_isopor else 0'),
+    ("custo_fita", 'metros_fita * custo_fita_m'),
+    ("custo_rebites", 'num_rebites * custo_rebite_unidade'),
+    ("custo_ima_chapa", '(1 if largura_mm <= 10 else 2) * custo_ima_chapa_par if modelo == "Tampa Imã" else 0'),
+)
+
+# Variáveis de entrada das regras: parâmetros de calcular_custo_caixa_completo e geometria
+VARIAVEIS_ENTRADA = (
+    "largura_mm", "altura_mm", "profundidade_mm", "modelo", "material", "quantidade", "berco", "nicho",
+    "serigrafia", "num_cores_serigrafia", "num_impressoes_serigrafia", "usar_impressao_digital",
+    "tipo_impressao", "tipo_revestimento", "usar_cola_quente", "usar_cola_isopor", "metros_fita",
+    "num_rebites", "markup",
+    "area_caixa_completa_mm2", "area_colagem_pva_mm2", "perimetro_mm",
+)
+# Custos fixos disponíveis além das constantes
+VARIAVEIS_CUSTOS_FIXOS = ("custo_fixo_unitario", "total_custos_fixos")
+
+# Elementos de sintaxe aceitos nas expressões
+_NOS_PERMITIDOS = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call,
+    ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+_FUNCOES = ("min", "max", "abs", "ceil", "floor")
+# Número de argumentos de cada função: (mínimo, máximo ou None)
+_ARGUMENTOS = {"min": (2, None), "max": (2, None), "abs": (1, 1), "ceil": (1, 1), "floor": (1, 1)}
+
+
+def _reduzir(funcao):
+    """min/max do modo em lote: np.minimum/np.maximum aplicados a todos os argumentos"""
+    def reduzir(*argumentos):
+        return functools.reduce(funcao, argumentos)
+    return reduzir
+
+
+def _e_valor(a, b):
+    """'a and b' do modo em lote: b onde a é verdadeiro, senão a (como em Python)"""
+    return np.where(a, b, a)
+
+
+def _ou_valor(a, b):
+    """'a or b' do modo em lote: a onde a é verdadeiro, senão b (como em Python)"""
+    return np.where(a, a, b)
+
+
+# Funções disponíveis em cada modo de avaliação
+_GLOBAIS_ESCALARES = {
+    "__builtins__": {},
+    "min": min, "max": max, "abs": abs, "ceil": math.ceil, "floor": math.floor,
+}
+_GLOBAIS_VETORIAIS = {
+    "__builtins__": {},
+    "min": _reduzir(np.minimum), "max": _reduzir(np.maximum), "abs": np.abs, "ceil": np.ceil, "floor": np.floor,
+    "_se": np.where, "_e": np.logical_and, "_ou": np.logical_or, "_nao": np.logical_not,
+    "_e_valor": _e_valor, "_ou_valor": _ou_valor,
+}
+
+
+def _validar_expressao(componente, expressao):
+    """Analisa uma expressão e rejeita qualquer construção fora da linguagem"""
+    try:
+        arvore = ast.parse(expressao, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Regra '{componente}' inválida: {e.msg}")
+
+    for no in ast.walk(arvore):
+        if not isinstance(no, _NOS_PERMITIDOS):
+            raise ValueError(f"Regra '{componente}' inválida: '{type(no).__name__}' não permitido")
+        if isinstance(no, ast.Name) and no.id.startswith("_"):
+            raise ValueError(f"Regra '{componente}' inválida: variável '{no.id}' não permitida")
+        if isinstance(no, ast.Constant) and not isinstance(no.value, (int, float, str, bool)):
+            raise ValueError(f"Regra '{componente}' inválida: constante {no.value!r} não permitida")
+        if isinstance(no, ast.Compare) and len(no.ops) > 1:
+            raise ValueError(f"Regra '{componente}' inválida: comparações encadeadas não são permitidas")
+        if isinstance(no, ast.Call):
+            if not isinstance(no.func, ast.Name) or no.func.id not in _FUNCOES or no.keywords:
+                raise ValueError(f"Regra '{componente}' inválida: só são permitidas as funções {', '.join(_FUNCOES)}")
+            minimo, maximo = _ARGUMENTOS[no.func.id]
+            if len(no.args) < minimo or (maximo is not None and len(no.args) > maximo):
+                quantidade = f"{minimo}" if minimo == maximo else f"{minimo} ou mais"
+                raise ValueError(f"Regra '{componente}' inválida: {no.func.id} recebe {quantidade} argumento(s)")
+    return arvore.body
+
+
+def _booleano(no):
+    """Se a expressão sempre resulta em um booleano (comparações, not, True/False)"""
+    if isinstance(no, ast.BoolOp):
+        return all(_booleano(valor) for valor in no.values)
+    if isinstance(no, ast.Constant):
+        return isinstance(no.value, bool)
+    return isinstance(no, ast.Compare) or (isinstance(no, ast.UnaryOp) and isinstance(no.op, ast.Not))
+
+
+class _Vetorizar(ast.NodeTransformer):
+    """
+    Troca condicionais e operadores lógicos por np.where / np.logical_*.
+    and/or entre booleanos viram np.logical_and/or; com outros operandos
+    retornam um dos operandos, como em Python (np.where)
+    """
+
+    def _chamar(self, funcao, argumentos, origem):
+        return ast.copy_location(ast.Call(ast.Name(funcao, ast.Load()), argumentos, []), origem)
+
+    def visit_IfExp(self, no):
+        self.generic_visit(no)
+        return self._chamar("_se", [no.test, no.body, no.orelse], no)
+
+    def visit_BoolOp(self, no):
+        booleano = _booleano(no)
+        self.generic_visit(no)
+        funcao = "_e" if isinstance(no.op, ast.And) else "_ou"
+        if not booleano:
+            funcao += "_valor"
+        resultado = no.values[0]
+        for valor in no.values[1:]:
+            resultado = self._chamar(funcao, [resultado, valor], no)
+        return resultado
+
+    def visit_UnaryOp(self, no):
+        self.generic_visit(no)
+        if isinstance(no.op, ast.Not):
+            return self._chamar("_nao", [no.operand], no)
+        return no
+
+
+class _ReaproveitarComparacoes(ast.NodeTransformer):
+    """
+    Avalia cada comparação repetida uma única vez (ex.: material == "Papelão"
+    em várias regras): a primeira ocorrência guarda o resultado em uma
+    variável interna e as seguintes a reutilizam; comparações já calculadas
+    pelo chamador viram a variável recebida. As repetidas só são guardadas no
+    modo em lote, em que todas as partes da expressão são avaliadas, da
+    esquerda para a direita; no modo unitário só há as já calculadas.
+    """
+
+    def __init__(self, repetidas, calculadas):
+        self.repetidas = repetidas
+        self.nomes = {
+            ast.dump(ast.parse(expressao, mode="eval").body): nome for expressao, nome in calculadas
+        }
+
+    def visit_Compare(self, no):
+        self.generic_visit(no)
+        chave = ast.dump(no)
+        if chave in self.nomes:
+            return ast.copy_location(ast.Name(self.nomes[chave], ast.Load()), no)
+        if chave not in self.repetidas:
+            return no
+        self.nomes[chave] = f"_comparacao_{len(self.nomes)}"
+        return ast.copy_location(ast.NamedExpr(ast.Name(self.nomes[chave], ast.Store()), no), no)
+
+
+def _comparacoes_repetidas(expressoes):
+    """Comparações (ast.dump) que aparecem mais de uma vez no conjunto de expressões"""
+    contagem = {}
+    for expressao in expressoes:
+        for no in ast.walk(expressao):
+            if isinstance(no, ast.Compare):
+                chave = ast.dump(no)
+                contagem[chave] = contagem.get(chave, 0) + 1
+    return {chave for chave, total in contagem.items() if total > 1}
+
+
+def _comparacoes_das_entradas(expressoes, entradas):
+    """
+    Comparações repetidas feitas só entre entradas e literais (ex.: material
+    == "Papelão"), como (expressao, nome): sempre podem ser avaliadas, então
+    o modo unitário as calcula uma vez no início da função
+    """
+    expressoes = list(expressoes)
+    repetidas = _comparacoes_repetidas(expressoes)
+    comparacoes = {}
+    for expressao in expressoes:
+        for no in ast.walk(expressao):
+            if isinstance(no, ast.Compare) and ast.dump(no) in repetidas and all(
+                isinstance(parte, ast.Constant) or (isinstance(parte, ast.Name) and parte.id in entradas)
+                for parte in [no.left] + no.comparators
+            ):
+                comparacoes.setdefault(ast.unparse(no), f"_entrada_{len(comparacoes)}")
+    return list(comparacoes.items())
+
+
+def _ordenar_regras(regras):
+    """Ordena as regras pelas dependências entre componentes (ordem original nos empates)"""
+    nomes = {componente for componente, _ in regras}
+    dependencias = {
+        componente: {no.id for no in ast.walk(expressao) if isinstance(no, ast.Name)} & nomes
+        for componente, expressao in regras
+    }
+
+    ordenadas, resolvidos = [], set()
+    pendentes = list(regras)
+    while pendentes:
+        prontas = [regra for regra in pendentes if dependencias[regra[0]] <= resolvidos]
+        if not prontas:
+            ciclo = ", ".join(componente for componente, _ in pendentes)
+            raise ValueError(f"Dependência circular entre as regras: {ciclo}")
+        for regra in prontas:
+            ordenadas.append(regra)
+            resolvidos.add(regra[0])
+        pendentes = [regra for regra in pendentes if regra[0] not in resolvidos]
+    return ordenadas
+
+
+class AssinaturaRegras:
+    """
+    Forma de uma função compilada: nomes das entradas (argumentos), das saídas
+    (chaves do dicionário retornado), modo em lote e valores derivados
+    (nome, expressao) avaliados depois das regras; tupla retorna as saídas
+    em uma tupla, na ordem dada, em vez de um dicionário. Em lote, comparacoes lista
+    (expressao, nome) de comparações que o chamador já calculou e passa como
+    argumentos extras depois das entradas (nomes iniciados por '_').
+    construtor (ex.: um NamedTuple) recebe as saídas como argumentos e é
+    devolvido no lugar da tupla, sem montar uma tupla intermediária.
+    Comparada por identidade, para ser usada como chave barata de
+    memorização: crie uma vez por módulo.
+    """
+
+    __slots__ = ("entradas", "saidas", "vetorial", "derivados", "comparacoes", "tupla", "construtor")
+
+    def __init__(self, entradas, saidas, vetorial=False, derivados=(), comparacoes=(), tupla=False, construtor=None):
+        self.entradas = tuple(entradas)
+        self.saidas = tuple(saidas)
+        self.vetorial = vetorial
+        self.derivados = tuple(derivados)
+        self.comparacoes = tuple(comparacoes)
+        self.tupla = tupla
+        self.construtor = construtor
+
+
+class PricingRules:
+    """
+    Conjunto de regras compilado e imutável.
+
+    vincular() gera uma função Python f(*entradas) -> {saida: valor}, com as
+    demais variáveis (constantes) lidas de um dicionário fixo; o bytecode é
+    gerado uma vez por assinatura e a função roda com variáveis locais.
+    """
+
+    __slots__ = ("versao", "regras", "componentes", "_ordenadas", "_codigos")
+
+    def __init__(self, regras):
+        analisadas = [(componente, _validar_expressao(componente, expressao)) for componente, expressao in regras]
+        for componente, expressao in analisadas:
+            if any(isinstance(no, ast.Name) and no.id == componente for no in ast.walk(expressao)):
+                raise ValueError(f"Regra '{componente}' inválida: a regra não pode usar o próprio componente")
+
+        definir = super().__setattr__
+        definir("regras", tuple(regras))
+        definir("versao", _versao_regras(regras))
+        definir("_ordenadas", tuple(_ordenar_regras(analisadas)))
+        definir("componentes", tuple(componente for componente, _ in self._ordenadas))
+        definir("_codigos", {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PricingRules é imutável")
+
+    def _codigo(self, assinatura):
+        """Bytecode de 'def _regras(*entradas): ...; return {saida: valor}', tupla ou construtor (memorizado)"""
+        if assinatura not in self._codigos:
+            # Valores derivados (ex.: totais) são calculados depois de todas as regras
+            calculos = list(self._ordenadas) + [
+                (nome, _validar_expressao(nome, expressao)) for nome, expressao in assinatura.derivados
+            ]
+            if assinatura.vetorial:
+                calculos = [
+                    (componente, _Vetorizar().visit(ast.parse(ast.unparse(expressao), mode="eval").body))
+                    for componente, expressao in calculos
+                ]
+                reaproveitar = _ReaproveitarComparacoes(
+                    _comparacoes_repetidas(e for _, e in calculos), assinatura.comparacoes
+                )
+                calculos = [(componente, reaproveitar.visit(expressao)) for componente, expressao in calculos]
+            else:
+                iniciais = _comparacoes_das_entradas((e for _, e in calculos), assinatura.entradas)
+                reaproveitar = _ReaproveitarComparacoes(set(), iniciais)
+                calculos = [
+                    (nome, ast.parse(expressao, mode="eval").body) for expressao, nome in iniciais
+                ] + [
+                    (componente, reaproveitar.visit(ast.parse(ast.unparse(expressao), mode="eval").body))
+                    for componente, expressao in calculos
+                ]
+            
+            corpo = [ast.Assign([ast.Name(componente, ast.Store())], expressao) for componente, expressao in calculos]
+            valores = [ast.Name(nome, ast.Load()) for nome in assinatura.saidas]
+            if assinatura.construtor is not None:
+                corpo.append(ast.Return(ast.Call(ast.Name("_construtor", ast.Load()), valores, [])))
+            elif assinatura.tupla:
+                corpo.append(ast.Return(ast.Tuple(valores, ast.Load())))
+            else:
+                corpo.append(ast.Return(ast.Dict([ast.Constant(nome) for nome in assinatura.saidas], valores)))
+            
+            entradas = assinatura.entradas + tuple(nome for _, nome in assinatura.comparacoes if assinatura.vetorial)
+            argumentos = ast.arguments(
+                posonlyargs=[], args=[ast.arg(nome) for nome in entradas], vararg=None,
+                kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]
+            )
+            funcao = ast.FunctionDef("_regras", argumentos, corpo, [], None)
+            modulo = ast.fix_missing_locations(ast.Module([funcao], []))
+            
+            namespace = {}
+            exec(compile(modulo, "<regras_precificacao>", "exec"), {"__builtins__": {}}, namespace)
+            self._codigos[assinatura] = namespace["_regras"].__code__
+        return self._codigos[assinatura]
+
+    def variaveis(self, derivados=()):
+        """
+        Variáveis livres (parâmetros, geometria, constantes e custos fixos) de
+        que cada componente depende, direta ou indiretamente por outros
+        componentes; derivados: valores (nome, expressao) avaliados depois das
+        regras, como em AssinaturaRegras
+        """
+        calculos = list(self._ordenadas) + [
+            (nome, _validar_expressao(nome, expressao)) for nome, expressao in derivados
+        ]
+        resultado = {}
+        for componente, expressao in calculos:
+            nomes = _nomes(expressao)
+            livres = set()
+            for nome in nomes:
+                livres |= resultado.get(nome, {nome})
+            resultado[componente] = frozenset(livres)
+        return resultado
+
+    def vincular(self, assinatura, globais):
+        """
+        Função f(*assinatura.entradas) que avalia as regras e retorna os
+        valores de assinatura.saidas (dicionário ou tupla). globais: variáveis
+        fixas (constantes); o modo em lote usa np.where e operadores lógicos
+        do NumPy para avaliar arrays de uma só vez.
+        """
+        funcoes = _GLOBAIS_VETORIAIS if assinatura.vetorial else _GLOBAIS_ESCALARES
+        return types.FunctionType(self._codigo(assinatura), {**globais, **funcoes, "_construtor": assinatura.construtor})
+
+    def __repr__(self):
+        return f"PricingRules({len(self.regras)} regras, versão {self.versao})"
+
+
+def _nomes(expressao):
+    """Variáveis usadas em uma expressão analisada"""
+    return {no.id for no in ast.walk(expressao) if isinstance(no, ast.Name)} - set(_FUNCOES)
+
+
+def _regras_validas(regras, constantes):
+    """
+    Regras do Supabase que passam na validação, na ordem original; as
+    inválidas são ignoradas com aviso. Com constantes (nomes), também ignora
+    regras que usam variáveis que não são entradas, constantes, custos fixos
+    nem componentes
+    """
+    analisadas = {}
+    for componente, expressao in regras:
+        try:
+            arvore = _validar_expressao(componente, expressao)
+            if componente in _nomes(arvore):
+                raise ValueError(f"Regra '{componente}' inválida: a regra não pode usar o próprio componente")
+        except ValueError as e:
+            print(f"⚠️ {str(e)} (regra ignorada)")
+            continue
+        analisadas[componente] = (expressao, arvore)
+
+    if constantes is not None:
+        conhecidas = set(VARIAVEIS_ENTRADA) | set(VARIAVEIS_CUSTOS_FIXOS) | set(constantes)
+        conhecidas |= {componente for componente, _ in REGRAS_PADRAO}
+        # Ignorar uma regra pode deixar outras sem um componente: repete até não haver mais
+        while True:
+            desconhecidas = {
+                componente: sorted(_nomes(arvore) - conhecidas - set(analisadas))
+                for componente, (_, arvore) in analisadas.items()
+            }
+            desconhecidas = {componente: nomes for componente, nomes in desconhecidas.items() if nomes}
+            if not desconhecidas:
+                break
+            for componente, nomes in desconhecidas.items():
+                print(f"⚠️ Regra '{componente}' inválida: variável desconhecida {', '.join(nomes)} (regra ignorada)")
+                del analisadas[componente]
+
+    return [(componente, expressao) for componente, (expressao, _) in analisadas.items()]
+
+
+def _versao_regras(regras):
+    """Hash do conteúdo de um conjunto de regras"""
+    digest = hashlib.sha256()
+    for componente, expressao in regras:
+        digest.update(componente.encode() + b"=" + expressao.encode() + b";")
+    return digest.hexdigest()[:16]
+
+
+# Conjuntos já compilados, por hash do conteúdo (os mais recentes)
+TAMANHO_MAXIMO_REGRAS = 16
+_regras_compiladas = OrderedDict()
+_regras_lock = threading.Lock()
+# Último conjunto compilado com sucesso (mantido se um novo conjunto for inválido)
+_ultimas_regras = None
+
+
+def compilar_regras(regras, constantes=None):
+    """
+    Compila as regras do Supabase (lista de (componente, expressao)) sobre as
+    regras padrão. Retorna None se não houver regras (fórmulas escritas à mão).
+    constantes: nomes das constantes do Supabase, para rejeitar já na
+    compilação regras com variáveis desconhecidas. Regras inválidas são
+    ignoradas com aviso; se o conjunto for inválido, retorna o último
+    conjunto compilado (ou None).
+    """
+    global _ultimas_regras
+    if not regras:
+        return None
+
+    # Regras do Supabase substituem as padrão de mesmo componente
+    personalizadas = dict(_regras_validas(regras, constantes))
+    combinadas = [(componente, personalizadas.pop(componente, expressao)) for componente, expressao in REGRAS_PADRAO]
+    combinadas = list(personalizadas.items()) + combinadas
+
+    versao = _versao_regras(combinadas)
+    with _regras_lock:
+        if versao in _regras_compiladas:
+            _regras_compiladas.move_to_end(versao)
+            _ultimas_regras = _regras_compiladas[versao]
+            return _ultimas_regras
+
+    try:
+        compiladas = PricingRules(combinadas)
+    except ValueError as e:
+        anteriores = _ultimas_regras
+        print(f"⚠️ Regras de precificação ignoradas: {str(e)} "
+              f"({'mantido o conjunto anterior' if anteriores is not None else 'usando as fórmulas padrão'})")
+        return anteriores
+
+    with _regras_lock:
+        _regras_compiladas[versao] = compiladas
+        while len(_regras_compiladas) > TAMANHO_MAXIMO_REGRAS:
+            _regras_compiladas.popitem(last=False)
+        _ultimas_regras = compiladas
+    return compiladas
@@ -0,0 +1,313 @@
+"""
+Dependências dos orçamentos nas constantes e reprecificação incremental.
+
+Cada componente do orçamento (custo_papelao, area_papelao_m2, preco_unitario...)
+registra as chaves que leu: constantes da tabela constants, custos fixos
+('custos_fixos.<nome>') e o conjunto de regras de precificação
+('regras_precificacao'). No cálculo escrito à mão, as leituras são
+rastreadas executando o orçamento com um PricingContext cujos valores são
+floats que carregam as chaves de origem por todas as operações; com regras
+do Supabase, as dependências vêm das variáveis das expressões (inclusive as
+usadas só em condições, min e max).
+
+As dependências só variam com modelo, material e opções (não com as
+dimensões nem a quantidade) e são memorizadas por essas opções. Cada item
+gravado guarda o instantâneo dos valores que leu (instantaneo_constantes);
+reprecificar_orcamentos compara esse instantâneo com as constantes atuais,
+recalcula, em uma única chamada em lote, só os orçamentos com algum
+componente afetado e informa as diferenças dos componentes afetados.
+"""
+
+from collections import OrderedDict
+import math
+import threading
+import pandas as pd
+from constants import PricingContext, get_pricing_context, registrar_limpeza_cache
+from calculations import calcular_geometria
+from cpq_calculator import (
+    QuoteResult, CHAVES_RESULTADO_CPQ, _TOTAIS_REGRAS, _calcular_orcamento, calcular_custo_caixa_lote
+)
+
+# Prefixo das chaves da tabela de custos fixos e chave do conjunto de regras
+PREFIXO_CUSTOS_FIXOS = "custos_fixos."
+CHAVE_REGRAS = "regras_precificacao"
+
+# Campos comparados na reprecificação (os centavos acompanham preco_unitario e preco_total)
+_CAMPOS_CENTAVOS = {"preco_unitario": "preco_unitario_centavos", "preco_total": "preco_total_centavos"}
+
+TAMANHO_MAXIMO_DEPENDENCIAS = 256
+_dependencias_cache = OrderedDict()
+_dependencias_lock = threading.Lock()
+
+
+class _Rastreado(float):
+    """float que carrega as chaves (frozenset) das constantes de que depende"""
+
+    def __new__(cls, valor, dependencias):
+        rastreado = float.__new__(cls, valor)
+        rastreado.dependencias = dependencias
+        return rastreado
+
+    def __repr__(self):
+        return f"{float(self)!r}{sorted(self.dependencias)}"
+
+
+def _operacao_binaria(nome):
+    operacao = getattr(float, nome)
+
+    def aplicar(self, outro):
+        valor = operacao(self, outro)
+        if valor is NotImplemented:
+            return valor
+        return _Rastreado(valor, self.dependencias | getattr(outro, "dependencias", frozenset()))
+    return aplicar
+
+
+def _operacao_unaria(nome):
+    operacao = getattr(float, nome)
+
+    def aplicar(self):
+        return _Rastreado(operacao(self), self.dependencias)
+    return aplicar
+
+
+for _nome in ("__add__", "__radd__", "__sub__", "__rsub__", "__mul__", "__rmul__", "__truediv__",
+              "__rtruediv__", "__floordiv__", "__rfloordiv__", "__mod__", "__rmod__", "__pow__", "__rpow__"):
+    setattr(_Rastreado, _nome, _operacao_binaria(_nome))
+for _nome in ("__neg__", "__pos__", "__abs__"):
+    setattr(_Rastreado, _nome, _operacao_unaria(_nome))
+
+
+def _dependencias(valor):
+    """Chaves de que um valor calculado depende (vazio para valores que não vêm de constantes)"""
+    return getattr(valor, "dependencias", frozenset())
+
+
+def _contexto_rastreado(contexto):
+    """Cópia do contexto em que cada constante e custo fixo carrega a própria chave"""
+    constantes = {nome: _Rastreado(valor, frozenset({nome})) for nome, valor in contexto.constantes.items()}
+    custos_fixos = {
+        nome: _Rastreado(valor, frozenset({PREFIXO_CUSTOS_FIXOS + nome}))
+        for nome, valor in contexto.custos_fixos.items()
+    }
+    return PricingContext(constantes, custos_fixos, contexto.regras)
+
+
+def _opcoes(especificacao):
+    """Chave das dependências: a especificação sem dimensões e quantidade"""
+    return especificacao.normalizada()._replace(largura_mm=0.0, altura_mm=0.0, profundidade_mm=0.0, quantidade=1)
+
+
+def _rastrear(especificacao, contexto):
+    """Dependências de cada campo de CHAVES_RESULTADO_CPQ (lança exceção se a especificação for inválida)"""
+    rastreado = _contexto_rastreado(contexto)
+
+    if contexto.regras is None:
+        resultado = _calcular_orcamento(*especificacao, rastreado)
+        dependencias = {campo: _dependencias(valor) for campo, valor in zip(CHAVES_RESULTADO_CPQ, resultado)}
+    else:
+        # Regras: variáveis das expressões (inclusive condições), que a execução não registraria
+        geometria = calcular_geometria(
+            especificacao.largura_mm, especificacao.altura_mm, especificacao.profundidade_mm,
+            especificacao.modelo, rastreado
+        )
+        origens = {
+            "total_custos_fixos": _dependencias(rastreado.total_custos_fixos),
+            "custo_fixo_unitario": _dependencias(rastreado.custo_fixo_unitario),
+        }
+        origens.update({nome: _dependencias(valor) for nome, valor in geometria.items()})
+        variaveis = contexto.regras.variaveis(_TOTAIS_REGRAS)
+        dependencias = {}
+        for campo in CHAVES_RESULTADO_CPQ:
+            chaves = set()
+            for nome in variaveis.get(campo, {campo}):
+                if nome in origens:
+                    chaves |= origens[nome]
+                elif nome in contexto.constantes:
+                    chaves.add(nome)
+            dependencias[campo] = frozenset(chaves)
+
+    # Uma troca do conjunto de regras pode alterar qualquer componente
+    return {campo: chaves | {CHAVE_REGRAS} for campo, chaves in dependencias.items()}
+
+
+@registrar_limpeza_cache
+def limpar_dependencias():
+    """Descarta as dependências memorizadas (chamada também por constants.clear_cache)"""
+    with _dependencias_lock:
+        _dependencias_cache.clear()
+
+
+def dependencias_orcamento(especificacao, contexto=None):
+    """
+    Chaves lidas por cada campo do orçamento (BoxSpec): dicionário
+    {campo de CHAVES_RESULTADO_CPQ: frozenset de chaves}, com as constantes
+    pelo nome, os custos fixos como 'custos_fixos.<nome>' e CHAVE_REGRAS.
+    Retorna None se a especificação for inválida. Memorizado por opções e
+    versão das constantes.
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
+
+    chave = (_opcoes(especificacao), contexto.versao)
+    with _dependencias_lock:
+        if chave in _dependencias_cache:
+            _dependencias_cache.move_to_end(chave)
+            return _dependencias_cache[chave]
+
+    try:
+        dependencias = _rastrear(especificacao, contexto)
+    except Exception as e:
+        print(f"Erro no rastreamento das dependências: {str(e)}")
+        dependencias = None
+
+    with _dependencias_lock:
+        _dependencias_cache[chave] = dependencias
+        _dependencias_cache.move_to_end(chave)
+        while len(_dependencias_cache) > TAMANHO_MAXIMO_DEPENDENCIAS:
+            _dependencias_cache.popitem(last=False)
+    return dependencias
+
+
+def _valor_chave(contexto, chave):
+    """Valor de uma chave de dependência no contexto (None se não existir)"""
+    if chave == CHAVE_REGRAS:
+        return contexto.regras.versao if contexto.regras is not None else None
+    if chave.startswith(PREFIXO_CUSTOS_FIXOS):
+        return contexto.custos_fixos.get(chave[len(PREFIXO_CUSTOS_FIXOS):])
+    return contexto.constantes.get(chave)
+
+
+def instantaneo_constantes(especificacao, contexto=None):
+    """
+    Instantâneo das constantes lidas por um orçamento (BoxSpec), para gravar
+    com o item: {'versao': versão do contexto, 'valores': {chave: valor}},
+    com as chaves de dependencias_orcamento (CHAVE_REGRAS guarda a versão do
+    conjunto de regras). Retorna None se a especificação for inválida.
+    """
+    if contexto is None:
+        contexto = get_pricing_context()
+
+    dependencias = dependencias_orcamento(especificacao, contexto)
+    if dependencias is None:
+        return None
+    chaves = frozenset().union(*dependencias.values())
+    return {
+        'versao': contexto.versao,
+        'valores': {chave: _valor_chave(contexto, chave) for chave in sorted(chaves)}
+    }
+
+
+def chaves_alteradas(anterior, novo):
+    """
+    Chaves que mudaram entre o estado anterior e o PricingContext novo:
+    constantes, custos fixos ('custos_fixos.<nome>') e CHAVE_REGRAS se o
+    conjunto de regras mudou. anterior: outro PricingContext ou o instantâneo
+    gravado com um item (instantaneo_constantes), do qual só as chaves lidas
+    pelo item são comparadas.
+    """
+    if isinstance(anterior, dict):
+        if anterior.get('versao') == novo.versao:
+            return set()
+        return {chave for chave, valor in anterior['valores'].items() if _valor_chave(novo, chave) != valor}
+
+    alteradas = set()
+    for prefixo, valores_anteriores, valores_novos in (
+        ("", anterior.constantes, novo.constantes),
+        (PREFIXO_CUSTOS_FIXOS, anterior.custos_fixos, novo.custos_fixos),
+    ):
+        for nome in set(valores_anteriores) | set(valores_novos):
+            if valores_anteriores.get(nome) != valores_novos.get(nome):
+                alteradas.add(prefixo + nome)
+
+    versao_anterior = anterior.regras.versao if anterior.regras is not None else None
+    versao_nova = novo.regras.versao if novo.regras is not None else None
+    if versao_anterior != versao_nova:
+        alteradas.add(CHAVE_REGRAS)
+    return alteradas
+
+
+def reprecificar_orcamentos(orcamentos, alteradas=None, contexto_anterior=None, contexto=None):
+    """
+    Recalcula só os orçamentos gravados afetados por uma mudança nas constantes.
+
+    orcamentos: dicionário {identificador: (BoxSpec, QuoteResult gravado[,
+    instantâneo gravado])} ou lista desses itens (identificados pela posição).
+    alteradas: chaves alteradas (ver dependencias_orcamento), as mesmas para
+    todos os itens; se omitido, vem de chaves_alteradas(contexto_anterior,
+    contexto) ou, sem contexto_anterior, do instantâneo de cada item. Itens
+    sem instantâneo têm todos os campos recalculados e comparados.
+    contexto: PricingContext com os valores novos (o atual, se omitido).
+
+    As dependências são consultadas uma vez por combinação de opções; os
+    orçamentos com algum campo afetado são recalculados em uma única chamada
+    de calcular_custo_caixa_lote, e só os campos afetados são comparados.
+    Retorna um DataFrame com uma linha por campo que mudou (orcamento,
+    campo, anterior, novo, diferenca), incluindo os preços em centavos
+    quando gravados.
+    """
+    colunas = ['orcamento', 'campo', 'anterior', 'novo', 'diferenca']
+    try:
+        if contexto is None:
+            contexto = get_pricing_context()
+        if alteradas is None and contexto_anterior is not None:
+            alteradas = chaves_alteradas(contexto_anterior, contexto)
+        if alteradas is not None:
+            alteradas = frozenset(alteradas)
+
+        itens = orcamentos.items() if isinstance(orcamentos, dict) else enumerate(orcamentos)
+        campos_por_opcoes = {}
+        afetados = []
+        for identificador, (especificacao, anterior, *instantaneo) in itens:
+            alteradas_item = alteradas
+            if alteradas_item is None:
+                if not instantaneo or instantaneo[0] is None:
+                    # Sem instantâneo não há como saber o que o item leu: compara todos os campos
+                    afetados.append((identificador, especificacao, anterior, CHAVES_RESULTADO_CPQ))
+                    continue
+                alteradas_item = frozenset(chaves_alteradas(instantaneo[0], contexto))
+                if not alteradas_item:
+                    continue
+
+            opcoes = (_opcoes(especificacao), alteradas_item)
+            if opcoes not in campos_por_opcoes:
+                dependencias = dependencias_orcamento(especificacao, contexto)
+                if dependencias is None:
+                    # Especificação que não é mais válida: todos os campos passam a NaN
+                    campos_por_opcoes[opcoes] = CHAVES_RESULTADO_CPQ
+                else:
+                    campos_por_opcoes[opcoes] = tuple(
+                        campo for campo, chaves in dependencias.items() if chaves & alteradas_item
+                    )
+            if campos_por_opcoes[opcoes]:
+                afetados.append((identificador, especificacao, anterior, campos_por_opcoes[opcoes]))
+
+        if not afetados:
+            return pd.DataFrame(columns=colunas)
+
+        novos = QuoteResult.de_colunas(
+            calcular_custo_caixa_lote([especificacao for _, especificacao, _, _ in afetados], contexto, centavos=True)
+        )
+
+        linhas = []
+        for (identificador, _, anterior, campos), novo in zip(afetados, novos):
+            for campo in campos:
+                comparados = [campo]
+                if campo in _CAMPOS_CENTAVOS and anterior.preco_unitario_centavos is not None:
+                    comparados.append(_CAMPOS_CENTAVOS[campo])
+                for nome in comparados:
+                    valor_anterior = getattr(anterior, nome)
+                    valor_novo = getattr(novo, nome) if novo is not None else math.nan
+                    if valor_novo != valor_anterior:
+                        linhas.append({
+                            'orcamento': identificador,
+                            'campo': nome,
+                            'anterior': valor_anterior,
+                            'novo': valor_novo,
+                            'diferenca': valor_novo - valor_anterior
+                        })
+        return pd.DataFrame(linhas, columns=colunas)
+
+    except Exception as e:
+        print(f"Erro na reprecificação: {str(e)}")
+        return None
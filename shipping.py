@@ -0,0 +1,270 @@
+"""
+Empacotamento 3D de caixas em caixas de despache (papelão ondulado).
+
+Além das seis rotações uniformes, combina dois blocos de orientações
+diferentes: k camadas de uma orientação ao longo de um eixo e o espaço
+restante preenchido pela melhor orientação uniforme. Para dimensões inteiras
+em centímetros, o resultado vem de uma tabela 3D pré-calculada (leitura O(1)).
+
+O catálogo de caixas de despache (Supabase) é indexado por faixas de
+dimensões da caixa, e a combinação de caixas de menor custo para uma
+quantidade é resolvida por programação dinâmica sobre as caixas viáveis.
+"""
+
+from functools import lru_cache
+from itertools import permutations
+import math
+import numpy as np
+from constants import get_caixas_despache
+
+# Caixa de despache padrão (cm)
+EMBALAGEM_PADRAO = (50, 35, 35)
+
+
+def _ordenar_embalagem(embalagem):
+    """Dimensões da embalagem em ordem decrescente"""
+    return tuple(sorted((float(dim) for dim in embalagem), reverse=True))
+
+
+def _caixas_por_blocos(caixa, embalagem):
+    """
+    Número máximo de caixas (escalar) combinando dois blocos de orientação.
+    caixa e embalagem: (comprimento, largura, altura) em cm
+    """
+    orientacoes = set(permutations(caixa))
+    melhor = 0
+
+    for eixo in range(3):
+        comprimento = embalagem[eixo]
+        lado_u, lado_v = [embalagem[i] for i in range(3) if i != eixo]
+
+        # Melhor orientação uniforme para um espaço restante de comprimento r
+        uniforme = {}
+
+        def melhor_uniforme(restante):
+            if restante not in uniforme:
+                uniforme[restante] = max(
+                    (restante // o_s) * (lado_u // o_u) * (lado_v // o_v)
+                    for o_s, o_u, o_v in orientacoes
+                )
+            return uniforme[restante]
+
+        for o_s, o_u, o_v in orientacoes:
+            por_camada = (lado_u // o_u) * (lado_v // o_v)
+            if por_camada == 0 or o_s > comprimento:
+                continue
+            for camadas in range(int(comprimento // o_s) + 1):
+                total = camadas * por_camada + melhor_uniforme(comprimento - camadas * o_s)
+                if total > melhor:
+                    melhor = total
+
+    return int(melhor)
+
+
+@lru_cache(maxsize=32)
+def _tabela_embalagem(embalagem):
+    """
+    Tabela [d1, d2, d3] (cm inteiros, d1 >= d2 >= d3) com o número máximo de
+    caixas por embalagem, calculada de forma vetorizada uma única vez. Só as
+    caixas que cabem entram: cada eixo vai até a dimensão correspondente da
+    embalagem (em ordem decrescente), e as posições de fora ficam em zero
+    """
+    limites = [int(dim) for dim in embalagem]
+    d1, d2, d3 = np.meshgrid(*(np.arange(limite + 1, dtype=np.int32) for limite in limites), indexing='ij')
+    ordenadas = (d1 >= d2) & (d2 >= d3) & (d3 >= 1)
+    caixas = [d[ordenadas] for d in (d1, d2, d3)]
+    del d1, d2, d3
+
+    melhor = np.zeros(len(caixas[0]), dtype=np.int32)
+    for eixo in range(3):
+        comprimento = limites[eixo]
+        lado_u, lado_v = [limites[i] for i in range(3) if i != eixo]
+
+        # Para cada dimensão da caixa ao longo do eixo, o melhor número de caixas
+        # por camada entre as duas orientações das outras duas dimensões
+        camadas_por_lado = []
+        for indice, o_s in enumerate(caixas):
+            o_u, o_v = [caixas[i] for i in range(3) if i != indice]
+            camadas_por_lado.append((o_s, np.maximum((lado_u // o_u) * (lado_v // o_v),
+                                                     (lado_u // o_v) * (lado_v // o_u))))
+
+        # k camadas com um lado ao longo do eixo e o restante r = comprimento - k * o_s
+        # com a melhor orientação uniforme. Com as caixas ordenadas por o_s, as que
+        # ainda comportam k camadas são um prefixo: o trabalho cai com k
+        for o_s, por_camada in camadas_por_lado:
+            ordem = np.argsort(o_s, kind='stable')
+            lado = o_s[ordem]
+            uniformes = [(u_s[ordem], u_camada[ordem]) for u_s, u_camada in camadas_por_lado]
+            por_camada = por_camada[ordem]
+            melhor_ordem = melhor[ordem]
+            for camadas in range(comprimento + 1):
+                fim = int(np.searchsorted(lado, comprimento // camadas, side='right')) if camadas else len(lado)
+                if fim == 0:
+                    break
+                restante = comprimento - camadas * lado[:fim]
+                total = camadas * por_camada[:fim]
+                uniforme = np.zeros(fim, dtype=np.int32)
+                for u_s, u_camada in uniformes:
+                    np.maximum(uniforme, (restante // u_s[:fim]) * u_camada[:fim], out=uniforme)
+                np.maximum(melhor_ordem[:fim], total + uniforme, out=melhor_ordem[:fim])
+            melhor[ordem] = melhor_ordem
+
+    tabela = np.zeros([limite + 1 for limite in limites], dtype=np.int32)
+    tabela[caixas[0], caixas[1], caixas[2]] = melhor
+    return tabela
+
+
+def _dimensoes_inteiras(dims):
+    """Verifica se todas as dimensões são centímetros inteiros"""
+    return all(float(dim).is_integer() for dim in dims)
+
+
+def calcular_max_caixas_embalagem(largura, altura, profundidade, embalagem=EMBALAGEM_PADRAO):
+    """
+    Calcula o número máximo de caixas (cm) que cabem em uma embalagem,
+    combinando orientações. Dimensões inteiras usam a tabela pré-calculada.
+    """
+    embalagem = _ordenar_embalagem(embalagem)
+    caixa = tuple(sorted((float(largura), float(altura), float(profundidade)), reverse=True))
+
+    # Se não cabe em nenhuma rotação, retorna 0
+    if caixa[2] <= 0 or any(c > e for c, e in zip(caixa, embalagem)):
+        return 0
+
+    if _dimensoes_inteiras(caixa) and _dimensoes_inteiras(embalagem):
+        return int(_tabela_embalagem(embalagem)[int(caixa[0]), int(caixa[1]), int(caixa[2])])
+
+    return _caixas_por_blocos(caixa, embalagem)
+
+
+def _normalizar_catalogo(caixas):
+    """Catálogo como tupla hashável de (nome, dimensões em ordem decrescente, custo)"""
+    return tuple(sorted(
+        (str(caixa['nome']),
+         _ordenar_embalagem((caixa['largura_cm'], caixa['altura_cm'], caixa['profundidade_cm'])),
+         float(caixa['custo']))
+        for caixa in caixas
+    ))
+
+
+def _faixa_dimensoes(largura, altura, profundidade):
+    """Faixa (cm inteiros arredondados para cima, em ordem decrescente) de uma caixa"""
+    return tuple(sorted((int(math.ceil(float(dim))) for dim in (largura, altura, profundidade)), reverse=True))
+
+
+@lru_cache(maxsize=8)
+def _indice_catalogo(catalogo):
+    """
+    Índice do catálogo: para cada caixa, a tabela [d1, d2, d3] com a sua
+    capacidade para cada faixa de dimensões que cabe nela (None se a caixa
+    não comporta nem 1 cm). Embalagens fracionárias são arredondadas para baixo.
+    """
+    indice = []
+    for _, embalagem, _ in catalogo:
+        embalagem = tuple(float(math.floor(dim)) for dim in embalagem)
+        indice.append(_tabela_embalagem(embalagem) if embalagem[2] >= 1 else None)
+    return tuple(indice)
+
+
+def _caixas_viaveis(catalogo, faixa):
+    """Lista de (capacidade, custo, indice) das caixas que comportam a faixa"""
+    if faixa[2] < 1:
+        return []
+    viaveis = []
+    for k, tabela in enumerate(_indice_catalogo(catalogo)):
+        if tabela is None or any(dim >= limite for dim, limite in zip(faixa, tabela.shape)):
+            continue
+        capacidade = int(tabela[faixa])
+        if capacidade > 0:
+            viaveis.append((capacidade, catalogo[k][2], k))
+    return viaveis
+
+
+def _remover_dominadas(viaveis):
+    """Remove caixas com capacidade menor ou igual e custo maior ou igual a outra"""
+    viaveis = sorted(viaveis, key=lambda caixa: (-caixa[0], caixa[1]))
+    restantes = []
+    menor_custo = math.inf
+    for capacidade, custo, indice in viaveis:
+        if custo < menor_custo:
+            restantes.append((capacidade, custo, indice))
+            menor_custo = custo
+    return restantes
+
+
+@lru_cache(maxsize=1024)
+def _combinacao_minima(catalogo, faixa, quantidade):
+    """
+    Combinação de menor custo para `quantidade` caixas da faixa dada.
+    Retorna uma tupla de (indice_caixa, capacidade, numero_de_embalagens).
+    """
+    viaveis = _remover_dominadas(_caixas_viaveis(catalogo, faixa))
+    if not viaveis:
+        raise ValueError(f"Nenhuma caixa de despache comporta uma caixa de {faixa[0]}x{faixa[1]}x{faixa[2]} cm")
+    if quantidade <= 0:
+        return ()
+
+    # A caixa de melhor custo por unidade absorve o volume: numa solução ótima
+    # as demais aparecem menos de `capacidade_melhor` vezes (argumento de
+    # divisibilidade), então só o resto precisa da busca exata
+    melhor = min(viaveis, key=lambda caixa: caixa[1] / caixa[0])
+    maior_capacidade = max(caixa[0] for caixa in viaveis)
+    fixas = max(0, (quantidade - (melhor[0] - 1) * maior_capacidade) // melhor[0])
+    resto = quantidade - fixas * melhor[0]
+
+    # custo[r] = menor custo para cobrir r caixas; calculado em blocos do
+    # tamanho da menor capacidade, que só dependem de blocos anteriores
+    capacidades = np.array([caixa[0] for caixa in viaveis])
+    custos = np.array([caixa[1] for caixa in viaveis])
+    passo = int(capacidades.min())
+    custo = np.zeros(resto + 1)
+    escolha = np.zeros(resto + 1, dtype=np.int64)
+    for inicio in range(1, resto + 1, passo):
+        r = np.arange(inicio, min(inicio + passo, resto + 1))
+        candidatos = custo[np.maximum(r[:, None] - capacidades, 0)] + custos
+        escolha[r] = np.argmin(candidatos, axis=1)
+        custo[r] = candidatos[np.arange(len(r)), escolha[r]]
+
+    contagem = {melhor[2]: fixas} if fixas else {}
+    r = resto
+    while r > 0:
+        capacidade, _, indice = viaveis[escolha[r]]
+        contagem[indice] = contagem.get(indice, 0) + 1
+        r -= capacidade
+
+    capacidade_por_indice = {indice: capacidade for capacidade, _, indice in viaveis}
+    return tuple(sorted((indice, capacidade_por_indice[indice], n) for indice, n in contagem.items()))
+
+
+def selecionar_caixas_despache(largura, altura, profundidade, quantidade, caixas=None):
+    """
+    Escolhe a combinação de caixas de despache de menor custo para enviar
+    `quantidade` caixas de largura x altura x profundidade (cm).
+
+    caixas: catálogo (lista de dicts com nome, largura_cm, altura_cm,
+            profundidade_cm e custo); padrão: catálogo do Supabase
+    """
+    if caixas is None:
+        caixas = get_caixas_despache()
+    catalogo = _normalizar_catalogo(caixas)
+    combinacao = _combinacao_minima(catalogo, _faixa_dimensoes(largura, altura, profundidade), int(quantidade))
+
+    embalagens = []
+    for indice, capacidade, numero in combinacao:
+        nome, _, custo = catalogo[indice]
+        embalagens.append({
+            'nome': nome,
+            'capacidade': capacidade,
+            'quantidade': numero,
+            'custo_unitario': custo,
+            'custo_total': custo * numero
+        })
+
+    custo_total = sum(embalagem['custo_total'] for embalagem in embalagens)
+    return {
+        'embalagens': embalagens,
+        'total_embalagens': sum(embalagem['quantidade'] for embalagem in embalagens),
+        'capacidade_total': sum(embalagem['capacidade'] * embalagem['quantidade'] for embalagem in embalagens),
+        'custo_total': custo_total,
+        'custo_por_caixa': custo_total / quantidade if quantidade > 0 else 0
+    }
@@ -1,7 +1,8 @@
 import os
+import json
 from supabase import create_client, Client
 from dotenv import load_dotenv
-from typing import Dict
+from typing import Dict, List
 
 # Carregar variáveis de ambiente (opcional)
 try:
@@ -84,6 +85,146 @@ class SupabaseManager:
             print(f"❌ Erro ao buscar constantes do Supabase: {e}")
             raise Exception("Não foi possível conectar ao Supabase para buscar constantes")
     
+    def get_caixas_despache(self) -> List[Dict]:
+        """
+        Busca o catálogo de caixas de despache da tabela caixas_despache no Supabase
+        Retorna uma lista com nome, dimensões internas (cm) e custo de cada caixa;
+        lista vazia se não houver caixas (usa a embalagem padrão das constantes)
+        """
+        if not self.client:
+            raise Exception("Não foi possível conectar ao Supabase para buscar caixas de despache")
+        
+        try:
+            response = self.client.table("caixas_despache").select("*").execute()
+        except Exception as e:
+            print(f"❌ Erro ao buscar caixas de despache do Supabase: {e}")
+            return []
+        
+        caixas = []
+        for item in response.data or []:
+            if all(campo in item for campo in ('name', 'largura_cm', 'altura_cm', 'profundidade_cm', 'custo')):
+                caixas.append({
+                    'nome': item['name'],
+                    'largura_cm': float(item['largura_cm']),
+                    'altura_cm': float(item['altura_cm']),
+                    'profundidade_cm': float(item['profundidade_cm']),
+                    'custo': float(item['custo'])
+                })
+        
+        ignoradas = len(response.data or []) - len(caixas)
+        if ignoradas:
+            print(f"⚠️ {ignoradas} caixas de despache ignoradas (faltam colunas name, largura_cm, altura_cm, profundidade_cm ou custo)")
+        
+        if caixas:
+            print(f"✅ Carregadas {len(caixas)} caixas de despache do Supabase")
+        return caixas
+    
+    def get_formatos_chapa(self) -> List[Dict]:
+        """
+        Busca o catálogo de formatos de chapa de papelão da tabela formatos_chapa no Supabase
+        Retorna uma lista com nome, dimensões (mm) e custo por m² de cada formato;
+        lista vazia se não houver formatos (usa a chapa padrão das constantes)
+        """
+        if not self.client:
+            raise Exception("Não foi possível conectar ao Supabase para buscar formatos de chapa")
+        
+        try:
+            response = self.client.table("formatos_chapa").select("*").execute()
+        except Exception as e:
+            print(f"❌ Erro ao buscar formatos de chapa do Supabase: {e}")
+            return []
+        
+        formatos = []
+        for item in response.data or []:
+            if all(campo in item for campo in ('nome', 'largura_mm', 'altura_mm', 'custo_m2')) and item.get('ativo', True):
+                formatos.append({
+                    'nome': str(item['nome']),
+                    'largura_mm': float(item['largura_mm']),
+                    'altura_mm': float(item['altura_mm']),
+                    'custo_m2': float(item['custo_m2'])
+                })
+        
+        if formatos:
+            print(f"✅ Carregados {len(formatos)} formatos de chapa do Supabase")
+        return formatos
+    
+    def get_regras_precificacao(self) -> List[tuple]:
+        """
+        Busca as regras de precificação da tabela regras_precificacao no Supabase
+        Retorna uma lista de (componente, expressao) na ordem da coluna 'ordem';
+        lista vazia se não houver regras (usa as fórmulas padrão)
+        """
+        if not self.client:
+            raise Exception("Não foi possível conectar ao Supabase para buscar regras de precificação")
+        
+        try:
+            response = self.client.table("regras_precificacao").select("*").execute()
+        except Exception as e:
+            print(f"❌ Erro ao buscar regras de precificação do Supabase: {e}")
+            return []
+        
+        linhas = [item for item in (response.data or [])
+                  if 'componente' in item and 'expressao' in item and item.get('ativo', True)]
+        linhas.sort(key=lambda item: item.get('ordem') or 0)
+        regras = [(str(item['componente']), str(item['expressao'])) for item in linhas]
+        
+        if regras:
+            print(f"✅ Carregadas {len(regras)} regras de precificação do Supabase")
+        return regras
+    
+    def get_modelos_caixa(self) -> List[Dict]:
+        """
+        Busca os modelos de caixa paramétricos da tabela modelos_caixa no Supabase
+        Retorna uma lista com nome, paineis (lista de painéis) e area_colagem de
+        cada modelo ativo; lista vazia se não houver modelos
+        """
+        if not self.client:
+            raise Exception("Não foi possível conectar ao Supabase para buscar modelos de caixa")
+        
+        try:
+            response = self.client.table("modelos_caixa").select("*").execute()
+        except Exception as e:
+            print(f"❌ Erro ao buscar modelos de caixa do Supabase: {e}")
+            return []
+        
+        modelos = []
+        for item in response.data or []:
+            if all(campo in item for campo in ('nome', 'paineis', 'area_colagem')) and item.get('ativo', True):
+                paineis = item['paineis']
+                # Coluna JSONB chega como lista; TEXT chega como texto JSON
+                if isinstance(paineis, str):
+                    paineis = json.loads(paineis)
+                modelos.append({
+                    'nome': str(item['nome']),
+                    'paineis': paineis,
+                    'area_colagem': str(item['area_colagem'])
+                })
+        
+        if modelos:
+            print(f"✅ Carregados {len(modelos)} modelos de caixa do Supabase")
+        return modelos
+    
+    def substituir_catalogo_precos(self, versao: str, linhas: List[Dict]) -> bool:
+        """
+        Grava o catálogo de preços na tabela catalogo_precos: insere as linhas
+        da versão nova em uma única chamada e só então apaga as de outras
+        versões das constantes (quem lê a tabela nunca a encontra vazia)
+        """
+        if not self.client:
+            raise Exception("Não foi possível conectar ao Supabase para gravar o catálogo de preços")
+        
+        try:
+            self.client.table("catalogo_precos").delete().eq("versao_constantes", versao).execute()
+            if linhas:
+                self.client.table("catalogo_precos").insert(linhas).execute()
+            self.client.table("catalogo_precos").delete().neq("versao_constantes", versao).execute()
+        except Exception as e:
+            print(f"❌ Erro ao gravar o catálogo de preços no Supabase: {e}")
+            return False
+        
+        print(f"✅ Catálogo de preços gravado no Supabase ({len(linhas)} linhas)")
+        return True
+    
     def _normalizar_nome(self, nome: str) -> str:
         """
         Normaliza os nomes da tabela para o formato esperado pelo sistema
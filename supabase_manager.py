@@ -4,6 +4,8 @@ from supabase import create_client, Client
 import streamlit as st
 import os
 from dotenv import load_dotenv
+from cpq_calculator import reais_para_centavos, CENTAVOS_POR_REAL, BoxSpec, QuoteResult
+from repricing import instantaneo_constantes
 
 # Carrega as variáveis de ambiente
 load_dotenv()
@@ -12,6 +14,12 @@ load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
 
+def _coluna_inexistente(erro):
+    """Se o erro do PostgREST é de uma coluna que a tabela não tem (estrutura antiga)"""
+    codigo = getattr(erro, 'code', None)
+    mensagem = str(getattr(erro, 'message', None) or erro)
+    return codigo in ('PGRST204', '42703') or ('column' in mensagem and 'does not exist' in mensagem)
+
 class SupabaseManager:
     def __init__(self):
         self.supabase: Client = None
@@ -127,11 +135,44 @@ class SupabaseManager:
             st.error(f"❌ Erro ao gerar número do orçamento: {str(e)}")
             return f"ORC-{datetime.now().strftime('%Y%m%d')}-001"
     
+    def _item_de_orcamento_cpq(self, especificacao, resultado):
+        """Item de orçamento (dicionário) a partir de um BoxSpec e do QuoteResult calculado"""
+        return {
+            'descricao': especificacao.descricao(),
+            'quantidade': int(especificacao.quantidade),
+            'preco_unitario': resultado.preco_unitario,
+            'preco_unitario_centavos': resultado.preco_unitario_centavos,
+            # Gravados para a reprecificação quando as constantes mudam (repricing.py)
+            'especificacao': especificacao._asdict(),
+            'detalhamento': resultado.como_dicionario(),
+            'constantes': instantaneo_constantes(especificacao)
+        }
+    
     def inserir_orcamento(self, cliente_id, data_validade, observacoes="", itens=None):
-        """Insere um novo orçamento no Supabase"""
+        """
+        Insere um novo orçamento no Supabase. Cada item é um dicionário
+        (descricao, quantidade, preco_unitario[, preco_unitario_centavos], como
+        os de KitQuote.itens()) ou um par (BoxSpec, QuoteResult) vindo do CPQ.
+        Os totais são gravados com o orçamento e todos os itens em uma única
+        inserção
+        """
         try:
             numero_orcamento = self.gerar_numero_orcamento()
             
+            # Totais em centavos inteiros, para bater com o PDF no centavo
+            itens_cpq = []
+            subtotal_centavos = 0
+            for item in itens or []:
+                if isinstance(item, tuple) and isinstance(item[0], BoxSpec):
+                    item = self._item_de_orcamento_cpq(*item)
+                preco_unitario_centavos = item.get('preco_unitario_centavos')
+                if preco_unitario_centavos is None:
+                    preco_unitario_centavos = reais_para_centavos(item['preco_unitario'])
+                item_subtotal_centavos = int(item['quantidade']) * int(preco_unitario_centavos)
+                subtotal_centavos += item_subtotal_centavos
+                itens_cpq.append((item, preco_unitario_centavos, item_subtotal_centavos))
+            subtotal = subtotal_centavos / CENTAVOS_POR_REAL
+            
             # Insere o orçamento
             orcamento_data = {
                 'numero_orcamento': numero_orcamento,
@@ -139,9 +180,9 @@ class SupabaseManager:
                 'data_validade': data_validade.isoformat(),
                 'observacoes': observacoes,
                 'status': 'Pendente',
-                'subtotal': 0,
+                'subtotal': subtotal,
                 'desconto': 0,
-                'total': 0,
+                'total': subtotal,
                 'data_orcamento': datetime.now().isoformat()
             }
             
@@ -149,40 +190,42 @@ class SupabaseManager:
             orcamento_id = result.data[0]['id']
             
             # Insere os itens do orçamento
-            if itens:
-                subtotal = 0
-                for item in itens:
-                    item_subtotal = item['quantidade'] * item['preco_unitario']
-                    subtotal += item_subtotal
-                    
-                    # Criar item_data baseado na estrutura da tabela
-                    item_data = {
-                        'orcamento_id': orcamento_id,
-                        'quantidade': item['quantidade'],
-                        'preco_unitario': item['preco_unitario'],
-                        'subtotal': item_subtotal
-                    }
+            if itens_cpq:
+                # Estruturas da tabela, da mais completa à antiga: com a especificação do
+                # CPQ e o instantâneo das constantes (colunas especificacao, detalhamento e
+                # constantes), só com a especificação, com descricao e com produto_id.
+                # Todas as linhas de uma inserção precisam das mesmas colunas
+                tentativas = []
+                if any('especificacao' in item for item, _, _ in itens_cpq):
+                    tentativas.append(('descricao', 'especificacao', 'detalhamento', 'constantes'))
+                    tentativas.append(('descricao', 'especificacao', 'detalhamento'))
+                tentativas.append(('descricao',))
+                tentativas.append(None)
+                
+                for indice, colunas in enumerate(tentativas):
+                    dados_itens = []
+                    for item, preco_unitario_centavos, item_subtotal_centavos in itens_cpq:
+                        # Criar item_data baseado na estrutura da tabela
+                        item_data = {
+                            'orcamento_id': orcamento_id,
+                            'quantidade': item['quantidade'],
+                            'preco_unitario': preco_unitario_centavos / CENTAVOS_POR_REAL,
+                            'subtotal': item_subtotal_centavos / CENTAVOS_POR_REAL
+                        }
+                        if colunas is None:
+                            item_data['produto_id'] = 1  # ID padrão para item genérico
+                        else:
+                            item_data.update({coluna: item.get(coluna) for coluna in colunas})
+                        dados_itens.append(item_data)
                     
-                    # Adicionar descricao se a tabela suportar, senão usar produto_id como fallback
                     try:
-                        # Tentar inserir com descricao
-                        item_data['descricao'] = item['descricao']
-                        self.supabase.table('itens_orcamento').insert(item_data).execute()
+                        self.supabase.table('itens_orcamento').insert(dados_itens).execute()
+                        break
                     except Exception as e:
-                        # Se falhar, tentar com produto_id (estrutura antiga)
-                        try:
-                            del item_data['descricao']
-                            item_data['produto_id'] = 1  # ID padrão para item genérico
-                            self.supabase.table('itens_orcamento').insert(item_data).execute()
-                        except Exception as e2:
-                            st.error(f"❌ Erro ao inserir item: {str(e2)}")
-                            raise e2
-                
-                # Atualiza o total do orçamento
-                self.supabase.table('orcamentos').update({
-                    'subtotal': subtotal,
-                    'total': subtotal
-                }).eq('id', orcamento_id).execute()
+                        # Só uma coluna inexistente passa para a estrutura seguinte
+                        if indice == len(tentativas) - 1 or not _coluna_inexistente(e):
+                            st.error(f"❌ Erro ao inserir itens: {str(e)}")
+                            raise e
             
             return orcamento_id, numero_orcamento
         except Exception as e:
@@ -248,6 +291,38 @@ class SupabaseManager:
             st.error(f"❌ Erro ao buscar orçamento: {str(e)}")
             return None, pd.DataFrame()
     
+    def buscar_itens_para_reprecificacao(self, status="Pendente"):
+        """
+        Itens dos orçamentos com o status dado que têm a especificação do CPQ
+        gravada: dicionário {id do item: (BoxSpec, QuoteResult gravado,
+        instantâneo das constantes ou None)}
+        """
+        try:
+            # Tabelas sem a coluna constantes: itens sem instantâneo
+            try:
+                result = self.supabase.table('itens_orcamento').select(
+                    'id, especificacao, detalhamento, constantes, orcamentos!inner(status)'
+                ).eq('orcamentos.status', status).execute()
+            except Exception as e:
+                if not _coluna_inexistente(e):
+                    raise
+                result = self.supabase.table('itens_orcamento').select(
+                    'id, especificacao, detalhamento, orcamentos!inner(status)'
+                ).eq('orcamentos.status', status).execute()
+            
+            return {
+                item['id']: (
+                    BoxSpec.de_dicionario(item['especificacao']),
+                    QuoteResult.de_dicionario(item['detalhamento']),
+                    item.get('constantes')
+                )
+                for item in result.data
+                if item.get('especificacao') and item.get('detalhamento')
+            }
+        except Exception as e:
+            st.error(f"❌ Erro ao buscar itens para reprecificação: {str(e)}")
+            return {}
+    
     def autenticar_usuario(self, username, password):
         """Autentica um usuário usando Supabase Auth"""
         try: